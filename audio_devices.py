@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+
+# Input device discovery, selection and probing.
+# Devices are picked by name pattern (the "audio.device_patterns" calibration list,
+# tried in order), then any USB device, then the system default, then the first
+# input device. Devices a previous probe could not open are skipped.
+# The probe opens each candidate device and measures:
+#   - which of the common rates the device accepts,
+#   - the latency PortAudio reports and the delay before the first chunk arrives,
+#   - how evenly chunks arrive, and how many overflows happen idle vs. with the
+#     interpreter busy on other threads (as it is while a model decodes).
+# Results are cached in a JSON file, so startup only reads the cache and never probes.
+#
+# List devices:  python3 audio_devices.py
+# Probe devices: python3 audio_devices.py --probe [--seconds 3]
+
+import os
+import re
+import json
+import time
+import argparse
+import threading
+
+from event_log import get_event_log
+
+PROBE_RATES = (8000, 16000, 22050, 32000, 44100, 48000)
+CHUNK_FRAMES = 4096
+INPUT_OVERFLOWED = -9981  # paInputOverflowed
+
+
+def list_input_devices(pa):
+    """Every device with at least one input channel, as plain dicts."""
+    devices = []
+    for index in range(pa.get_device_count()):
+        info = pa.get_device_info_by_index(index)
+        if int(info.get("maxInputChannels", 0)) < 1:
+            continue
+        devices.append({
+            "index": index,
+            "name": info.get("name", f"device {index}"),
+            "channels": int(info["maxInputChannels"]),
+            "default_rate": int(info.get("defaultSampleRate", 16000)),
+            "low_latency": info.get("defaultLowInputLatency"),
+            "high_latency": info.get("defaultHighInputLatency"),
+            "host_api": info.get("hostApi"),
+        })
+    return devices
+
+
+def _default_input_index(pa):
+    try:
+        return pa.get_default_input_device_info()["index"]
+    except (IOError, OSError, KeyError):
+        return None
+
+
+def find_input_device(pa, pattern):
+    """First input device whose name matches pattern (case-insensitive regex), or None."""
+    regex = re.compile(pattern, re.IGNORECASE)
+    for device in list_input_devices(pa):
+        if regex.search(device["name"]):
+            return device
+    return None
+
+
+def select_input_device(pa, patterns=(), cache=None):
+    """Pick the capture device: name patterns in order, then USB, then the default, then the first."""
+    devices = list_input_devices(pa)
+    if not devices:
+        return None
+    cache = cache or {}
+    usable = [d for d in devices if cache.get(d["name"], {}).get("opened", True)] or devices
+
+    for pattern in list(patterns) + ["usb"]:
+        regex = re.compile(pattern, re.IGNORECASE)
+        for device in usable:
+            if regex.search(device["name"]):
+                return device
+    default = _default_input_index(pa)
+    for device in usable:
+        if device["index"] == default:
+            return device
+    return usable[0]
+
+
+def load_probe_cache(path):
+    """Probe results keyed by device name ({} if never probed)."""
+    if not path or not os.path.exists(path):
+        return {}
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_probe_cache(path, cache):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(cache, f, indent=4)
+
+
+def _burn(stop):
+    """Keep the interpreter busy, like a decoder holding the GIL between reads."""
+    x = 0
+    while not stop.is_set():
+        for i in range(10000):
+            x += i * i
+
+
+def _read_for(stream, seconds, frames):
+    """Read for `seconds`; returns (chunk arrival intervals, overflow count)."""
+    intervals = []
+    overflows = 0
+    last = time.perf_counter()
+    end = last + seconds
+    while last < end:
+        try:
+            stream.read(frames, exception_on_overflow=True)
+        except (IOError, OSError) as e:
+            if getattr(e, "errno", None) != INPUT_OVERFLOWED:
+                raise
+            overflows += 1
+        now = time.perf_counter()
+        intervals.append(now - last)
+        last = now
+    return intervals, overflows
+
+
+def probe_device(pa, device, seconds=3.0, load_threads=2):
+    """Measure one device; returns a JSON-serializable result dict."""
+    import pyaudio
+
+    result = {"index": device["index"], "name": device["name"], "probed": time.time(),
+              "default_rate": device["default_rate"], "opened": False}
+    rates = []
+    for rate in sorted(set(PROBE_RATES) | {device["default_rate"]}):
+        try:
+            if pa.is_format_supported(rate, input_device=device["index"], input_channels=1,
+                                      input_format=pyaudio.paInt16):
+                rates.append(rate)
+        except ValueError:
+            pass
+    result["supported_rates"] = rates
+
+    rate = device["default_rate"] if device["default_rate"] in rates else (rates[-1] if rates else 16000)
+    frames = CHUNK_FRAMES * rate // 16000
+    try:
+        stream = pa.open(format=pyaudio.paInt16, channels=1, rate=rate, input=True,
+                         input_device_index=device["index"], frames_per_buffer=frames,
+                         start=False)
+    except (IOError, OSError) as e:
+        result["error"] = str(e)
+        return result
+    result["opened"] = True
+    result["rate"] = rate
+    try:
+        result["reported_latency"] = stream.get_input_latency()
+        started = time.perf_counter()
+        stream.start_stream()
+        stream.read(frames, exception_on_overflow=False)
+        # Time beyond one chunk's worth of audio before the first read returned
+        result["first_chunk_delay"] = max(0.0, time.perf_counter() - started - frames / rate)
+
+        intervals, overflows = _read_for(stream, seconds / 2, frames)
+        result["idle_overflows"] = overflows
+        result["interval_jitter"] = _spread(intervals, frames / rate)
+
+        stop = threading.Event()
+        burners = [threading.Thread(target=_burn, args=(stop,), daemon=True) for _ in range(load_threads)]
+        for burner in burners:
+            burner.start()
+        try:
+            intervals, overflows = _read_for(stream, seconds / 2, frames)
+        finally:
+            stop.set()
+            for burner in burners:
+                burner.join()
+        result["load_overflows"] = overflows
+        result["load_interval_jitter"] = _spread(intervals, frames / rate)
+        result["load_max_interval"] = max(intervals) if intervals else None
+    except (IOError, OSError) as e:
+        result["error"] = str(e)
+    finally:
+        stream.stop_stream()
+        stream.close()
+    return result
+
+
+def _spread(intervals, expected):
+    """Mean absolute deviation of chunk arrival intervals from the nominal chunk period."""
+    if not intervals:
+        return None
+    return sum(abs(i - expected) for i in intervals) / len(intervals)
+
+
+def probe_all(pa, cache_path, seconds=3.0, pattern=None):
+    """Probe every (matching) input device and merge the results into the cache file."""
+    cache = load_probe_cache(cache_path)
+    events = get_event_log()
+    for device in list_input_devices(pa):
+        if pattern and not re.search(pattern, device["name"], re.IGNORECASE):
+            continue
+        print(f"Probing [{device['index']}] {device['name']} ...")
+        result = probe_device(pa, device, seconds)
+        cache[device["name"]] = result
+        events.event("audio_probe", device=device["name"],
+                     **{key: value for key, value in result.items() if key != "name"})
+    save_probe_cache(cache_path, cache)
+    return cache
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List and probe audio input devices")
+    parser.add_argument("--probe", action="store_true", help="probe devices and update the cache")
+    parser.add_argument("--pattern", help="only probe devices whose name matches this regex")
+    parser.add_argument("--seconds", type=float, default=3.0, help="capture time per device")
+    parser.add_argument("--cache", default="audio_probe_cache.json", help="probe cache file")
+    args = parser.parse_args()
+
+    import pyaudio
+    pa = pyaudio.PyAudio()
+    try:
+        if args.probe:
+            probe_all(pa, args.cache, args.seconds, args.pattern)
+        cache = load_probe_cache(args.cache)
+        default = _default_input_index(pa)
+        for device in list_input_devices(pa):
+            marker = "*" if device["index"] == default else " "
+            print(f"{marker}[{device['index']}] {device['name']}  "
+                  f"channels={device['channels']} default_rate={device['default_rate']}")
+            probe = cache.get(device["name"])
+            if probe and probe.get("opened"):
+                print(f"      rates={probe['supported_rates']} latency={probe.get('reported_latency', 0):.3f}s "
+                      f"first_chunk_delay={probe.get('first_chunk_delay', 0):.3f}s "
+                      f"overflows idle/load={probe.get('idle_overflows')}/{probe.get('load_overflows')}")
+            elif probe:
+                print(f"      could not be opened: {probe.get('error')}")
+    finally:
+        pa.terminate()
+
+
+if __name__ == "__main__":
+    main()
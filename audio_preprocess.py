@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+
+# Optional clean-up stage between the microphone and the recognizer.
+# Audio is processed in short overlapping frames (sqrt-Hann, 50% overlap, so the
+# overlap-add reconstruction is exact when nothing is changed):
+#   1. high-pass    - bins below highpass_hz are rolled off (rumble, handling noise)
+#   2. noise        - spectral subtraction against a noise profile that is learned
+#                     while the motors run, so their whine is removed from "stop"
+#   3. agc          - a smoothed gain pulls speech towards a target level
+# All work happens on arrays allocated once at construction; CPU time is
+# accumulated per stage so the cost can be compared against the audio duration.
+#
+# Benchmark:  python3 audio_preprocess.py --seconds 60
+
+import time
+import argparse
+
+import numpy as np
+
+from event_log import get_event_log, QUIET
+
+# NumPy 2 FFTs can write into a caller-provided array
+_FFT_OUT = np.lib.NumpyVersion(np.__version__) >= "2.0.0"
+
+STAGES = ("analysis", "highpass", "noise", "synthesis", "agc")
+
+
+class AudioPreprocessor:
+    """High-pass, motor-noise spectral subtraction and AGC for int16 mono chunks."""
+
+    def __init__(self, rate=16000, frame=512, max_chunk=8192, highpass_hz=120.0,
+                 noise_suppression=True, over_subtraction=2.0, spectral_floor=0.05,
+                 noise_adapt=0.1, learn_frames=8, hangover=0.5,
+                 agc=True, agc_target=3000.0, agc_max_gain=8.0, agc_attack=0.5, agc_release=0.05,
+                 agc_gate=150.0):
+        self.rate = rate
+        self.frame = frame
+        self.hop = hop = frame // 2
+        self.max_chunk = max_chunk
+        self.highpass_hz = highpass_hz
+        self.noise_suppression = noise_suppression
+        self.over_subtraction = over_subtraction
+        self.spectral_floor = spectral_floor
+        self.noise_adapt = noise_adapt
+        self.learn_frames = learn_frames
+        self.hangover = hangover
+        self.agc = agc
+        self.agc_target = agc_target
+        self.agc_max_gain = agc_max_gain
+        self.agc_attack = agc_attack
+        self.agc_release = agc_release
+        self.agc_gate = agc_gate
+        self.events = get_event_log()
+
+        bins = frame // 2 + 1
+        max_frames = (max_chunk + frame) // hop + 1
+        n = np.arange(frame)
+        self._window = np.sqrt(0.5 - 0.5 * np.cos(2 * np.pi * n / frame)).astype(np.float32)
+        freqs = np.fft.rfftfreq(frame, 1.0 / rate)
+        # Raised-cosine roll-off over one octave below the cut-off
+        ramp = np.clip((freqs - highpass_hz / 2) / max(highpass_hz / 2, 1e-9), 0.0, 1.0)
+        self._highpass = (0.5 - 0.5 * np.cos(np.pi * ramp)).astype(np.float32)
+
+        self._input = np.zeros(hop + max_chunk + hop, dtype=np.float32)
+        self._filled = hop  # the first hop samples are history from the previous chunk
+        self._frames = np.empty((max_frames, frame), dtype=np.float32)
+        self._spectrum = np.empty((max_frames, bins), dtype=np.complex64)
+        self._power = np.empty((max_frames, bins), dtype=np.float32)
+        self._gain = np.empty((max_frames, bins), dtype=np.float32)
+        self._frame_power = np.empty(max_frames, dtype=np.float32)
+        self._learn_mask = np.empty(max_frames, dtype=bool)
+        self._noise_update = np.empty(bins, dtype=np.float32)
+        self._output = np.empty(max_chunk + hop, dtype=np.float32)
+        self._output16 = np.empty(max_chunk + hop, dtype=np.int16)
+        self._ramp = np.empty(max_chunk + hop, dtype=np.float32)
+        self._carry = np.zeros(hop, dtype=np.float32)
+
+        self.noise_profile = np.zeros(bins, dtype=np.float32)
+        self.noise_frames = 0       # frames the profile has been learned from
+        self.motors_running = False
+        self._learn_left = 0
+        self._motor_stopped = 0.0
+        self._agc_gain = 1.0
+
+        self.stage_seconds = dict.fromkeys(STAGES, 0.0)
+        self.samples = 0
+        self.chunks = 0
+
+    @classmethod
+    def from_calibration(cls, calibration_manager, rate=16000):
+        """Build from the "preprocess" calibration category."""
+        get = calibration_manager.get_setting
+        return cls(
+            rate=rate,
+            frame=int(get("preprocess", "frame")),
+            highpass_hz=float(get("preprocess", "highpass_hz")),
+            noise_suppression=bool(get("preprocess", "noise_suppression")),
+            over_subtraction=float(get("preprocess", "over_subtraction")),
+            spectral_floor=float(get("preprocess", "spectral_floor")),
+            noise_adapt=float(get("preprocess", "noise_adapt")),
+            hangover=float(get("preprocess", "hangover")),
+            agc=bool(get("preprocess", "agc")),
+            agc_target=float(get("preprocess", "agc_target")),
+            agc_max_gain=float(get("preprocess", "agc_max_gain")),
+        )
+
+    def set_motors_running(self, running):
+        """Tell the stage whether the motors are currently driven (called from any thread)."""
+        if running and not self.motors_running:
+            self._learn_left = self.learn_frames
+        elif not running and self.motors_running:
+            self._motor_stopped = time.monotonic()
+        self.motors_running = running
+
+    def on_motion_state(self, state):
+        """MotionQueue listener: motors run while a movement is executing."""
+        self.set_motors_running(state.get("current") is not None)
+
+    def process(self, data):
+        """Clean one chunk of int16 bytes. Output lags the input by frame/2 samples."""
+        samples = np.frombuffer(data, dtype=np.int16)
+        n = len(samples)
+        if n > self.max_chunk:
+            return b"".join(self.process(data[i:i + self.max_chunk * 2])
+                            for i in range(0, len(data), self.max_chunk * 2))
+        self.chunks += 1
+        self.samples += n
+        clock = time.thread_time
+        frame, hop = self.frame, self.hop
+
+        start = clock()
+        buffer = self._input
+        np.copyto(buffer[self._filled:self._filled + n], samples, casting="unsafe")
+        self._filled += n
+        count = (self._filled - frame) // hop + 1 if self._filled >= frame else 0
+        if count == 0:
+            return b""
+        frames = self._frames[:count]
+        windows = np.lib.stride_tricks.as_strided(
+            buffer, shape=(count, frame), strides=(hop * buffer.itemsize, buffer.itemsize), writeable=False
+        )
+        np.multiply(windows, self._window, out=frames)
+        spectrum = self._spectrum[:count]
+        if _FFT_OUT:
+            np.fft.rfft(frames, axis=1, out=spectrum)
+        else:
+            spectrum[:] = np.fft.rfft(frames, axis=1)
+        t = clock()
+        self.stage_seconds["analysis"] += t - start
+
+        if self.highpass_hz > 0:
+            np.multiply(spectrum, self._highpass, out=spectrum)
+        start, t = t, clock()
+        self.stage_seconds["highpass"] += t - start
+
+        if self.noise_suppression:
+            self._suppress(spectrum, count)
+        start, t = t, clock()
+        self.stage_seconds["noise"] += t - start
+
+        if _FFT_OUT:
+            np.fft.irfft(spectrum, n=frame, axis=1, out=frames)
+        else:
+            frames[:] = np.fft.irfft(spectrum, n=frame, axis=1)
+        np.multiply(frames, self._window, out=frames)
+        produced = count * hop
+        output = self._output[:produced]
+        # Overlap-add: each output hop is the first half of frame k plus the second half of frame k-1
+        output.reshape(count, hop)[:] = frames[:, :hop]
+        output[hop:].reshape(count - 1, hop)[:] += frames[:-1, hop:]
+        output[:hop] += self._carry
+        self._carry[:] = frames[-1, hop:]
+        remaining = self._filled - produced
+        buffer[:remaining] = buffer[produced:self._filled]
+        self._filled = remaining
+        start, t = t, clock()
+        self.stage_seconds["synthesis"] += t - start
+
+        if self.agc:
+            self._apply_agc(output)
+        np.clip(output, -32768, 32767, out=output)
+        np.rint(output, out=output)
+        out16 = self._output16[:produced]
+        np.copyto(out16, output, casting="unsafe")
+        self.stage_seconds["agc"] += clock() - t
+        return out16.tobytes()
+
+    def _suppress(self, spectrum, count):
+        """Learn the motor-noise profile while motors run and subtract it from the power spectrum."""
+        power = self._power[:count]
+        np.absolute(spectrum, out=power)
+        np.square(power, out=power)
+
+        if self.motors_running:
+            # Learn from the first frames after the motors start, then only from
+            # frames that are not much louder than the profile (i.e. not speech)
+            frame_power = self._frame_power[:count]
+            power.mean(axis=1, out=frame_power)
+            learn = self._learn_mask[:count]
+            if self._learn_left > 0 or not self.noise_frames:
+                learn[:] = True
+                self._learn_left -= count
+            else:
+                np.less(frame_power, 4.0 * float(self.noise_profile.mean()), out=learn)
+            learned = int(learn.sum())
+            if learned:
+                np.mean(power, axis=0, where=learn[:, None], out=self._noise_update)
+                # Plain average until the profile has settled, then exponential
+                if self.noise_frames * self.noise_adapt < 1.0:
+                    rate = learned / (self.noise_frames + learned)
+                else:
+                    rate = min(1.0, self.noise_adapt * learned)
+                self._noise_update -= self.noise_profile
+                self._noise_update *= rate
+                self.noise_profile += self._noise_update
+                self.noise_frames += learned
+        elif time.monotonic() - self._motor_stopped > self.hangover:
+            return  # motors quiet: nothing to subtract
+        if not self.noise_frames:
+            return
+
+        gain = self._gain[:count]
+        np.maximum(power, 1e-6, out=power)
+        np.divide(self.noise_profile, power, out=gain)
+        gain *= -self.over_subtraction
+        gain += 1.0
+        np.maximum(gain, self.spectral_floor * self.spectral_floor, out=gain)
+        np.sqrt(gain, out=gain)
+        spectrum *= gain
+
+    def _apply_agc(self, output):
+        """Move the gain towards agc_target RMS, ramping across the chunk to avoid steps."""
+        rms = float(np.sqrt(np.dot(output, output) / max(len(output), 1)))
+        previous = self._agc_gain
+        if rms > self.agc_gate:
+            wanted = min(self.agc_target / rms, self.agc_max_gain)
+            # Fast when the level must come down, slow when it goes up
+            speed = self.agc_attack if wanted < previous else self.agc_release
+            self._agc_gain = previous + (wanted - previous) * speed
+        ramp = self._ramp[:len(output)]
+        ramp[:] = np.linspace(previous, self._agc_gain, len(output), dtype=np.float32)
+        np.multiply(output, ramp, out=output)
+
+    def stats(self):
+        """Per-stage CPU milliseconds per second of audio processed."""
+        audio_seconds = self.samples / self.rate
+        per_second = {stage: 1000 * seconds / audio_seconds if audio_seconds else 0.0
+                      for stage, seconds in self.stage_seconds.items()}
+        return {
+            "audio_seconds": audio_seconds,
+            "chunks": self.chunks,
+            "cpu_ms_per_audio_second": per_second,
+            "total_cpu_ms_per_audio_second": sum(per_second.values()),
+            "noise_frames": self.noise_frames,
+            "agc_gain": self._agc_gain,
+        }
+
+    def log_stats(self):
+        self.events.event("preprocess_stats", level=QUIET, **self.stats())
+
+
+def benchmark(seconds=60.0, rate=16000, chunk=4096):
+    """Run synthetic motor whine plus bursts of 'speech' through the stage; report CPU and SNR gain."""
+    rng = np.random.default_rng(0)
+    total = int(seconds * rate)
+    t = np.arange(total) / rate
+    whine = sum(600 * np.sin(2 * np.pi * f * t) for f in (820, 1640, 2460)) + rng.normal(0, 200, total)
+    speech = np.zeros(total)
+    for start in range(rate, total - rate, 3 * rate):
+        seg = slice(start, start + rate // 2)
+        speech[seg] = 2500 * np.sin(2 * np.pi * 300 * t[seg]) * np.sin(2 * np.pi * 4 * t[seg]) ** 2
+    pcm = (whine + speech).astype(np.int16).tobytes()
+
+    stage = AudioPreprocessor(rate=rate, agc=False)
+    stage.set_motors_running(True)
+    out = b"".join(stage.process(pcm[i:i + chunk * 2]) for i in range(0, len(pcm), chunk * 2))
+    y = np.frombuffer(out, dtype=np.int16).astype(np.float64)
+    lag = stage.hop
+    clean = speech[:len(y) - lag]
+    y = y[lag:]
+    mask = clean != 0
+
+    def snr(signal):
+        noise = signal - clean
+        return 10 * np.log10(np.sum(clean[mask] ** 2) / max(np.sum(noise[~mask] ** 2) * mask.sum() / (~mask).sum(), 1e-9))
+
+    report = stage.stats()
+    report["snr_in_db"] = snr((whine + speech)[:len(clean)])
+    report["snr_out_db"] = snr(y)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the audio pre-processing stage")
+    parser.add_argument("--seconds", type=float, default=60.0, help="seconds of synthetic audio")
+    args = parser.parse_args()
+    report = benchmark(args.seconds)
+    for stage, ms in report.pop("cpu_ms_per_audio_second").items():
+        print(f"{stage + ' (ms/s)':<30}{ms:.3f}")
+    for key, value in report.items():
+        print(f"{key:<30}{value:.3f}" if isinstance(value, float) else f"{key:<30}{value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+
+# Overflow detection and backpressure for the capture loop.
+# Every read goes through CaptureMonitor.read(), which samples how much audio is
+# already waiting in the host buffer (the backlog). Reads never raise on overflow:
+# PyAudio would throw away the chunk it had just read, so the overrun is inferred
+# instead and the audio is kept: a read overran when less audio arrived since the
+# previous read than the elapsed time accounts for, by more than one chunk period
+# plus READ_JITTER seconds of scheduling jitter - the rest was dropped. The host
+# buffer size is deliberately not part of the tolerance, so overflows smaller than
+# a whole (possibly grown) buffer are still counted.
+# reset() forgets the previous read whenever the stream is (re)started, so time
+# spent stopped is not mistaken for lost audio. Each overflow is logged with what the pipeline was doing at the time
+# (current movement, last decode time, backlog, whether speech was in progress).
+# Two adaptive responses:
+#   - catch-up: while the backlog exceeds skip_backlog seconds, chunks that the
+#     volume gate marked silent are not decoded, unless an utterance is in progress
+#     (the recognizer needs that silence to finalize it).
+#   - buffer growth: after grow_after overflows within overflow_window seconds, the
+#     caller reopens the stream with a larger buffer (doubling, up to a maximum).
+# `dropping` stays true for warning_hold seconds after an overflow (GUI warning).
+
+import time
+from collections import deque
+
+from event_log import get_event_log, QUIET
+
+READ_JITTER = 0.02   # seconds of read timing slack before missing audio counts as lost
+
+
+class CaptureMonitor:
+    """Counts input overflows and decides when to skip silent chunks or grow the buffer."""
+
+    def __init__(self, rate, buffer_frames, max_buffer_frames, skip_backlog=0.5, grow_after=3,
+                 overflow_window=10.0, warning_hold=5.0, context=None):
+        self.rate = rate
+        self.buffer_frames = buffer_frames
+        self.max_buffer_frames = max_buffer_frames
+        self.skip_backlog = skip_backlog
+        self.grow_after = grow_after
+        self.overflow_window = overflow_window
+        self.warning_hold = warning_hold
+        self.context = context  # () -> dict describing the rest of the pipeline
+        self.events = get_event_log()
+
+        self.overflows = 0
+        self.skipped = 0
+        self.reads = 0
+        self.max_backlog = 0.0
+        self.backlog = 0.0
+        self.last_decode = 0.0
+        self.utterance_active = False
+        self.overran = False        # the last read followed an input overflow
+        self._recent = deque()      # monotonic times of recent overflows
+        self._last_overflow = None
+        self._last_read = None      # (monotonic time, frames left waiting) after the previous read
+
+    @classmethod
+    def from_calibration(cls, calibration_manager, rate, buffer_frames, context=None):
+        """Build from the "audio" calibration category."""
+        get = calibration_manager.get_setting
+        return cls(
+            rate, buffer_frames,
+            max_buffer_frames=int(float(get("audio", "max_buffer_seconds")) * rate),
+            skip_backlog=float(get("audio", "skip_silence_backlog")),
+            grow_after=int(get("audio", "grow_after_overflows")),
+            overflow_window=float(get("audio", "overflow_window")),
+            warning_hold=float(get("audio", "overflow_warning_hold")),
+            context=context,
+        )
+
+    @property
+    def dropping(self):
+        """True while an overflow happened within the last warning_hold seconds."""
+        return self._last_overflow is not None and time.monotonic() - self._last_overflow < self.warning_hold
+
+    @property
+    def behind(self):
+        return self.backlog > self.skip_backlog
+
+    def reset(self):
+        """Forget the previous read; call whenever the stream is started."""
+        self._last_read = None
+
+    def read(self, stream, frames):
+        """Read one chunk; sets `overran` if audio was dropped before it (the chunk is kept)."""
+        self.reads += 1
+        now = time.monotonic()
+        try:
+            available = stream.get_read_available()
+        except (IOError, OSError):
+            available = 0
+        self.backlog = available / self.rate
+        if self.backlog > self.max_backlog:
+            self.max_backlog = self.backlog
+        self.overran = self._lost(now, available, frames)
+        if self.overran:
+            self._overflowed()
+        data = stream.read(frames, exception_on_overflow=False)
+        self._last_read = (time.monotonic(), max(available - frames, 0))
+        return data
+
+    def _lost(self, now, available, frames):
+        """True if the host buffer overran since the previous read."""
+        if self._last_read is None:
+            return False
+        then, waiting = self._last_read
+        arrived = available - waiting
+        return (now - then) * self.rate - arrived > frames + READ_JITTER * self.rate
+
+    def _overflowed(self):
+        now = time.monotonic()
+        self.overflows += 1
+        self._last_overflow = now
+        self._recent.append(now)
+        while self._recent and now - self._recent[0] > self.overflow_window:
+            self._recent.popleft()
+        context = self.context() if self.context else {}
+        self.events.event(
+            "audio_overflow", level=QUIET, count=self.overflows, recent=len(self._recent),
+            backlog=round(self.backlog, 3), last_decode=round(self.last_decode, 4),
+            utterance_active=self.utterance_active, buffer_frames=self.buffer_frames, **context
+        )
+
+    def grow_buffer(self):
+        """New buffer size if overflows keep happening and there is room to grow, else None."""
+        if len(self._recent) < self.grow_after or self.buffer_frames >= self.max_buffer_frames:
+            return None
+        previous = self.buffer_frames
+        self.buffer_frames = min(self.buffer_frames * 2, self.max_buffer_frames)
+        self._recent.clear()
+        self.events.event("capture_buffer_grown", level=QUIET, frames=self.buffer_frames, previous=previous)
+        return self.buffer_frames
+
+    def skip_decode(self, silent):
+        """True if this chunk can be dropped before the decoder to catch up."""
+        if not silent:
+            self.utterance_active = True
+            return False
+        if self.behind and not self.utterance_active:
+            self.skipped += 1
+            return True
+        return False
+
+    def decoded(self, seconds, final):
+        """Record decode time; a final result ends the current utterance."""
+        self.last_decode = seconds
+        if final:
+            self.utterance_active = False
+
+    def stats(self):
+        return {
+            "reads": self.reads,
+            "overflows": self.overflows,
+            "skipped": self.skipped,
+            "max_backlog": round(self.max_backlog, 3),
+            "buffer_frames": self.buffer_frames,
+        }
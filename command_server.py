@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+
+# Local network command API.
+# An asyncio HTTP/WebSocket server (standard library only) that feeds the same
+# CommandDispatcher as the microphone, so dashboards and scripted tests can drive
+# the robot without speech decoding.
+#
+#   GET  /state          -> current dispatcher/motion state
+#   GET  /commands       -> command vocabulary
+#   GET  /metrics        -> runtime metrics registered by the application
+#   POST /command        -> body: {"text": "turn left"} or the plain phrase
+#   GET  /macros         -> saved macros, recording and replay state
+#   POST /macro          -> body: {"name": "patrol", "action": "play", "speedup": 2}
+#                           (actions: play, record, end, cancel, abort)
+#   GET  /models         -> available/loaded models and the last switch timing
+#   POST /model          -> body: {"name": "vosk-model-en-us-0.22"}; switches in the background
+#                           (404 for an unknown model, 409 while a switch is in progress)
+#   GET  /ws             -> WebSocket; send phrases as text frames, receive a JSON
+#                           stream of recognized text, commands and state changes
+
+import json
+import base64
+import asyncio
+import hashlib
+import threading
+
+from event_log import get_event_log, QUIET
+
+WS_MAGIC = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+MAX_BODY = 64 * 1024
+
+
+class _Client:
+    """Outbound message buffer for one WebSocket client."""
+
+    def __init__(self, queue_size):
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+
+    def offer(self, message):
+        """Queue a message; if the client is too slow, drop its oldest message."""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(message)
+
+
+class CommandServer:
+    """Runs the command API on its own thread and event loop."""
+
+    def __init__(self, dispatcher, host="127.0.0.1", port=8765, max_clients=64, client_queue_size=100):
+        self.dispatcher = dispatcher
+        self.host = host
+        self.port = port
+        self.max_clients = max_clients
+        self.client_queue_size = client_queue_size
+        self.metrics = {}  # name -> callable returning a JSON-serializable snapshot
+        self.macros = None  # MacroRecorder, when the application enables macros
+        self.models = None  # ModelRegistry, for runtime model switching
+        self.events = get_event_log()
+
+        self._clients = set()
+        self._connections = 0
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._ready = threading.Event()
+
+    @classmethod
+    def from_calibration(cls, dispatcher, calibration_manager, port=None):
+        """Build a server from the "network_api" calibration category."""
+        get = calibration_manager.get_setting
+        return cls(
+            dispatcher,
+            host=get("network_api", "host"),
+            port=int(port or get("network_api", "port")),
+            max_clients=int(get("network_api", "max_clients")),
+            client_queue_size=int(get("network_api", "client_queue_size")),
+        )
+
+    def start(self):
+        """Start serving in a background thread. Returns once the socket is bound."""
+        self._thread = threading.Thread(target=self._run, name="command-api")
+        self._thread.daemon = True
+        self._thread.start()
+        self._ready.wait(timeout=5.0)
+        self.dispatcher.listeners.append(self.publish)
+        return self._server is not None
+
+    def stop(self, timeout=2.0):
+        """Stop serving and close all connections."""
+        if self.publish in self.dispatcher.listeners:
+            self.dispatcher.listeners.remove(self.publish)
+        if self._loop and self._loop.is_running():
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        if self._thread:
+            self._thread.join(timeout=timeout)
+
+    def publish(self, message):
+        """Fan a message out to every WebSocket client. Safe to call from any thread."""
+        loop = self._loop
+        if loop is None or not self._clients:
+            return
+        try:
+            loop.call_soon_threadsafe(self._broadcast, json.dumps(message))
+        except RuntimeError:
+            pass  # loop already closed
+
+    def _broadcast(self, text):
+        for client in self._clients:
+            client.offer(text)
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._server = self._loop.run_until_complete(
+                asyncio.start_server(self._handle, self.host, self.port)
+            )
+            self.events.event("api_started", level=QUIET, host=self.host, port=self.port)
+        except OSError as e:
+            self.events.event("api_error", level=QUIET, error=str(e))
+            self._ready.set()
+            return
+        self._ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            self._server.close()
+            tasks = asyncio.all_tasks(self._loop)
+            for task in tasks:
+                task.cancel()
+            self._loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            self._loop.close()
+            self.events.event("api_stopped", level=QUIET)
+
+    async def _handle(self, reader, writer):
+        """Serve one connection: a single HTTP request or a WebSocket session."""
+        if self._connections >= self.max_clients:
+            await self._respond(writer, 503, {"error": "too many clients"})
+            writer.close()
+            return
+        self._connections += 1
+        try:
+            method, path, headers = await self._read_request(reader)
+            if headers.get("upgrade", "").lower() == "websocket" and path == "/ws":
+                await self._websocket(reader, writer, headers)
+            else:
+                body = b""
+                length = int(headers.get("content-length", 0) or 0)
+                if length > MAX_BODY:
+                    await self._respond(writer, 413, {"error": "body too large"})
+                    return
+                if length:
+                    body = await reader.readexactly(length)
+                status, payload = self._route(method, path, body)
+                await self._respond(writer, status, payload)
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            self._connections -= 1
+            writer.close()
+
+    async def _read_request(self, reader):
+        head = await reader.readuntil(b"\r\n\r\n")
+        lines = head.decode("latin-1").split("\r\n")
+        method, path, _ = lines[0].split(" ", 2)
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                key, value = line.split(":", 1)
+                headers[key.strip().lower()] = value.strip()
+        return method.upper(), path.split("?", 1)[0], headers
+
+    def _route(self, method, path, body):
+        """Handle a plain HTTP request. Returns (status, payload)."""
+        if method == "GET" and path == "/state":
+            return 200, self.dispatcher.state()
+        if method == "GET" and path == "/commands":
+            return 200, self.dispatcher.keywords
+        if method == "GET" and path == "/metrics":
+            return 200, {name: snapshot() for name, snapshot in self.metrics.items()}
+        if method == "POST" and path == "/command":
+            text = self._command_text(body)
+            if not text:
+                return 400, {"error": "missing command text"}
+            command = self._command(text)
+            return 200, {"text": text, "command": command, "accepted": command is not None}
+        if self.models and method == "GET" and path == "/models":
+            return 200, self.models.state()
+        if self.models and method == "POST" and path == "/model":
+            name = self._command_text(body, key="name")
+            if name not in self.models.names():
+                return 404, {"error": f"no model named {name!r}", "available": self.models.names()}
+            if not self.models.request_switch(name):
+                return 409, {"error": "cannot switch now (not ready, or a switch is in progress)",
+                             **self.models.state()}
+            return 200, {"switching": name, **self.models.state()}
+        if self.macros and method == "GET" and path == "/macros":
+            return 200, self.macros.state()
+        if self.macros and method == "POST" and path == "/macro":
+            return self._macro(body)
+        return 404, {"error": "not found"}
+
+    def _command(self, text):
+        """Act on a phrase from HTTP or a WebSocket: a macro phrase, else a robot command.
+
+        Returns the macro action or command name, or None if nothing matched.
+        """
+        action = self.macros.handle_text(text) if self.macros else None
+        if action:
+            return action
+        return self.dispatcher.dispatch(text, source="api")
+
+    def _macro(self, body):
+        try:
+            request = json.loads(body.decode("utf-8", errors="replace") or "{}")
+            name = str(request.get("name", "")).lower().strip()
+            action = request.get("action", "play")
+            speedup = float(request["speedup"]) if request.get("speedup") else None
+        except (ValueError, TypeError, AttributeError):
+            return 400, {"error": 'expected {"name": ..., "action": ...}'}
+        if action == "play":
+            if not self.macros.play(name, speedup):
+                return 404, {"error": f"no macro named {name!r}"}
+        elif action == "record" and name:
+            self.macros.start_recording(name)
+        elif action in ("end", "cancel"):
+            self.macros.end_recording(save=action == "end")
+        elif action == "abort":
+            self.macros.abort()
+        else:
+            return 400, {"error": f"unknown action {action!r}"}
+        return 200, self.macros.state()
+
+    @staticmethod
+    def _command_text(body, key="text"):
+        """Accept either {"text": "..."} (or another key) or the raw phrase."""
+        raw = body.decode("utf-8", errors="replace").strip()
+        if raw.startswith("{"):
+            try:
+                return str(json.loads(raw).get(key, "")).strip()
+            except (ValueError, AttributeError):
+                return ""
+        return raw
+
+    async def _respond(self, writer, status, payload):
+        reasons = {200: "OK", 400: "Bad Request", 404: "Not Found", 409: "Conflict", 413: "Payload Too Large",
+                   503: "Service Unavailable"}
+        body = json.dumps(payload).encode()
+        writer.write(
+            f"HTTP/1.1 {status} {reasons.get(status, '')}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+
+    async def _websocket(self, reader, writer, headers):
+        """Run a WebSocket session until either side closes."""
+        key = headers.get("sec-websocket-key", "")
+        accept = base64.b64encode(hashlib.sha1((key + WS_MAGIC).encode()).digest()).decode()
+        writer.write(
+            "HTTP/1.1 101 Switching Protocols\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {accept}\r\n\r\n".encode()
+        )
+        await writer.drain()
+
+        client = _Client(self.client_queue_size)
+        client.offer(json.dumps({"type": "state", **self.dispatcher.state()}))
+        self._clients.add(client)
+        sender = asyncio.ensure_future(self._ws_sender(client, writer))
+        try:
+            while True:
+                opcode, payload = await self._ws_read_frame(reader)
+                if opcode == 0x8:  # close
+                    break
+                if opcode == 0x9:  # ping
+                    writer.write(self._ws_frame(payload, opcode=0xA))
+                    await writer.drain()
+                elif opcode == 0x1:
+                    text = payload.decode("utf-8", errors="replace").strip()
+                    if text:
+                        self._command(text)
+        finally:
+            self._clients.discard(client)
+            sender.cancel()
+
+    async def _ws_sender(self, client, writer):
+        """Drain one client's outbound queue; a slow client only stalls itself."""
+        while True:
+            text = await client.queue.get()
+            writer.write(self._ws_frame(text.encode()))
+            await writer.drain()
+
+    @staticmethod
+    async def _ws_read_frame(reader):
+        header = await reader.readexactly(2)
+        opcode = header[0] & 0x0F
+        masked = header[1] & 0x80
+        length = header[1] & 0x7F
+        if length == 126:
+            length = int.from_bytes(await reader.readexactly(2), "big")
+        elif length == 127:
+            length = int.from_bytes(await reader.readexactly(8), "big")
+        if length > MAX_BODY:
+            raise ValueError("frame too large")
+        mask = await reader.readexactly(4) if masked else b"\x00\x00\x00\x00"
+        data = await reader.readexactly(length)
+        if masked:
+            data = bytes(b ^ mask[i % 4] for i, b in enumerate(data))
+        return opcode, data
+
+    @staticmethod
+    def _ws_frame(payload, opcode=0x1):
+        length = len(payload)
+        if length < 126:
+            header = bytes([0x80 | opcode, length])
+        elif length < 65536:
+            header = bytes([0x80 | opcode, 126]) + length.to_bytes(2, "big")
+        else:
+            header = bytes([0x80 | opcode, 127]) + length.to_bytes(8, "big")
+        return header + payload
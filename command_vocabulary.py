@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+
+# The command vocabulary: which phrases trigger which command.
+# It lives in keywords.json rather than in the scripts:
+#
+#   {"version": 1,
+#    "commands": {"forward": ["forward", "move forward", ...], "stop": [...], ...}}
+#
+# Loading validates the file (known command names, non-empty lists of plain
+# lowercase phrases, no phrase claimed by two commands) and precompiles the
+# phrase -> command index the dispatcher matches against. VocabularyWatcher polls
+# the file and hands every valid new version to a callback; an invalid edit is
+# logged and the current vocabulary stays in use.
+#
+# Check a file:  python3 command_vocabulary.py [keywords.json]
+
+import os
+import re
+import sys
+import json
+import time
+import threading
+
+from event_log import get_event_log, QUIET
+from dispatcher import MOVEMENT_COMMANDS, CONTROL_COMMANDS
+
+DEFAULT_KEYWORDS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "keywords.json")
+KNOWN_COMMANDS = MOVEMENT_COMMANDS + CONTROL_COMMANDS
+SCHEMA_VERSION = 1
+PHRASE_PATTERN = re.compile(r"^[a-z']+( [a-z']+)*$")
+
+
+class VocabularyError(ValueError):
+    """The keywords file is missing, unreadable or does not match the schema."""
+
+
+def normalize(phrase):
+    return " ".join(phrase.lower().split())
+
+
+def validate_keywords(data):
+    """Return the list of schema errors in a parsed keywords file (empty if valid)."""
+    if not isinstance(data, dict):
+        return ["top level must be an object"]
+    errors = []
+    for key in data:
+        if key not in ("version", "commands"):
+            errors.append(f"unknown key '{key}'")
+    if data.get("version", SCHEMA_VERSION) != SCHEMA_VERSION:
+        errors.append(f"unsupported version {data.get('version')!r} (expected {SCHEMA_VERSION})")
+    commands = data.get("commands")
+    if not isinstance(commands, dict) or not commands:
+        return errors + ["'commands' must be a non-empty object"]
+
+    owner = {}
+    for command, phrases in commands.items():
+        if command not in KNOWN_COMMANDS:
+            errors.append(f"commands.{command}: unknown command (known: {', '.join(KNOWN_COMMANDS)})")
+        if not isinstance(phrases, list) or not phrases:
+            errors.append(f"commands.{command}: must be a non-empty list of phrases")
+            continue
+        for i, phrase in enumerate(phrases):
+            where = f"commands.{command}[{i}]"
+            if not isinstance(phrase, str):
+                errors.append(f"{where}: must be a string")
+                continue
+            normalized = normalize(phrase)
+            if not PHRASE_PATTERN.match(normalized):
+                errors.append(f"{where}: '{phrase}' must be words of letters and apostrophes")
+            elif normalized in owner:
+                other = owner[normalized]
+                errors.append(f"{where}: '{normalized}' is already listed under "
+                              + ("this command" if other == command else f"'{other}'"))
+            else:
+                owner[normalized] = command
+    return errors
+
+
+class CommandVocabulary:
+    """A validated keyword map with its precompiled phrase index."""
+
+    def __init__(self, keywords, path=None):
+        self.path = path
+        self.keywords = {command: [normalize(p) for p in phrases] for command, phrases in keywords.items()}
+        self.index = {phrase: command for command, phrases in self.keywords.items() for phrase in phrases}
+        self.phrases = list(self.index)
+
+    @classmethod
+    def load(cls, path=None):
+        """Read and validate a keywords file (default: keywords.json next to this module)."""
+        path = path or DEFAULT_KEYWORDS_FILE
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except OSError as e:
+            raise VocabularyError(f"{path}: {e.strerror or e}") from e
+        except ValueError as e:
+            raise VocabularyError(f"{path}: invalid JSON: {e}") from e
+        errors = validate_keywords(data)
+        if errors:
+            raise VocabularyError(f"{path}: " + "; ".join(errors))
+        return cls(data["commands"], path)
+
+    @classmethod
+    def from_calibration(cls, calibration_manager):
+        """Load the file named by the "vocabulary" calibration category."""
+        return cls.load(resolve_path(calibration_manager.get_setting("vocabulary", "path")))
+
+    def match(self, text):
+        return self.index.get(normalize(text))
+
+
+def resolve_path(path):
+    """Relative paths are taken from the working directory, falling back to this module's directory."""
+    if not path:
+        return DEFAULT_KEYWORDS_FILE
+    if os.path.isabs(path) or os.path.exists(path):
+        return path
+    return os.path.join(os.path.dirname(DEFAULT_KEYWORDS_FILE), path)
+
+
+class VocabularyWatcher:
+    """Polls the keywords file and passes each valid new version to on_change(vocabulary)."""
+
+    def __init__(self, path, on_change, interval=1.0):
+        self.path = path
+        self.on_change = on_change
+        self.interval = interval
+        self.reloads = 0
+        self.failures = 0
+        self.events = get_event_log()
+        self._seen = self._signature()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def from_calibration(cls, calibration_manager, vocabulary, on_change):
+        return cls(vocabulary.path, on_change,
+                   interval=float(calibration_manager.get_setting("vocabulary", "poll_interval")))
+
+    def _signature(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="vocabulary-watcher")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=1.0)
+
+    def _run(self):
+        pending = None
+        while not self._stop.wait(self.interval):
+            signature = self._signature()
+            if signature is None or signature == self._seen:
+                pending = None
+                continue
+            if signature != pending:
+                # Changed since the last poll: wait one more interval so a save in progress can finish
+                pending = signature
+                continue
+            self._seen, pending = signature, None
+            self.check()
+
+    def check(self):
+        """Load the file now; returns the new vocabulary or None if it is invalid."""
+        started = time.perf_counter()
+        try:
+            vocabulary = CommandVocabulary.load(self.path)
+        except VocabularyError as e:
+            self.failures += 1
+            self.events.event("vocabulary_invalid", level=QUIET, path=self.path, error=str(e))
+            return None
+        self.reloads += 1
+        self.events.event("vocabulary_loaded", level=QUIET, path=self.path, phrases=len(vocabulary.phrases),
+                          commands=len(vocabulary.keywords), load_ms=round((time.perf_counter() - started) * 1000, 2))
+        self.on_change(vocabulary)
+        return vocabulary
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_KEYWORDS_FILE
+    try:
+        vocabulary = CommandVocabulary.load(path)
+    except VocabularyError as e:
+        print(e)
+        sys.exit(1)
+    print(f"{path}: {len(vocabulary.keywords)} commands, {len(vocabulary.phrases)} phrases")
+    for command, phrases in vocabulary.keywords.items():
+        print(f"   {command}: {', '.join(phrases)}")
+
+
+if __name__ == "__main__":
+    main()
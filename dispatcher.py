@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+
+# Command dispatch shared by every input path (voice, network API, ...).
+# Text is matched against the keyword vocabulary once, through a precompiled
+# phrase index, and the resulting movement is queued on a single actuation
+# thread so the recognition loop never sleeps inside a motor command.
+# Every stop starts a new generation: movements queued before it (including one
+# the actuation thread already took off the queue and is holding while paused)
+# are dropped instead of running later. A robot with a `halt` event has it set by
+# stop(), which cuts the movement in progress short.
+
+import queue
+import threading
+
+from event_log import get_event_log, QUIET
+
+# Commands that map straight onto a movement controller method
+MOVEMENT_COMMANDS = ("forward", "backward", "left", "right", "horizontal_left", "horizontal_right")
+# Commands the dispatcher handles itself
+CONTROL_COMMANDS = ("stop", "pause", "resume")
+
+
+class MotionQueue:
+    """Runs robot movements one at a time on a dedicated actuation thread."""
+
+    def __init__(self, robot, maxsize=8, watchdog=None, profiler=None):
+        self.robot = robot
+        self.watchdog = watchdog
+        self.profiler = profiler  # RuntimeProfiler; the actuation thread checks in between movements
+        self.events = get_event_log()
+        self.current = None
+        self.rejected = 0
+        self.listeners = []
+
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self._generation = 0      # bumped by every stop; older queued movements are stale
+        self._resume = threading.Event()
+        self._resume.set()
+        self._thread = threading.Thread(target=self._run, name="actuation")
+        self._thread.daemon = True
+        self._thread.start()
+
+    @property
+    def paused(self):
+        return not self._resume.is_set()
+
+    @property
+    def pending(self):
+        return self._queue.qsize()
+
+    @property
+    def full(self):
+        """True while submit() would reject a movement."""
+        return self._queue.full()
+
+    def submit(self, command, source="voice"):
+        """Queue a movement. Never blocks; returns False if the queue is full."""
+        try:
+            self._queue.put_nowait((command, source, self._generation))
+        except queue.Full:
+            self.rejected += 1
+            self.events.event("motion_rejected", command=command, source=source, reason="queue_full")
+            return False
+        self._notify()
+        return True
+
+    def stop_now(self, source="voice"):
+        """Drop queued movements and stop the motors immediately."""
+        with self._lock:
+            self._generation += 1
+            self._clear()
+            self.robot.stop()
+        self._notify()
+
+    def pause(self):
+        """Hold queued movements until resume() is called."""
+        self._resume.clear()
+        self._notify()
+
+    def resume(self):
+        """Release movements held by pause()."""
+        self._resume.set()
+        self._notify()
+
+    def wait_idle(self):
+        """Block until every queued movement has run or been dropped."""
+        self._queue.join()
+
+    def close(self, timeout=1.0):
+        """Stop the actuation thread after the current movement finishes; nothing queued runs."""
+        with self._lock:
+            self._generation += 1
+            self._clear()
+        self._resume.set()
+        self._queue.put(None)
+        self._thread.join(timeout=timeout)
+
+    def state(self):
+        """Snapshot of the motion state."""
+        return {"current": self.current, "pending": self.pending, "paused": self.paused}
+
+    def _clear(self):
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                return
+            self._queue.task_done()
+
+    def _notify(self):
+        state = self.state()
+        for listener in list(self.listeners):
+            listener({"type": "state", **state})
+
+    def _run(self):
+        """Actuation thread: execute queued movements in order."""
+        while True:
+            if self.profiler:
+                self.profiler.checkpoint()
+                try:
+                    # Wake up now and then so a profiling session starts/ends while idle
+                    item = self._queue.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+            else:
+                item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                break
+            self._resume.wait()
+            command, source, generation = item
+            with self._lock:
+                stale = generation != self._generation
+                if not stale:
+                    # Cleared here, under the lock, so a stop from now on interrupts this movement
+                    halt = getattr(self.robot, "halt", None)
+                    if halt is not None:
+                        halt.clear()
+                    self.current = command
+            if stale:
+                # Queued (or held while paused) before a stop
+                self.events.event("motion_dropped", command=command, source=source, reason="stopped")
+                self._queue.task_done()
+                continue
+            self._notify()
+            if self.watchdog:
+                self.watchdog.beat("actuation")
+            try:
+                getattr(self.robot, command)()
+            except Exception as e:
+                self.events.event("motion_error", level=QUIET, command=command, source=source, error=str(e))
+            if self.watchdog:
+                self.watchdog.idle("actuation")
+            self.current = None
+            self._queue.task_done()
+            self._notify()
+
+
+class CommandDispatcher:
+    """Matches text against the keyword vocabulary and routes it to the motion queue."""
+
+    def __init__(self, keywords, motion_queue, index=None):
+        self.motion = motion_queue
+        self.events = get_event_log()
+        self.listeners = []
+        self.last_command = None
+        self.set_keywords(keywords, index)
+        self.motion.listeners.append(self._notify)
+
+    def set_keywords(self, keywords, index=None):
+        """Swap in a keyword map and its phrase index (built here if not given; the first command listing a phrase wins)."""
+        if index is None:
+            index = {}
+            for command, phrases in keywords.items():
+                for phrase in phrases:
+                    index.setdefault(phrase.lower(), command)
+        self.keywords = keywords
+        self._index = index
+
+    def match(self, text):
+        """Return the command for a phrase, or None."""
+        return self._index.get(" ".join(text.lower().split()))
+
+    def dispatch(self, text, source="voice"):
+        """Match text and act on it. Returns the command name or None."""
+        return self.dispatch_matched(text, self.match(text), source)
+
+    def dispatch_matched(self, text, command, source="voice"):
+        """Act on text already looked up with match() (command may be None)."""
+        self.events.event("command", text=text, command=command, source=source)
+        self._notify({"type": "command", "text": text, "command": command, "source": source})
+        if command is None:
+            return None
+        return self.execute(command, source)
+
+    def execute(self, command, source="voice"):
+        """Act on an already matched command (no text, no matching). Returns the command name."""
+        self.last_command = command
+        if command == "stop":
+            self.motion.stop_now(source)
+        elif command == "pause":
+            self.motion.pause()
+        elif command == "resume":
+            self.motion.resume()
+        elif command in MOVEMENT_COMMANDS:
+            self.motion.submit(command, source)
+        return command
+
+    def state(self):
+        """Snapshot of dispatcher and motion state."""
+        return {"last_command": self.last_command, **self.motion.state()}
+
+    def _notify(self, message):
+        for listener in list(self.listeners):
+            listener(message)
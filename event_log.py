@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+
+# Structured event log shared by vosk-controll.py and vosk-controll(RC).py
+# Records are JSON lines stamped with a monotonic clock. They are pushed onto an
+# in-memory queue and written by a background thread, so the audio and actuation
+# threads never block on stdout or disk.
+
+import os
+import sys
+import json
+import time
+import queue
+import threading
+
+# Verbosity levels. An event is recorded when its level <= the configured verbosity.
+QUIET = 0    # lifecycle and errors only
+NORMAL = 1   # hot-path events: recognized commands and robot actions
+VERBOSE = 2  # every recognition result and per-frame diagnostics
+
+VERBOSITY_NAMES = {"quiet": QUIET, "normal": NORMAL, "verbose": VERBOSE}
+
+
+class EventLog:
+    """Queue-backed JSONL event writer with batched flushes and size-based rotation."""
+
+    def __init__(self, path="logs/events.jsonl", verbosity=NORMAL, echo=True,
+                 max_bytes=1_000_000, backup_count=3, batch_size=64,
+                 flush_interval=0.5, queue_size=10000):
+        self.path = path
+        self.verbosity = self._parse_verbosity(verbosity)
+        self.echo = echo
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._file = None
+        self._closed = False
+        self._writer = threading.Thread(target=self._run, name="event-log-writer")
+        self._writer.daemon = True
+        self._writer.start()
+
+    @staticmethod
+    def _parse_verbosity(value):
+        """Accept either a level name or an int."""
+        if isinstance(value, str):
+            return VERBOSITY_NAMES.get(value.lower(), NORMAL)
+        return int(value)
+
+    @classmethod
+    def from_calibration(cls, calibration_manager):
+        """Build an event log from the "event_log" calibration category."""
+        get = calibration_manager.get_setting
+        return cls(
+            path=get("event_log", "path"),
+            verbosity=get("event_log", "verbosity"),
+            echo=bool(get("event_log", "echo")),
+            max_bytes=int(get("event_log", "max_bytes")),
+            backup_count=int(get("event_log", "backup_count")),
+        )
+
+    def enabled(self, level=NORMAL):
+        """Return True if events at this level would be recorded."""
+        return level <= self.verbosity and not self._closed
+
+    def event(self, name, level=NORMAL, **fields):
+        """Record an event. Never blocks; drops the record if the queue is full."""
+        if level > self.verbosity or self._closed:
+            return
+        record = {"t": time.monotonic(), "wall": time.time(), "event": name}
+        record.update(fields)
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def set_verbosity(self, verbosity):
+        """Change verbosity at runtime."""
+        self.verbosity = self._parse_verbosity(verbosity)
+
+    def close(self, timeout=2.0):
+        """Flush pending records and stop the writer thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join(timeout=timeout)
+
+    def _run(self):
+        """Writer thread: drain the queue in batches and append to the log file."""
+        while True:
+            try:
+                record = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            batch = [record]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in batch
+            self._write_batch([r for r in batch if r is not None])
+            if stop:
+                break
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def _write_batch(self, batch):
+        """Write one batch of records and flush once."""
+        if not batch:
+            return
+        if self.dropped:
+            batch.append({"t": time.monotonic(), "wall": time.time(),
+                          "event": "event_log_dropped", "count": self.dropped})
+            self.dropped = 0
+        try:
+            self._open()
+            self._file.write("".join(json.dumps(r, default=str) + "\n" for r in batch))
+            self._file.flush()
+            if self._file.tell() >= self.max_bytes:
+                self._rotate()
+        except OSError as e:
+            print(f"Error writing event log: {e}", file=sys.stderr)
+        if self.echo:
+            for r in batch:
+                details = " ".join(f"{k}={v}" for k, v in r.items() if k not in ("t", "wall", "event"))
+                print(f"[{r['event']}] {details}".rstrip())
+            sys.stdout.flush()
+
+    def _open(self):
+        """Open the log file for appending, creating its directory if needed."""
+        if self._file is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(self.path, "a")
+
+    def _rotate(self):
+        """Shift events.jsonl -> events.jsonl.1 -> ... and start a fresh file."""
+        self._file.close()
+        self._file = None
+        for i in range(self.backup_count - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+
+_default_log = None
+
+
+def get_event_log():
+    """Return the process-wide event log, creating a default one on first use."""
+    global _default_log
+    if _default_log is None:
+        _default_log = EventLog()
+    return _default_log
+
+
+def set_event_log(event_log):
+    """Replace the process-wide event log (closing the previous one)."""
+    global _default_log
+    if _default_log is not None and _default_log is not event_log:
+        _default_log.close()
+    _default_log = event_log
+    return event_log
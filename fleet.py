@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+
+# Fan-out control of several robots from one recognizer.
+# Phrases may be prefixed with a target name ("robot two forward") or a broadcast
+# word ("all stop"). A bare target name ("robot two") makes it the default target
+# for unprefixed commands. Local robots are driven through their CommandDispatcher;
+# remote robots through the network command API (command_server.py) they run.
+# dispatch() never waits on the network: it runs on the recognition pipeline's
+# event loop, so each remote send goes to that robot's own single-thread executor
+# (which also keeps one robot's commands in order) and the outcome is logged once
+# every target has answered.
+
+import json
+import time
+import threading
+import http.client
+from concurrent.futures import ThreadPoolExecutor
+
+from event_log import get_event_log, QUIET, NORMAL
+
+BROADCAST = "*"
+
+
+class LocalBackend:
+    """A robot driven by a CommandDispatcher in this process."""
+
+    def __init__(self, dispatcher):
+        self.dispatcher = dispatcher
+
+    def send(self, phrase, source):
+        return {"command": self.dispatcher.dispatch(phrase, source=source)}
+
+
+class RemoteBackend:
+    """A robot driven over its network command API."""
+
+    def __init__(self, host, port, timeout=0.25):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+    @classmethod
+    def from_address(cls, address, timeout=0.25):
+        """Build from a "host:port" string."""
+        host, _, port = address.rpartition(":")
+        return cls(host, int(port), timeout=timeout)
+
+    def send(self, phrase, source):
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            connection.request(
+                "POST", "/command", body=json.dumps({"text": phrase}),
+                headers={"Content-Type": "application/json"}
+            )
+            return json.loads(connection.getresponse().read() or b"{}")
+        finally:
+            connection.close()
+
+
+class FleetDispatcher:
+    """Routes addressed commands to one, several or all registered robots in parallel."""
+
+    def __init__(self, local_dispatcher, local_name="robot one", broadcast_words=("all",),
+                 dispatch_timeout=0.25):
+        self.local = local_dispatcher
+        self.events = get_event_log()
+        self.dispatch_timeout = dispatch_timeout
+        self.listeners = local_dispatcher.listeners
+        self.backends = {}
+        self.broadcast_words = tuple(w.lower() for w in broadcast_words)
+        self.default_target = local_name.lower()
+        self.last_results = {}
+        self._executors = {}  # remote robot name -> its single-thread sender
+        self.register(local_name, LocalBackend(local_dispatcher))
+
+    @classmethod
+    def from_calibration(cls, local_dispatcher, calibration_manager):
+        """Build a fleet from the "fleet" calibration category."""
+        get = calibration_manager.get_setting
+        timeout = float(get("fleet", "dispatch_timeout"))
+        fleet = cls(
+            local_dispatcher,
+            local_name=get("fleet", "local_name"),
+            broadcast_words=get("fleet", "broadcast_words"),
+            dispatch_timeout=timeout,
+        )
+        for name, address in get("fleet", "remote").items():
+            fleet.register(name, RemoteBackend.from_address(address, timeout=timeout))
+        return fleet
+
+    @property
+    def keywords(self):
+        return self.local.keywords
+
+    def register(self, name, backend):
+        """Add a robot under an addressable name such as "robot two"."""
+        self.backends[name.lower()] = backend
+        executor = self._executors.pop(name.lower(), None)
+        if executor:
+            executor.shutdown(wait=False)
+
+    def target_phrases(self):
+        """Extra grammar entries: every target name and broadcast word."""
+        return list(self.backends) + list(self.broadcast_words)
+
+    def match(self, text):
+        """Return the command an addressed phrase maps to, or None."""
+        return self.local.match(self._split_target(text)[1])
+
+    def dispatch(self, text, source="voice"):
+        """Route a possibly addressed phrase. Returns the command name or None."""
+        target, phrase = self._split_target(text)
+        if not phrase:
+            if target not in (None, BROADCAST):
+                self.default_target = target
+                self.events.event("fleet_target", target=target, source=source)
+            return None
+        command = self.local.match(phrase)
+        if command is None:
+            # Unmatched: logged and shown to listeners (GUI, WebSocket) like any other phrase
+            return self.local.dispatch_matched(text, None, source)
+        if target == BROADCAST:
+            targets = list(self.backends)
+        else:
+            targets = [target or self.default_target]
+        self._fan_out(targets, phrase, source)
+        return command
+
+    def state(self):
+        """Snapshot of the local robot plus the last result from every target."""
+        return {
+            "default_target": self.default_target,
+            "local": self.local.state(),
+            "robots": dict(self.last_results),
+        }
+
+    def close(self):
+        for executor in self._executors.values():
+            executor.shutdown(wait=False)
+        self._executors = {}
+
+    def _split_target(self, text):
+        """Split "robot two turn left" into ("robot two", "turn left")."""
+        words = text.lower().split()
+        if words and words[0] in self.broadcast_words:
+            return BROADCAST, " ".join(words[1:])
+        best = None
+        for name in self.backends:
+            size = len(name.split())
+            if words[:size] == name.split() and (best is None or size > len(best.split())):
+                best = name
+        if best is None:
+            return None, " ".join(words)
+        return best, " ".join(words[len(best.split()):])
+
+    def _send(self, name, phrase, source):
+        started = time.monotonic()
+        error = None
+        try:
+            self.backends[name].send(phrase, source)
+        except (OSError, ValueError, http.client.HTTPException) as e:
+            error = str(e)
+        latency = time.monotonic() - started
+        self.last_results[name] = {"phrase": phrase, "latency": latency, "error": error}
+        return name, latency, error
+
+    def _fan_out(self, targets, phrase, source):
+        """Send a phrase to every target without waiting; the result is logged once all have answered."""
+        results = []
+        lock = threading.Lock()
+
+        def finished(result):
+            with lock:
+                results.append(result)
+                if len(results) < len(targets):
+                    return
+            self._report(targets, phrase, source, results)
+
+        for name in targets:
+            if isinstance(self.backends[name], LocalBackend):
+                finished(self._send(name, phrase, source))  # only queues the movement
+                continue
+            executor = self._executors.get(name)
+            if executor is None:
+                executor = self._executors[name] = ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix=f"fleet-{name.replace(' ', '-')}"
+                )
+            executor.submit(self._send, name, phrase, source).add_done_callback(
+                lambda future: finished(future.result())
+            )
+
+    def _report(self, targets, phrase, source, results):
+        """Log one fan-out; targets slower than dispatch_timeout are reported as late."""
+        errors = {name: error for name, _, error in results if error}
+        late = [name for name, latency, _ in results if latency > self.dispatch_timeout]
+        level = QUIET if errors or late else NORMAL
+        fields = {"phrase": phrase, "source": source, "targets": targets,
+                  "latency": {name: round(latency, 4) for name, latency, _ in results}}
+        if errors:
+            fields["errors"] = errors
+        if late:
+            fields["late"] = late
+        self.events.event("fleet_dispatch", level=level, **fields)
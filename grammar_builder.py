@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+
+# Recognizer grammar built against the model's vocabulary.
+# A Vosk grammar restricts decoding to the listed phrases. Without a garbage
+# entry every sound is forced onto the closest phrase, so the builder appends
+# "[unk]": noise and out-of-grammar speech then decode to "[unk]", which
+# strip_garbage() removes before the text reaches the dispatcher.
+# Phrases are checked word by word against the model vocabulary. Words the model
+# does not know are silently dropped by Vosk, which makes a phrase like
+# "strafe left" decode as plain "left", so such phrases are left out of the
+# grammar and reported instead.
+# The vocabulary is read lazily from graph/words.txt or, for models without it
+# (the small models), from the output symbol table embedded in graph/Gr.fst. It
+# is cached in memory and, optionally, in a JSON file keyed by the source file's
+# size and mtime, so a restart does not have to re-read the FST.
+#
+# Check a phrase list: python3 grammar_builder.py model/vosk-model-small-en-us-0.15 "strafe left" ...
+
+import os
+import sys
+import json
+import struct
+import threading
+
+from event_log import get_event_log, QUIET
+
+GARBAGE = "[unk]"
+FST_MAGIC = 2125659606
+SYMBOL_TABLE_MAGIC = 2125658996
+HAS_ISYMBOLS = 0x1
+HAS_OSYMBOLS = 0x2
+# Symbols in a word table that are not words
+NON_WORDS = {"<eps>", "!SIL", "<s>", "</s>", "#0", "<unk>"}
+
+_vocabularies = {}  # (source path, size, mtime) -> frozenset
+_lock = threading.Lock()
+
+
+def strip_garbage(text):
+    """Remove garbage tokens from recognized text ("[unk] stop" -> "stop", "[unk]" -> "")."""
+    if GARBAGE not in text:
+        return text
+    return " ".join(word for word in text.split() if word != GARBAGE)
+
+
+def vocabulary_source(model_path):
+    """The file the vocabulary is read from, or None for an unrecognized model layout."""
+    for relative in ("graph/words.txt", "words.txt", "graph/Gr.fst"):
+        path = os.path.join(model_path, relative)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def _read_words_txt(path):
+    words = set()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            parts = line.split()
+            if parts:
+                words.add(parts[0])
+    return words
+
+
+class _Reader:
+    """Little-endian reader for OpenFst binary headers."""
+
+    def __init__(self, f):
+        self.f = f
+
+    def _unpack(self, fmt):
+        size = struct.calcsize(fmt)
+        data = self.f.read(size)
+        if len(data) != size:
+            raise ValueError("truncated FST header")
+        return struct.unpack(fmt, data)[0]
+
+    def int32(self):
+        return self._unpack("<i")
+
+    def int64(self):
+        return self._unpack("<q")
+
+    def string(self):
+        length = self.int32()
+        if length < 0 or length > 1 << 20:
+            raise ValueError("implausible string length in FST header")
+        data = self.f.read(length)
+        if len(data) != length:
+            raise ValueError("truncated FST header")
+        return data.decode("utf-8", errors="replace")
+
+
+def _read_symbol_table(reader):
+    if reader.int32() != SYMBOL_TABLE_MAGIC:
+        raise ValueError("bad symbol table magic")
+    reader.string()  # table name
+    reader.int64()   # available key
+    words = set()
+    for _ in range(reader.int64()):
+        words.add(reader.string())
+        reader.int64()  # key
+    return words
+
+
+def _read_fst_output_symbols(path):
+    """Output symbol table of a binary OpenFst file (only the header is read)."""
+    with open(path, "rb") as f:
+        reader = _Reader(f)
+        if reader.int32() != FST_MAGIC:
+            raise ValueError("not a binary FST")
+        reader.string()  # fst type
+        reader.string()  # arc type
+        reader.int32()   # version
+        flags = reader.int32()
+        reader.int64()   # properties
+        reader.int64()   # start state
+        reader.int64()   # number of states
+        reader.int64()   # number of arcs
+        if flags & HAS_ISYMBOLS:
+            _read_symbol_table(reader)
+        if not flags & HAS_OSYMBOLS:
+            raise ValueError("FST has no output symbol table")
+        return _read_symbol_table(reader)
+
+
+def _load_cache(cache_path, key):
+    if not cache_path or not os.path.exists(cache_path):
+        return None
+    try:
+        with open(cache_path) as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if cached.get("key") != list(key):
+        return None
+    return frozenset(cached.get("words", ()))
+
+
+def _save_cache(cache_path, key, words):
+    directory = os.path.dirname(cache_path)
+    try:
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(cache_path, "w") as f:
+            json.dump({"key": list(key), "words": sorted(words)}, f)
+    except OSError:
+        pass
+
+
+def load_vocabulary(model_path, cache_path=None):
+    """Words the model can recognize, or None if the vocabulary cannot be read."""
+    source = vocabulary_source(model_path)
+    if source is None:
+        return None
+    stat = os.stat(source)
+    key = (os.path.abspath(source), stat.st_size, int(stat.st_mtime))
+    with _lock:
+        words = _vocabularies.get(key)
+        if words is not None:
+            return words
+        words = _load_cache(cache_path, key)
+        if words is None:
+            try:
+                if source.endswith(".fst"):
+                    raw = _read_fst_output_symbols(source)
+                else:
+                    raw = _read_words_txt(source)
+            except (OSError, ValueError) as e:
+                get_event_log().event("vocabulary_unreadable", level=QUIET, source=source, error=str(e))
+                return None
+            words = frozenset(raw - NON_WORDS)
+            if cache_path:
+                _save_cache(cache_path, key, words)
+        _vocabularies[key] = words
+        return words
+
+
+class GrammarBuilder:
+    """Builds the recognizer grammar, dropping phrases that use words outside the model vocabulary."""
+
+    def __init__(self, model_path, garbage=True, validate=True, cache_path=None):
+        self.model_path = model_path
+        self.garbage = garbage
+        self.validate = validate
+        self.cache_path = cache_path
+        self.accepted = []
+        self.rejected = {}  # phrase -> unknown words
+        self.events = get_event_log()
+        self._vocabulary = None
+        self._loaded = False
+
+    @classmethod
+    def from_calibration(cls, calibration_manager, model_path):
+        """Build from the "grammar" calibration category."""
+        get = calibration_manager.get_setting
+        return cls(
+            model_path,
+            garbage=bool(get("grammar", "garbage_class")),
+            validate=bool(get("grammar", "validate")),
+            cache_path=get("grammar", "vocabulary_cache") or None,
+        )
+
+    @property
+    def vocabulary(self):
+        """The model vocabulary, loaded on first use (None if unavailable)."""
+        if not self._loaded:
+            self._vocabulary = load_vocabulary(self.model_path, self.cache_path)
+            self._loaded = True
+        return self._vocabulary
+
+    def unknown_words(self, phrase):
+        """Words of phrase missing from the vocabulary ([] if it cannot be checked)."""
+        vocabulary = self.vocabulary if self.validate else None
+        if vocabulary is None:
+            return []
+        return [word for word in phrase.split() if word not in vocabulary]
+
+    def build(self, phrases):
+        """Return the grammar as a JSON string and record accepted/rejected phrases."""
+        accepted, rejected = [], {}
+        for phrase in dict.fromkeys(p.lower().strip() for p in phrases):
+            if not phrase:
+                continue
+            missing = self.unknown_words(phrase)
+            if missing:
+                rejected[phrase] = missing
+            else:
+                accepted.append(phrase)
+        if not accepted:
+            # Nothing fits: more likely a vocabulary/model mismatch than a bad keyword list
+            accepted, rejected = list(dict.fromkeys(p.lower().strip() for p in phrases if p.strip())), {}
+            self.events.event("grammar_unvalidated", level=QUIET, model=self.model_path,
+                              reason="no phrase matched the vocabulary")
+        elif self.validate and self.vocabulary is None:
+            self.events.event("grammar_unvalidated", level=QUIET, model=self.model_path,
+                              reason="vocabulary not found")
+        self.accepted = accepted
+        self.rejected = rejected
+        if rejected:
+            self.events.event("grammar_rejected", level=QUIET, count=len(rejected), phrases=rejected)
+        self.events.event("grammar_built", level=QUIET, phrases=len(accepted), garbage=self.garbage,
+                          vocabulary=len(self._vocabulary) if self._vocabulary is not None else None)
+        return json.dumps(accepted + [GARBAGE] if self.garbage else accepted)
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("usage: grammar_builder.py MODEL_PATH [PHRASE ...]")
+        sys.exit(2)
+    builder = GrammarBuilder(sys.argv[1])
+    if builder.vocabulary is None:
+        print(f"No readable vocabulary in {sys.argv[1]}")
+        sys.exit(1)
+    print(f"Vocabulary: {len(builder.vocabulary)} words")
+    for phrase in sys.argv[2:]:
+        missing = builder.unknown_words(phrase.lower())
+        print(f"  {phrase!r}: " + (f"unknown words {missing}" if missing else "ok"))
+
+
+if __name__ == "__main__":
+    main()
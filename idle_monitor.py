@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+
+# Idle duty-cycling for the capture loop.
+# Decoding every chunk costs far more than reading it. After idle_after seconds of
+# audio with no voice activity (every chunk below the gate threshold and no
+# utterance in progress), the decode stage stops decoding and only measures each chunk's
+# level here, keeping the last pre_roll seconds of audio. Chunks arrive after
+# pre-processing, like the ones the gate threshold was learned on, so both levels
+# are on the same scale. wake_chunks loud chunks
+# in a row wake the full decoder, which is fed the kept pre-roll first so the start
+# of the first word is not lost.
+# Wall time, decode-thread CPU time and process CPU time are accumulated per
+# state, so the saving can be read as CPU% active vs idle from the event log or
+# the API's /metrics endpoint.
+
+import math
+import time
+from collections import deque
+
+import numpy as np
+
+from event_log import get_event_log
+from noise_floor import level_from_rms
+
+SAMPLE_WIDTH = 2  # paInt16
+STATES = ("active", "idle")
+
+
+def chunk_level(data):
+    """Level of an int16 chunk on the 0-1 gate scale."""
+    samples = np.frombuffer(data, dtype=np.int16).astype(np.float32)
+    if not len(samples):
+        return 0.0
+    return level_from_rms(math.sqrt(float(np.dot(samples, samples)) / len(samples)))
+
+
+class _StateTime:
+    def __init__(self):
+        self.wall = 0.0
+        self.thread_cpu = 0.0
+        self.process_cpu = 0.0
+        self.entries = 0
+
+
+class IdleMonitor:
+    """Switches the capture loop between full decoding and an energy-only idle monitor."""
+
+    def __init__(self, idle_after=30.0, threshold=0.3, wake_chunks=1, pre_roll=0.5, rate=16000,
+                 enabled=True, on_state=None):
+        self.enabled = enabled
+        self.idle_after = idle_after
+        self.threshold = threshold     # used while idle; follows the gate threshold while active
+        self.wake_chunks = max(1, wake_chunks)
+        self.rate = rate
+        self.pre_roll_bytes = int(pre_roll * rate) * SAMPLE_WIDTH
+        self.on_state = on_state       # on_state(idle), called from the decode thread
+        self.events = get_event_log()
+        self.state = "active"
+        self.wakes = 0
+
+        self._quiet = 0.0              # seconds of audio since the last voice activity
+        self._loud = 0                 # consecutive loud chunks while idle
+        self._pre_roll = deque()
+        self._pre_roll_size = 0
+        self._entered = time.monotonic()
+        self._times = {name: _StateTime() for name in STATES}
+        self._times["active"].entries = 1
+        self._clocks = None            # (wall, thread CPU, process CPU) at the last tick
+
+    @classmethod
+    def from_calibration(cls, calibration_manager, on_state=None):
+        """Build from the "idle" calibration category and the stored volume threshold."""
+        get = calibration_manager.get_setting
+        return cls(
+            idle_after=float(get("idle", "idle_after")),
+            threshold=float(get("voice_recognition", "volume_threshold")),
+            wake_chunks=int(get("idle", "wake_chunks")),
+            pre_roll=float(get("idle", "pre_roll")),
+            enabled=bool(get("idle", "enabled")),
+            on_state=on_state,
+        )
+
+    @property
+    def idle(self):
+        return self.state == "idle"
+
+    def _tick(self):
+        """Charge the time since the last tick to the current state (decode thread only)."""
+        clocks = (time.perf_counter(), time.thread_time(), time.process_time())
+        if self._clocks is not None:
+            times = self._times[self.state]
+            times.wall += clocks[0] - self._clocks[0]
+            times.thread_cpu += clocks[1] - self._clocks[1]
+            times.process_cpu += clocks[2] - self._clocks[2]
+        self._clocks = clocks
+
+    def reset(self):
+        """Start over in the active state (recognition (re)started); time totals are kept."""
+        self._clocks = None
+        self._pre_roll.clear()
+        self._pre_roll_size = 0
+        self._quiet = 0.0
+        if self.idle:
+            self._enter("active")
+
+    def observe(self, data, level=None, threshold=None, busy=False):
+        """Account for a decoded chunk; returns True if the loop should go idle now.
+
+        level/threshold come from the volume gate when there is one; busy is True
+        while an utterance is in progress.
+        """
+        self._tick()
+        if threshold is not None:
+            self.threshold = threshold
+        if level is None:
+            level = chunk_level(data)
+        if busy or level >= self.threshold:
+            self._quiet = 0.0
+            return False
+        self._quiet += len(data) / (SAMPLE_WIDTH * self.rate)
+        if not self.enabled or self._quiet < self.idle_after:
+            return False
+        self._enter("idle", quiet=round(self._quiet, 2), threshold=round(self.threshold, 3))
+        return True
+
+    def monitor(self, data):
+        """Measure a chunk while idle. Returns None, or the pre-roll chunks (ending with
+        this one) to decode once voice activity wakes the decoder."""
+        self._tick()
+        self._pre_roll.append(data)
+        self._pre_roll_size += len(data)
+        while self._pre_roll_size - len(self._pre_roll[0]) >= self.pre_roll_bytes + len(data):
+            self._pre_roll_size -= len(self._pre_roll.popleft())
+        level = chunk_level(data)
+        self._loud = self._loud + 1 if level >= self.threshold else 0
+        if self._loud < self.wake_chunks:
+            return None
+        chunks = list(self._pre_roll)
+        self._pre_roll.clear()
+        self._pre_roll_size = 0
+        self.wakes += 1
+        self._enter("active", input_level=round(level, 3),
+                    pre_roll=round(sum(map(len, chunks)) / (SAMPLE_WIDTH * self.rate), 2))
+        return chunks
+
+    def _enter(self, state, **fields):
+        now = time.monotonic()
+        previous, self.state = self.state, state
+        self._times[state].entries += 1
+        self._quiet = 0.0
+        self._loud = 0
+        self.events.event(f"{state}_entered", after=round(now - self._entered, 2), **fields)
+        self._entered = now
+        if previous != state and self.on_state:
+            self.on_state(state == "idle")
+
+    def state_times(self):
+        """Per-state totals: seconds, share of the time, CPU% of the decode thread and of the process."""
+        total = sum(t.wall for t in self._times.values()) or 1.0
+        report = {}
+        for name, t in self._times.items():
+            wall = t.wall or 1.0
+            report[name] = {
+                "seconds": round(t.wall, 1),
+                "share": round(t.wall / total, 3),
+                "entries": t.entries,
+                "decode_cpu_percent": round(100 * t.thread_cpu / wall, 1),
+                "process_cpu_percent": round(100 * t.process_cpu / wall, 1),
+            }
+        return report
+
+    def stats(self):
+        """Snapshot for the API and the exit log."""
+        return {"state": self.state, "enabled": self.enabled, "idle_after": self.idle_after,
+                "wakes": self.wakes, "states": self.state_times()}
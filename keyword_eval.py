@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+
+# Offline accuracy and confusability evaluation of the keyword set.
+# A labeled corpus (same layout as the soak test: WAV/FLAC files whose JSON
+# sidecar has a "label" with what was actually said; unlabeled files are skipped)
+# is decoded with the application's grammar, one worker process per core. Files
+# whose label is not a keyword phrase (e.g. "noise" or "") are negative samples:
+# any command recognized from them is a false trigger. The report contains:
+#   - a command-level confusion matrix (rows = expected, columns = recognized),
+#   - per-phrase accuracy (exact phrase and right command via any synonym) and
+#     latency (audio time from end of speech to the chunk that produced the
+#     final result, plus the time spent decoding that chunk),
+#   - synonym pruning suggestions: phrases that are rarely recognized as their own
+#     command, phrases that absorb utterances meant for other commands, and phrases
+#     the model vocabulary cannot express. The last synonym of a command is never
+#     suggested.
+#
+# Usage:  python3 keyword_eval.py --corpus utterances [--workers 4] [--json report.json]
+
+import os
+import sys
+import json
+import time
+import argparse
+import multiprocessing
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from event_log import EventLog, set_event_log, get_event_log, QUIET
+from grammar_builder import GrammarBuilder, strip_garbage
+from command_vocabulary import CommandVocabulary
+from soak_test import list_corpus, read_audio, RATE, CHUNK_FRAMES, TRAILING_SILENCE
+
+NONE = "(none)"  # expected: not a command; recognized: nothing matched
+
+_recognizer = None  # per worker process
+
+
+def _init_worker(model_path, grammar):
+    global _recognizer
+    import vosk
+    _recognizer = vosk.KaldiRecognizer(vosk.Model(model_path), RATE, grammar)
+    _recognizer.SetWords(True)
+
+
+def _decode(path):
+    """Decode one file in a worker; returns the recognized text and timing."""
+    audio = read_audio(path)
+    stream = audio + bytes(int(TRAILING_SILENCE * RATE) * 2)
+    chunk_bytes = CHUNK_FRAMES * 2
+    texts, latency, decode = [], None, 0.0
+    for offset in range(0, len(stream), chunk_bytes):
+        started = time.perf_counter()
+        final = _recognizer.AcceptWaveform(stream[offset:offset + chunk_bytes])
+        spent = time.perf_counter() - started
+        decode += spent
+        if final:
+            text = strip_garbage(json.loads(_recognizer.Result()).get("text", "").lower())
+            if text:
+                texts.append(text)
+                end = min(offset + chunk_bytes, len(stream))
+                latency = max(0.0, (end - len(audio)) / 2 / RATE) + spent
+    started = time.perf_counter()
+    text = strip_garbage(json.loads(_recognizer.FinalResult()).get("text", "").lower())
+    decode += time.perf_counter() - started
+    if text:
+        texts.append(text)
+        latency = TRAILING_SILENCE + time.perf_counter() - started
+    _recognizer.Reset()
+    return {"path": path, "text": " ".join(texts), "latency": latency, "decode": decode,
+            "audio_seconds": len(audio) / 2 / RATE}
+
+
+def _percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))]
+
+
+class KeywordEvaluation:
+    """Runs a labeled corpus through the recognizer and scores the keyword set."""
+
+    def __init__(self, keywords, model_path, workers=None, min_samples=3, min_accuracy=0.8, absorb_rate=0.1):
+        self.keywords = keywords
+        self.model_path = model_path
+        self.workers = workers or os.cpu_count() or 1
+        self.min_samples = min_samples
+        self.min_accuracy = min_accuracy
+        self.absorb_rate = absorb_rate
+        self.events = get_event_log()
+        self.phrase_command = {}
+        for command, phrases in keywords.items():
+            for phrase in phrases:
+                # Same rule as the dispatcher: the first command listing a phrase wins
+                self.phrase_command.setdefault(" ".join(phrase.lower().split()), command)
+        self.builder = GrammarBuilder(model_path)
+        self.grammar = self.builder.build(list(self.phrase_command))
+        self.results = []
+
+    def run(self, corpus):
+        """Decode every (path, label) of the corpus; returns the per-file results."""
+        labels = dict(corpus)
+        started = time.perf_counter()
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(self.workers, mp_context=context, initializer=_init_worker,
+                                 initargs=(self.model_path, self.grammar)) as pool:
+            chunksize = max(1, len(labels) // (self.workers * 4))
+            for result in pool.map(_decode, labels, chunksize=chunksize):
+                label = " ".join((labels[result["path"]] or "").split())
+                result["label"] = label
+                result["expected"] = self.phrase_command.get(label, NONE)
+                result["recognized"] = self.phrase_command.get(result["text"], NONE)
+                self.results.append(result)
+        self.elapsed = time.perf_counter() - started
+        return self.results
+
+    def report(self):
+        commands = list(self.keywords) + [NONE]
+        confusion = {expected: {recognized: 0 for recognized in commands} for expected in commands}
+        phrases = defaultdict(lambda: {"samples": 0, "correct": 0, "command_correct": 0,
+                                       "latency": [], "heard": Counter()})
+        heard_as = defaultdict(Counter)  # recognized phrase -> expected commands of the utterances
+        negatives = false_triggers = 0
+        for r in self.results:
+            confusion[r["expected"]][r["recognized"]] += 1
+            if r["text"]:
+                heard_as[r["text"]][r["expected"]] += 1
+            if r["expected"] == NONE:
+                negatives += 1
+                false_triggers += r["recognized"] != NONE
+                continue
+            stats = phrases[r["label"]]
+            stats["samples"] += 1
+            stats["correct"] += r["text"] == r["label"]
+            stats["command_correct"] += r["recognized"] == r["expected"]
+            stats["heard"][r["text"] or NONE] += 1
+            if r["latency"] is not None:
+                stats["latency"].append(r["latency"])
+
+        per_phrase = {}
+        for phrase, command in self.phrase_command.items():
+            stats = phrases.get(phrase)
+            row = {"command": command, "samples": 0}
+            if stats:
+                row.update(
+                    samples=stats["samples"],
+                    accuracy=round(stats["correct"] / stats["samples"], 3),
+                    command_accuracy=round(stats["command_correct"] / stats["samples"], 3),
+                    latency_p50=_round(_percentile(stats["latency"], 0.50)),
+                    latency_p95=_round(_percentile(stats["latency"], 0.95)),
+                    heard=dict(stats["heard"].most_common(3)),
+                )
+            absorbed = {cmd: n for cmd, n in heard_as.get(phrase, {}).items() if cmd != command}
+            if absorbed:
+                row["absorbed"] = absorbed
+            per_phrase[phrase] = row
+
+        labelled = [r for r in self.results if r["expected"] != NONE]
+        decode = sum(r["decode"] for r in self.results)
+        audio = sum(r["audio_seconds"] for r in self.results)
+        return {
+            "files": len(self.results),
+            "workers": self.workers,
+            "elapsed": round(self.elapsed, 2),
+            "real_time_factor": round(decode / audio, 4) if audio else None,
+            "accuracy": _ratio(sum(r["text"] == r["label"] for r in labelled), len(labelled)),
+            "command_accuracy": _ratio(sum(r["recognized"] == r["expected"] for r in labelled), len(labelled)),
+            "negatives": negatives,
+            "false_triggers": false_triggers,
+            "confusion": confusion,
+            "phrases": per_phrase,
+            "prune": self._prune(per_phrase, heard_as),
+        }
+
+    def _prune(self, per_phrase, heard_as):
+        """Synonyms worth removing, worst first."""
+        candidates = {}
+        for phrase, missing in self.builder.rejected.items():
+            candidates[phrase] = (float("inf"), f"not in the model vocabulary: {', '.join(missing)}")
+        for phrase, row in per_phrase.items():
+            if phrase in candidates:
+                continue
+            reasons, cost = [], 0
+            if row["samples"] >= self.min_samples and row["command_accuracy"] < self.min_accuracy:
+                misses = row["samples"] - round(row["command_accuracy"] * row["samples"])
+                cost += misses
+                heard = ", ".join(f"{'nothing' if text == NONE else repr(text)} x{n}"
+                                  for text, n in row["heard"].items() if text != phrase)
+                reasons.append(f"right command only {row['command_accuracy']:.0%} of {row['samples']} (heard {heard})")
+            absorbed = sum(row.get("absorbed", {}).values())
+            total = sum(heard_as.get(phrase, {}).values())
+            if absorbed >= 2 and absorbed >= self.absorb_rate * total:
+                cost += absorbed
+                sources = ", ".join(f"{cmd} x{n}" for cmd, n in row["absorbed"].items())
+                reasons.append(f"absorbs {absorbed} utterances meant for other commands ({sources})")
+            if reasons:
+                candidates[phrase] = (cost, "; ".join(reasons))
+
+        # Never leave a command without a phrase
+        suggestions = []
+        for command, phrases in self.keywords.items():
+            keep = [p for p in phrases if p.lower() not in candidates]
+            flagged = [p.lower() for p in phrases if p.lower() in candidates]
+            if not keep and flagged:
+                flagged.remove(min(flagged, key=lambda p: candidates[p][0]))
+            for phrase in flagged:
+                cost, reason = candidates[phrase]
+                suggestions.append({"phrase": phrase, "command": command, "reason": reason, "cost": cost})
+        suggestions.sort(key=lambda s: -s["cost"])
+        for s in suggestions:
+            s["cost"] = None if s["cost"] == float("inf") else s["cost"]
+        return suggestions
+
+
+def _ratio(n, d):
+    return round(n / d, 3) if d else None
+
+
+def _round(value):
+    return round(value, 3) if value is not None else None
+
+
+def print_report(report, keywords):
+    """Human-readable report on stdout."""
+    commands = list(keywords) + [NONE]
+    width = max(len(c) for c in commands)
+    print(f"\n{report['files']} files, {report['workers']} workers, {report['elapsed']} s "
+          f"(real-time factor {report['real_time_factor']})")
+    print(f"Phrase accuracy {report['accuracy']}, command accuracy {report['command_accuracy']}, "
+          f"false triggers {report['false_triggers']}/{report['negatives']} negatives")
+
+    print("\nConfusion matrix (rows: expected, columns: recognized)")
+    print(" " * width + "".join(f"{i:>5}" for i in range(len(commands))))
+    for i, expected in enumerate(commands):
+        row = report["confusion"][expected]
+        if not any(row.values()):
+            continue
+        cells = "".join(f"{row[c] or '.':>5}" for c in commands)
+        print(f"{expected:<{width}}{cells}   [{i}]")
+
+    print("\nPer phrase")
+    print(f"{'phrase':<20}{'command':<18}{'n':>4}{'acc':>7}{'cmd':>7}{'p50 s':>8}{'p95 s':>8}")
+    for phrase, row in report["phrases"].items():
+        if not row["samples"]:
+            print(f"{phrase:<20}{row['command']:<18}{0:>4}   (no samples)")
+            continue
+        print(f"{phrase:<20}{row['command']:<18}{row['samples']:>4}{row['accuracy']:>7.2f}"
+              f"{row['command_accuracy']:>7.2f}{_fmt(row['latency_p50']):>8}{_fmt(row['latency_p95']):>8}")
+
+    print("\nSuggested synonyms to prune")
+    if not report["prune"]:
+        print("   none")
+    for s in report["prune"]:
+        print(f"   '{s['phrase']}' ({s['command']}): {s['reason']}")
+
+
+def _fmt(value):
+    return f"{value:.3f}" if value is not None else "-"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate keyword accuracy and confusability on a labeled corpus")
+    parser.add_argument("--corpus", required=True, help="directory of labeled WAV/FLAC utterances")
+    parser.add_argument("--model", default="model/vosk-model-small-en-us-0.15")
+    parser.add_argument("--keywords", default=None, help="keywords file (default keywords.json)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument("--min-samples", type=int, default=3, help="samples needed before judging a phrase")
+    parser.add_argument("--min-accuracy", type=float, default=0.8, help="flag phrases below this command accuracy")
+    parser.add_argument("--absorb-rate", type=float, default=0.1,
+                        help="flag phrases when this share of their recognitions belong to other commands")
+    parser.add_argument("--json", default=None, help="also write the full report to this file")
+    args = parser.parse_args()
+
+    found = list_corpus(args.corpus)
+    if not found:
+        sys.exit(f"No audio files found in {args.corpus}")
+    corpus = [(path, label) for path, label in found if label is not None]
+    if len(corpus) < len(found):
+        print(f"Skipping {len(found) - len(corpus)} unlabeled files (no \"label\" in the JSON sidecar)")
+    if not corpus:
+        sys.exit(f"No labeled audio files in {args.corpus}")
+    set_event_log(EventLog(echo=False))
+
+    keywords = CommandVocabulary.load(args.keywords).keywords
+    evaluation = KeywordEvaluation(keywords, args.model, args.workers, args.min_samples,
+                                   args.min_accuracy, args.absorb_rate)
+    print(f"Evaluating {len(corpus)} files with {evaluation.workers} workers ...")
+    evaluation.run(corpus)
+    report = evaluation.report()
+    get_event_log().event("keyword_eval", level=QUIET, **{k: report[k] for k in (
+        "files", "workers", "elapsed", "accuracy", "command_accuracy", "false_triggers", "negatives")},
+        prune=[s["phrase"] for s in report["prune"]])
+    get_event_log().close()
+    print_report(report, keywords)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
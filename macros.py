@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+
+# Command macros: record a sequence of dispatched commands with their timing and
+# replay it later without any speech decoding.
+#   "record macro patrol"  start recording (every command dispatched afterwards, from
+#                          voice or the API, is stored with the delay since the last one)
+#   "end macro"            save it            "cancel macro"  discard it
+#   "play macro patrol"    replay it through the dispatcher and motion queue, with the
+#                          delays divided by the speed-up factor
+# The speed-up only shortens the gaps between commands; each movement still takes
+# its calibrated duration. When a high speed-up issues movements faster than the
+# robot performs them, the replay waits for room in the motion queue rather than
+# having steps rejected, so it runs late (max_late_ms in the macro_played event).
+# A user "stop" aborts a replay. Macros are stored in a JSON file, one compact
+# string per macro: a command code followed by the delay in milliseconds, e.g.
+# "F0 L1830 F2410 S1200". Names must be in the recognizer grammar to be spoken, so
+# phrases() lists the configured names plus every saved one.
+
+import os
+import re
+import json
+import time
+import threading
+
+from event_log import get_event_log, QUIET
+from dispatcher import MOVEMENT_COMMANDS
+
+COMMAND_CODES = {
+    "forward": "F", "backward": "B", "left": "L", "right": "R",
+    "horizontal_left": "SL", "horizontal_right": "SR",
+    "stop": "S", "pause": "P", "resume": "C",
+}
+CODE_COMMANDS = {code: command for command, code in COMMAND_CODES.items()}
+STEP_PATTERN = re.compile(r"^([A-Z]+)(\d+)$")
+
+
+def encode_steps(steps):
+    """[(command, delay seconds)] -> "F0 L1830 ..." """
+    return " ".join(f"{COMMAND_CODES[command]}{round(delay * 1000)}" for command, delay in steps)
+
+
+def decode_steps(text):
+    """Inverse of encode_steps(); raises ValueError on a malformed step."""
+    steps = []
+    for token in text.split():
+        match = STEP_PATTERN.match(token)
+        if not match or match.group(1) not in CODE_COMMANDS:
+            raise ValueError(f"bad macro step {token!r}")
+        steps.append((CODE_COMMANDS[match.group(1)], int(match.group(2)) / 1000))
+    return steps
+
+
+class MacroRecorder:
+    """Records dispatched commands into named macros and replays them."""
+
+    def __init__(self, dispatcher, path="macros.json", names=(), speedup=1.0, max_steps=200, on_saved=None):
+        self.dispatcher = dispatcher
+        self.path = path
+        self.names = [n.lower() for n in names]
+        self.speedup = speedup
+        self.max_steps = max_steps
+        self.on_saved = on_saved  # on_saved(name, new) after a macro is stored
+        self.events = get_event_log()
+        self.macros = self._load()
+        self.recording = None   # (name, steps, time of the last step)
+        self.playing = None
+        self._lock = threading.Lock()
+        self._abort = threading.Event()
+        self._thread = None
+        dispatcher.listeners.append(self._on_dispatch)
+
+    @classmethod
+    def from_calibration(cls, dispatcher, calibration_manager, on_saved=None):
+        """Build from the "macros" calibration category."""
+        get = calibration_manager.get_setting
+        return cls(
+            dispatcher,
+            path=get("macros", "path"),
+            names=get("macros", "names"),
+            speedup=float(get("macros", "speedup")),
+            max_steps=int(get("macros", "max_steps")),
+            on_saved=on_saved,
+        )
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path) as f:
+                stored = json.load(f)
+            return {name: decode_steps(text) for name, text in stored.items()}
+        except (OSError, ValueError) as e:
+            self.events.event("macro_load_failed", level=QUIET, path=self.path, error=str(e))
+            return {}
+
+    def _save(self):
+        # Written next to the file and swapped in, so a crash mid-write keeps the old macros
+        temp = f"{self.path}.tmp"
+        with open(temp, "w") as f:
+            json.dump({name: encode_steps(steps) for name, steps in self.macros.items()}, f, indent=4)
+        os.replace(temp, self.path)
+
+    def phrases(self):
+        """Grammar entries for the macro commands."""
+        names = list(dict.fromkeys(self.names + list(self.macros)))
+        return (["end macro", "cancel macro"] + [f"record macro {n}" for n in names]
+                + [f"play macro {n}" for n in names])
+
+    def parse(self, text):
+        """(verb, name) for a macro phrase ("play macro patrol" -> ("play", "patrol")), else None."""
+        words = text.lower().split()
+        if len(words) < 2 or words[1] != "macro":
+            return None
+        verb, name = words[0], " ".join(words[2:])
+        if (verb in ("record", "play") and name) or (verb in ("end", "cancel") and not name):
+            return verb, name
+        return None
+
+    def handle_text(self, text):
+        """Act on a macro phrase. Returns a short action name, or None if text is not one."""
+        parsed = self.parse(text)
+        if parsed is None:
+            return None
+        verb, name = parsed
+        if verb == "record":
+            self.start_recording(name)
+        elif verb == "end":
+            self.end_recording()
+        elif verb == "cancel":
+            self.end_recording(save=False)
+        else:
+            self.play(name)
+        return f"{verb}_macro"
+
+    def start_recording(self, name):
+        with self._lock:
+            self.recording = (name, [], None)
+        self.events.event("macro_recording", macro=name)
+
+    def end_recording(self, save=True):
+        """Stop recording; returns the saved step count (None if nothing was being recorded)."""
+        with self._lock:
+            recording, self.recording = self.recording, None
+        if recording is None:
+            return None
+        name, steps, _ = recording
+        if not save or not steps:
+            self.events.event("macro_discarded", macro=name, steps=len(steps))
+            return 0
+        new = name not in self.macros
+        self.macros[name] = steps
+        self._save()
+        self.events.event("macro_saved", level=QUIET, macro=name, steps=len(steps),
+                          duration=round(sum(delay for _, delay in steps), 3), encoded=encode_steps(steps))
+        if self.on_saved:
+            self.on_saved(name, new)
+        return len(steps)
+
+    def _on_dispatch(self, message):
+        """Dispatcher listener: record matched commands while a recording is open."""
+        if message.get("type") != "command" or not message.get("command"):
+            return
+        if message.get("source") == "macro":
+            return
+        if message["command"] == "stop" and self.playing:
+            self.abort()
+        now = time.monotonic()
+        with self._lock:
+            if self.recording is None:
+                return
+            name, steps, last = self.recording
+            steps.append((message["command"], 0.0 if last is None else now - last))
+            self.recording = (name, steps, now)
+            full = len(steps) >= self.max_steps
+        if full:
+            self.events.event("macro_full", level=QUIET, macro=name, steps=len(steps))
+            self.end_recording()
+
+    def play(self, name, speedup=None):
+        """Replay a macro on its own thread; returns False if it does not exist."""
+        steps = self.macros.get(name)
+        if steps is None:
+            self.events.event("macro_unknown", macro=name)
+            return False
+        self.abort()
+        speedup = speedup or self.speedup
+        self._abort.clear()
+        self.playing = name
+        self._thread = threading.Thread(target=self._replay, args=(name, steps, speedup), name="macro-replay")
+        self._thread.daemon = True
+        self._thread.start()
+        return True
+
+    def abort(self):
+        """Stop a running replay (queued movements are left to the caller)."""
+        self._abort.set()
+        thread = self._thread
+        if thread and thread is not threading.current_thread():
+            thread.join(timeout=1.0)
+
+    def _replay(self, name, steps, speedup):
+        started = due = time.monotonic()
+        late = 0.0
+        executed = 0
+        motion = self.dispatcher.motion
+        for command, delay in steps:
+            due += delay / speedup
+            if self._abort.wait(max(0.0, due - time.monotonic())):
+                break
+            # Movements outpacing the robot: wait for room instead of having the step rejected
+            while command in MOVEMENT_COMMANDS and motion.full and not self._abort.wait(0.05):
+                pass
+            if self._abort.is_set():
+                break
+            late = max(late, time.monotonic() - due)
+            self.dispatcher.execute(command, source="macro")
+            executed += 1
+        self.playing = None
+        self.events.event("macro_played", macro=name, steps=len(steps), executed=executed, speedup=speedup,
+                          duration=round(time.monotonic() - started, 3), max_late_ms=round(late * 1000, 2),
+                          aborted=executed < len(steps))
+
+    def state(self):
+        """Snapshot for the API: saved macros, recording and replay state."""
+        return {
+            "macros": {name: encode_steps(steps) for name, steps in self.macros.items()},
+            "recording": self.recording[0] if self.recording else None,
+            "playing": self.playing,
+        }
+
+    def close(self):
+        self.abort()
+        self.end_recording(save=False)
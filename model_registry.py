@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+
+# Registry of Vosk models with a memory-bounded cache of loaded ones.
+# Models are found by scanning the model directory (every sub-directory that looks
+# like a Vosk model) plus any name -> path pairs from the "models" calibration
+# category. Loaded vosk.Model objects are kept in least-recently-used order; when
+# their total size exceeds the memory budget, the least recently used ones are
+# released, never the active model. A model's size is the resident memory its load
+# added (or its size on disk if that could not be measured).
+#
+# Switching itself is done by the application: request_switch() validates the
+# name and calls the on_switch callback, which builds the new recognizer in the
+# background and swaps it in between utterances.
+
+import os
+import time
+import threading
+from collections import OrderedDict
+
+from event_log import get_event_log, QUIET
+from recognizer_policy import rss_bytes
+
+MODEL_MARKERS = ("am", "conf", "graph")
+
+
+def looks_like_model(path):
+    """A Vosk model directory has at least two of am/, conf/ and graph/."""
+    return sum(os.path.isdir(os.path.join(path, marker)) for marker in MODEL_MARKERS) >= 2
+
+
+def directory_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class ModelRegistry:
+    """Known models by name, and an LRU cache of loaded ones bounded by a memory budget."""
+
+    def __init__(self, directory="model", paths=None, memory_budget_mb=1024.0, loader=None):
+        self.directory = directory
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+        self.loader = loader  # path -> model (default: vosk.Model)
+        self.events = get_event_log()
+        self.models = {}                   # name -> path
+        self.active = None
+        self.on_switch = None              # on_switch(name), set by the application
+        self.last_switch = None            # timing of the last completed switch
+        self.loads = 0
+        self.evictions = 0
+        self._cache = OrderedDict()        # name -> (model, bytes), least recently used first
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self.discover()
+        for name, path in (paths or {}).items():
+            self.register(name, path)
+
+    @classmethod
+    def from_calibration(cls, calibration_manager):
+        """Build from the "models" calibration category."""
+        get = calibration_manager.get_setting
+        return cls(
+            directory=get("models", "directory"),
+            paths=get("models", "paths"),
+            memory_budget_mb=float(get("models", "memory_budget_mb")),
+        )
+
+    def discover(self):
+        """Register every model directory found under self.directory."""
+        if not os.path.isdir(self.directory):
+            return
+        for entry in sorted(os.listdir(self.directory)):
+            path = os.path.join(self.directory, entry)
+            if os.path.isdir(path) and looks_like_model(path):
+                self.models.setdefault(entry, path)
+
+    def register(self, name, path):
+        self.models[name] = path
+        return name
+
+    def names(self):
+        return list(self.models)
+
+    def path(self, name):
+        return self.models[name]
+
+    def _load(self, path):
+        if self.loader:
+            return self.loader(path)
+        import vosk
+        return vosk.Model(path)
+
+    def get(self, name):
+        """The loaded model for name, loading it (and evicting others) if needed."""
+        path = self.models[name]
+        with self._load_lock:  # one load at a time; cache reads stay available meanwhile
+            with self._lock:
+                cached = self._cache.get(name)
+                if cached is not None:
+                    self._cache.move_to_end(name)
+                    return cached[0]
+            before = rss_bytes()
+            started = time.perf_counter()
+            model = self._load(path)
+            load_ms = round((time.perf_counter() - started) * 1000, 1)
+            size = rss_bytes() - before
+            if size <= 0:
+                size = directory_size(path)
+            with self._lock:
+                self._cache[name] = (model, size)
+                self.loads += 1
+                self._evict(keep=name)
+        self.events.event("model_loaded", level=QUIET, model=name, load_ms=load_ms, size_mb=round(size / 1048576, 1))
+        return model
+
+    def set_active(self, name):
+        """Mark the model in use; the previous one becomes evictable."""
+        with self._lock:
+            self.active = name
+            self._evict(keep=name)
+
+    def is_loaded(self, name):
+        return name in self._cache
+
+    def _evict(self, keep):
+        total = sum(size for _, size in self._cache.values())
+        for name in list(self._cache):
+            if total <= self.memory_budget:
+                break
+            if name in (keep, self.active):
+                continue
+            _, size = self._cache.pop(name)
+            total -= size
+            self.evictions += 1
+            self.events.event("model_evicted", level=QUIET, model=name, size_mb=round(size / 1048576, 1),
+                              cached_mb=round(total / 1048576, 1))
+        if total > self.memory_budget:
+            self.events.event("model_budget_exceeded", level=QUIET, cached_mb=round(total / 1048576, 1),
+                              budget_mb=round(self.memory_budget / 1048576, 1))
+
+    def request_switch(self, name):
+        """Ask the application to switch to another model.
+
+        False if the name is unknown or the application refused (a switch is
+        already in progress, or it is not ready yet).
+        """
+        if name not in self.models:
+            return False
+        if name == self.active:
+            return True
+        if self.on_switch:
+            return bool(self.on_switch(name))
+        return True
+
+    def state(self):
+        """Snapshot for the GUI and API."""
+        with self._lock:
+            loaded = {name: round(size / 1048576, 1) for name, (_, size) in self._cache.items()}
+        return {
+            "active": self.active,
+            "available": self.names(),
+            "loaded_mb": loaded,
+            "budget_mb": round(self.memory_budget / 1048576, 1),
+            "loads": self.loads,
+            "evictions": self.evictions,
+            "last_switch": self.last_switch,
+        }
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+
+# Multi-microphone capture with one KaldiRecognizer per channel.
+# Each channel (a separate mono device, or one channel of a multi-channel array)
+# is decoded in its own worker process so decoding scales across cores instead of
+# sharing the GIL. Final results are arbitrated in the parent: results from
+# different channels whose utterances end within `arbitration_window` seconds of
+# each other are treated as the same utterance and only the best-scoring (or the
+# first) one is passed on. A grammar or model change restarts the decoder processes while
+# the streams keep capturing: new workers get fresh queues, the old ones finish
+# the audio already queued to them and are reaped by the arbiter.
+
+import os
+import json
+import time
+import queue
+import threading
+from collections import deque
+import multiprocessing
+
+import numpy as np
+
+from event_log import get_event_log, QUIET
+from grammar_builder import strip_garbage
+
+CHUNK_FRAMES = 4096
+
+
+def _recognizer_worker(channel, model_path, grammar, rate, audio_queue, result_queue):
+    """Worker process: decode one channel and report final results."""
+    import vosk
+
+    recognizer = vosk.KaldiRecognizer(vosk.Model(model_path), rate, grammar)
+    recognizer.SetWords(True)
+    result_queue.put(("ready", channel, None))
+    while True:
+        item = audio_queue.get()
+        if item is None:
+            break
+        captured_at, data = item
+        started = time.monotonic()
+        if recognizer.AcceptWaveform(data):
+            result = json.loads(recognizer.Result())
+            text = strip_garbage(result.get("text", "").lower())
+            if text:
+                words = result.get("result", [])
+                score = sum(w.get("conf", 0.0) for w in words) / len(words) if words else 0.0
+                result_queue.put(("result", channel, {
+                    "text": text,
+                    "score": score,
+                    "utterance_end": captured_at,
+                    "decode_time": time.monotonic() - started,
+                }))
+
+
+def _resolve_device(pa, device):
+    """Map a name pattern to a device index; indices and None pass through."""
+    if not isinstance(device, str):
+        return device
+    from audio_devices import find_input_device
+    match = find_input_device(pa, device)
+    if match is None:
+        raise ValueError(f"No input device matches {device!r}")
+    return match["index"]
+
+
+class MultiMicRecognizer:
+    """Captures several input channels and decodes each in its own process."""
+
+    def __init__(self, pa, model_path, grammar, on_result, sources=((None, 1),), rate=16000,
+                 arbitration="best", arbitration_window=0.15, queue_size=16):
+        self.pa = pa
+        self.model_path = model_path
+        self.grammar = grammar
+        self.on_result = on_result
+        self.sources = [(device, int(channels)) for device, channels in sources]
+        self.rate = rate
+        self.arbitration = arbitration
+        self.arbitration_window = arbitration_window
+        self.queue_size = queue_size
+        self.events = get_event_log()
+        self.dropped_chunks = 0
+        self.restarts = 0
+
+        self.channel_count = sum(channels for _, channels in self.sources)
+        if self.channel_count > (os.cpu_count() or 1):
+            self.events.event("multi_mic_oversubscribed", level=QUIET,
+                              channels=self.channel_count, cores=os.cpu_count())
+
+        self._ctx = multiprocessing.get_context("spawn")
+        self._workers = []
+        self._audio_queues = []
+        self._result_queue = None
+        self._streams = []
+        self._threads = []
+        self._retired = []  # (worker, since) replaced decoders finishing their queued audio
+        self._running = False
+        self._backlog = deque()
+
+    @classmethod
+    def from_calibration(cls, pa, model_path, grammar, on_result, calibration_manager):
+        """Build from the "multi_mic" calibration category.
+
+        "devices" lists input devices (indices, or name patterns resolved
+        through audio_devices.find_input_device) opened as mono streams; if
+        "array_channels" is greater than 1 the first device (or the default)
+        is opened once with that many channels instead.
+        """
+        get = calibration_manager.get_setting
+        devices = list(get("multi_mic", "devices")) or [None]
+        devices = [_resolve_device(pa, device) for device in devices]
+        array_channels = int(get("multi_mic", "array_channels"))
+        if array_channels > 1:
+            sources = [(devices[0], array_channels)]
+        else:
+            sources = [(device, 1) for device in devices]
+        return cls(
+            pa, model_path, grammar, on_result,
+            sources=sources,
+            arbitration=get("multi_mic", "arbitration"),
+            arbitration_window=float(get("multi_mic", "arbitration_window")),
+        )
+
+    def start(self):
+        """Spawn the decoder processes, open the streams and start capturing."""
+        import pyaudio
+
+        self._running = True
+        self._result_queue = self._ctx.Queue()
+        self._audio_queues, self._workers = self._spawn_workers()
+
+        first_channel = 0
+        for device, channels in self.sources:
+            stream = self.pa.open(
+                format=pyaudio.paInt16,
+                channels=channels,
+                rate=self.rate,
+                input=True,
+                input_device_index=device,
+                frames_per_buffer=CHUNK_FRAMES,
+            )
+            self._streams.append(stream)
+            thread = threading.Thread(
+                target=self._capture, args=(stream, channels, first_channel),
+                name=f"capture-{device}"
+            )
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+            first_channel += channels
+
+        arbiter = threading.Thread(target=self._arbitrate, name="arbiter")
+        arbiter.daemon = True
+        arbiter.start()
+        self._threads.append(arbiter)
+        self.events.event("multi_mic_started", level=QUIET, channels=self.channel_count,
+                          sources=self.sources, arbitration=self.arbitration)
+
+    def _spawn_workers(self):
+        """One decoder process per channel, each with its own audio queue."""
+        audio_queues, workers = [], []
+        for channel in range(self.channel_count):
+            audio_queue = self._ctx.Queue(maxsize=self.queue_size)
+            worker = self._ctx.Process(
+                target=_recognizer_worker,
+                args=(channel, self.model_path, self.grammar, self.rate, audio_queue, self._result_queue),
+                name=f"recognizer-{channel}",
+            )
+            worker.daemon = True
+            worker.start()
+            audio_queues.append(audio_queue)
+            workers.append(worker)
+        return audio_queues, workers
+
+    def set_grammar(self, grammar):
+        """Use another grammar; running decoders are restarted with it."""
+        self.grammar = grammar
+        if self._running:
+            self.restart()
+
+    def set_model(self, model_path, grammar):
+        """Use another model (and its grammar); running decoders are restarted on it."""
+        self.model_path, self.grammar = model_path, grammar
+        if self._running:
+            self.restart()
+
+    def restart(self):
+        """Replace the decoder processes without stopping capture."""
+        retired = list(zip(self._workers, self._audio_queues))
+        self._audio_queues, self._workers = self._spawn_workers()  # capture threads switch here
+        now = time.monotonic()
+        for worker, audio_queue in retired:
+            try:
+                audio_queue.put_nowait(None)
+            except queue.Full:
+                pass  # terminated by the arbiter once the grace period is over
+            self._retired.append((worker, now))
+        self.restarts += 1
+        self.events.event("multi_mic_restarted", level=QUIET, restarts=self.restarts, channels=self.channel_count)
+
+    def stop(self, timeout=1.0):
+        """Stop capture, shut the worker processes down and close the streams."""
+        self._running = False
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        for audio_queue in self._audio_queues:
+            try:
+                audio_queue.put(None, timeout=timeout)
+            except queue.Full:
+                pass
+        for worker in self._workers:
+            worker.join(timeout=timeout)
+            if worker.is_alive():
+                worker.terminate()
+        self._reap_retired(grace=0)
+        for stream in self._streams:
+            stream.close()
+        self._workers, self._audio_queues, self._streams, self._threads = [], [], [], []
+        self.events.event("multi_mic_stopped", level=QUIET, dropped_chunks=self.dropped_chunks)
+
+    def _capture(self, stream, channels, first_channel):
+        """Read one stream and hand each channel's samples to its decoder process."""
+        while self._running:
+            data = stream.read(CHUNK_FRAMES, exception_on_overflow=False)
+            captured_at = time.monotonic()
+            if channels == 1:
+                chunks = [data]
+            else:
+                samples = np.frombuffer(data, dtype=np.int16).reshape(-1, channels)
+                chunks = [samples[:, c].tobytes() for c in range(channels)]
+            for offset, chunk in enumerate(chunks):
+                try:
+                    self._audio_queues[first_channel + offset].put_nowait((captured_at, chunk))
+                except queue.Full:
+                    self.dropped_chunks += 1
+
+    def _reap_retired(self, grace=2.0):
+        """Collect replaced decoders once they exit (terminated after `grace` seconds)."""
+        for item in list(self._retired):
+            worker, since = item
+            if worker.is_alive() and time.monotonic() - since < grace:
+                continue
+            if worker.is_alive():
+                worker.terminate()
+            worker.join(timeout=0.5)
+            self._retired.remove(item)
+
+    def _next_result(self, timeout):
+        """Next worker message, taking results set aside during arbitration first."""
+        if self._backlog:
+            return self._backlog.popleft()
+        return self._result_queue.get(timeout=timeout)
+
+    def _arbitrate(self):
+        """Group per-channel results of the same utterance and pass on the winner."""
+        last_dispatched_end = float("-inf")
+        while self._running:
+            if self._retired:
+                self._reap_retired()
+            try:
+                kind, channel, result = self._next_result(timeout=0.2)
+            except queue.Empty:
+                continue
+            if kind == "ready":
+                self.events.event("recognizer_ready", level=QUIET, channel=channel)
+                continue
+            if result["utterance_end"] <= last_dispatched_end + self.arbitration_window:
+                continue  # a slower channel reporting an utterance that already won
+            candidates = [(channel, result)]
+            if self.arbitration != "first":
+                deadline = time.monotonic() + self.arbitration_window
+                while True:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        kind, other_channel, other = self._result_queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                    if kind != "result":
+                        continue
+                    if abs(other["utterance_end"] - result["utterance_end"]) <= self.arbitration_window:
+                        candidates.append((other_channel, other))
+                    else:
+                        self._backlog.append((kind, other_channel, other))
+            winner_channel, winner = max(candidates, key=lambda c: c[1]["score"])
+            last_dispatched_end = max(r["utterance_end"] for _, r in candidates)
+            self.events.event(
+                "arbitration", text=winner["text"], channel=winner_channel,
+                score=round(winner["score"], 3), candidates=len(candidates),
+                latency=round(time.monotonic() - winner["utterance_end"], 4),
+                decode_time=round(winner["decode_time"], 4),
+            )
+            self.on_result(winner["text"])
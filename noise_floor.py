@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+
+# Ambient noise-floor tracking and the volume gate.
+# Every chunk handed to the recognizer gets a level on a 0-1 scale (0 = -60 dBFS,
+# 1 = full scale), the same scale as the "Volume Threshold" slider. Levels from the
+# last `window` seconds are kept in a small ring; a low percentile of them is the
+# ambient floor, since speech only occupies a minority of chunks. With auto gating
+# the threshold follows floor + margin. When gating is enabled, chunks below the
+# threshold are passed to the recognizer as digital silence (after a short
+# hangover), so room noise cannot be decoded into commands while endpointing still
+# sees silence. The last pre_roll seconds of gated audio are kept and passed on in
+# front of the chunk that opens the gate, so a quiet word onset is not lost.
+
+import math
+import threading
+from collections import deque
+
+import numpy as np
+
+from event_log import get_event_log
+
+FLOOR_DB = -60.0  # level 0.0
+
+
+def level_from_rms(rms):
+    """Map an int16 RMS value onto the 0-1 level scale."""
+    if rms <= 0:
+        return 0.0
+    db = 20 * math.log10(rms / 32768.0)
+    return min(1.0, max(0.0, (db - FLOOR_DB) / -FLOOR_DB))
+
+
+class NoiseFloorEstimator:
+    """Tracks ambient level percentiles and gates chunks that fall below the threshold."""
+
+    def __init__(self, threshold=0.3, auto=True, window=30.0, rate=16000, chunk_frames=4096,
+                 percentile=20.0, margin=0.1, hangover=0.75, pre_roll=0.25, enabled=False):
+        self.enabled = enabled
+        self.auto = auto
+        self.threshold = threshold
+        self.percentile = percentile
+        self.margin = margin
+        self.level = 0.0
+        self.floor = None
+        self.gated = 0
+        self.closed = False  # whether the last chunk through gate() was below the threshold, past the hangover
+        self.calibrations = 0
+        self.events = get_event_log()
+
+        self._rate = rate
+        self._chunk_seconds = chunk_frames / rate
+        self._levels = np.zeros(max(4, int(window / self._chunk_seconds)), dtype=np.float32)
+        self._count = 0
+        self._hangover = hangover
+        self._open_until = 0.0
+        self._pre_roll_bytes = int(pre_roll * rate) * 2
+        self._held = deque()  # most recent gated chunks, replayed when the gate opens
+        self._held_size = 0
+        self._clock = 0.0  # seconds of audio seen
+        self._silence = {}
+        self._lock = threading.Lock()
+        self._calibration = None  # (levels collected, target chunk count, callback)
+
+    @classmethod
+    def from_calibration(cls, calibration_manager):
+        """Build from the "noise_floor" calibration category and the stored volume threshold."""
+        get = calibration_manager.get_setting
+        return cls(
+            threshold=float(get("voice_recognition", "volume_threshold")),
+            auto=bool(get("noise_floor", "auto_gate")),
+            window=float(get("noise_floor", "window")),
+            percentile=float(get("noise_floor", "percentile")),
+            margin=float(get("noise_floor", "margin")),
+            hangover=float(get("noise_floor", "hangover")),
+            pre_roll=float(get("noise_floor", "pre_roll")),
+            enabled=bool(get("noise_floor", "gate")),
+        )
+
+    @property
+    def calibrating(self):
+        return self._calibration is not None
+
+    def update(self, data):
+        """Measure a chunk and fold it into the floor estimate; returns its level."""
+        samples = np.frombuffer(data, dtype=np.int16).astype(np.float32)
+        rms = math.sqrt(float(np.dot(samples, samples)) / len(samples)) if len(samples) else 0.0
+        level = level_from_rms(rms)
+        self.level = level
+        self._clock += len(samples) / self._rate
+        with self._lock:
+            self._levels[self._count % len(self._levels)] = level
+            self._count += 1
+            filled = self._levels[:min(self._count, len(self._levels))]
+            self.floor = float(np.percentile(filled, self.percentile))
+            if self.auto and self._count >= 4:
+                self.threshold = min(1.0, self.floor + self.margin)
+            if self._calibration is not None:
+                self._collect(level)
+        return level
+
+    def gate(self, data):
+        """Return data, or silence of the same length if the gate is closed. The chunk that
+        opens the gate comes back with the held pre-roll audio in front of it."""
+        level = self.update(data)
+        self.closed = False
+        if level >= self.threshold:
+            self._open_until = self._clock + self._hangover
+        if not self.enabled:
+            # Still report quiet chunks (for the idle monitor and decode skipping)
+            self.closed = self._clock > self._open_until
+            return data
+        if self._clock <= self._open_until:
+            if self._held:
+                data = b"".join(self._held) + data
+                self._held.clear()
+                self._held_size = 0
+            return data
+        self.closed = True
+        if self._pre_roll_bytes:
+            self._held.append(data)
+            self._held_size += len(data)
+            while self._held_size - len(self._held[0]) >= self._pre_roll_bytes:
+                self._held_size -= len(self._held.popleft())
+        self.gated += 1
+        silence = self._silence.get(len(data))
+        if silence is None:
+            silence = self._silence[len(data)] = bytes(len(data))
+        return silence
+
+    def start_calibration(self, seconds, callback=None):
+        """Collect `seconds` of (silent) audio; callback(threshold, floor) runs on the audio thread."""
+        with self._lock:
+            self._calibration = ([], max(1, int(seconds / self._chunk_seconds)), callback)
+
+    def _collect(self, level):
+        levels, target, callback = self._calibration
+        levels.append(level)
+        if len(levels) < target:
+            return
+        self._calibration = None
+        # The loudest bit of "silence" sets the floor; seed the window with it
+        floor = float(np.percentile(levels, 95))
+        self._levels[:] = floor
+        self._count = len(self._levels)
+        self.floor = floor
+        self.threshold = min(1.0, floor + self.margin)
+        self.calibrations += 1
+        self.events.event("noise_floor_calibrated", floor=round(floor, 3), threshold=round(self.threshold, 3),
+                          chunks=len(levels))
+        if callback:
+            callback(self.threshold, floor)
+
+    def state(self):
+        """Snapshot for the GUI: live level, estimated floor and current gate threshold."""
+        return {"input_level": self.level, "floor": self.floor, "threshold": self.threshold, "gated": self.gated}
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+
+# asyncio core of the recognition loop.
+# The voice path is a chain of stages, each an asyncio task fed by a bounded
+# asyncio.Queue:
+#     capture -> decode -> match -> dispatch -> (motion queue / actuation thread)
+# A stage is a plain function of one item; the first stage (the source) takes
+# none and is called repeatedly. Returning None drops the item, and a stage
+# built with many=True returns a list of items to pass on. Blocking stages (the
+# microphone read, the Kaldi decoder) run on their own single-thread executor.
+# Each keeps a fixed thread, so per-thread profiling and CPU accounting still
+# work, and the next chunk is read while the previous one is decoded. Cheap
+# stages run on the event loop itself. A full queue makes the stage before it
+# wait, back to the microphone, where the capture monitor sees the overflow.
+#
+# The loop has its own thread. stop() cancels every stage task together, and an
+# exception in any stage does the same. A blocking call in flight is allowed to
+# finish (at most one chunk read) before the executors are shut down and on_stop
+# runs, so the stream is never stopped under a read. start() refuses to run a
+# second loop while the previous one is still shutting down. Per-stage counts, busy time,
+# queue high-water marks, throughput and the shutdown latency are reported by
+# stats(). To measure the core on its own:
+#
+#   python3 pipeline.py --seconds 5 --read-ms 256 --decode-ms 20
+
+import time
+import asyncio
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from event_log import get_event_log, QUIET
+
+
+class Stage:
+    """One step of the pipeline and its counters."""
+
+    def __init__(self, name, func, blocking=False, many=False, queue_size=4):
+        self.name = name
+        self.func = func
+        self.blocking = blocking      # run on a dedicated executor thread
+        self.many = many              # func returns a list of items
+        self.queue_size = queue_size  # bound of the queue feeding this stage
+        self.reset()
+
+    def reset(self):
+        self.items = 0
+        self.emitted = 0
+        self.busy = 0.0
+        self.max_time = 0.0
+        self.max_queue = 0
+
+    def stats(self):
+        return {
+            "items": self.items,
+            "emitted": self.emitted,
+            "busy": round(self.busy, 3),
+            "mean_ms": round(self.busy / self.items * 1000, 3) if self.items else None,
+            "max_ms": round(self.max_time * 1000, 3),
+            "max_queue": self.max_queue,
+        }
+
+
+class Pipeline:
+    """Runs a chain of stages as asyncio tasks on a dedicated event-loop thread."""
+
+    def __init__(self, stages, on_stop=None, name="pipeline"):
+        self.stages = stages
+        self.on_stop = on_stop      # on_stop(error or None), called on the pipeline thread
+        self.name = name
+        self.events = get_event_log()
+        self.error = None
+        self.started_at = None
+        self.stopped_at = None
+        self.shutdown_latency = None
+
+        self._thread = None
+        self._loop = None
+        self._task = None
+        self._executors = []
+        self._queues = {}           # stage name -> the queue feeding it
+        self._stop_requested = None
+        self._ready = threading.Event()
+
+    @property
+    def running(self):
+        """True from start() until the last stage has finished and on_stop has run."""
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Start the loop thread; returns False (and starts nothing) if a previous run
+        is still shutting down after the join timeout, so two loops never share the stages."""
+        self.join()
+        if self.running:
+            self.events.event("pipeline_start_refused", level=QUIET, pipeline=self.name)
+            return False
+        for stage in self.stages:
+            stage.reset()
+        self.error = None
+        self.shutdown_latency = None
+        self.stopped_at = None
+        self._stop_requested = None
+        self._ready.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name)
+        self._thread.daemon = True
+        self._thread.start()
+        self._ready.wait()
+        return True
+
+    def stop(self, wait=True, timeout=2.0):
+        """Cancel every stage. With wait=False it returns at once; on_stop reports the end."""
+        if not self.running:
+            return
+        if self._stop_requested is None:
+            self._stop_requested = time.perf_counter()
+            self._loop.call_soon_threadsafe(self._task.cancel)
+        if wait:
+            self.join(timeout)
+
+    def feed(self, stage_name, item):
+        """Queue an item for a stage from another thread (results produced outside the chain).
+
+        Does not block; the item waits on the loop while the queue is full. Returns
+        False if the pipeline is not running.
+        """
+        queue = self._queues.get(stage_name)
+        if queue is None or self._stop_requested is not None or not self.running:
+            return False
+        try:
+            asyncio.run_coroutine_threadsafe(queue.put(item), self._loop)
+        except RuntimeError:
+            return False  # the loop closed in the meantime
+        return True
+
+    def join(self, timeout=2.0):
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    def _run(self):
+        loop = self._loop = asyncio.new_event_loop()
+        self._executors = [
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"{self.name}-{stage.name}")
+            if stage.blocking else None
+            for stage in self.stages
+        ]
+        self._task = loop.create_task(self._main())
+        self.started_at = time.perf_counter()
+        self._ready.set()
+        try:
+            loop.run_until_complete(self._task)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            # Calls already running on an executor thread are waited for, not abandoned
+            for executor in self._executors:
+                if executor:
+                    executor.shutdown(wait=True)
+            loop.close()
+            self._queues = {}
+            self.stopped_at = time.perf_counter()
+            if self._stop_requested is not None:
+                self.shutdown_latency = self.stopped_at - self._stop_requested
+            self.events.event("pipeline_stopped", level=QUIET, pipeline=self.name,
+                              error=str(self.error) if self.error else None, **self._summary())
+            if self.on_stop:
+                self.on_stop(self.error)
+
+    async def _main(self):
+        queues = [asyncio.Queue(maxsize=stage.queue_size) for stage in self.stages[1:]]
+        self._queues = {stage.name: queue for stage, queue in zip(self.stages[1:], queues)}
+        inboxes = [None] + queues
+        outboxes = queues + [None]
+        following = self.stages[1:] + [None]
+        tasks = [
+            asyncio.ensure_future(self._stage_loop(stage, executor, inbox, outbox, next_stage))
+            for stage, executor, inbox, outbox, next_stage
+            in zip(self.stages, self._executors, inboxes, outboxes, following)
+        ]
+        try:
+            # Stages only return by failing; the first failure takes the others down with it
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            for task in tasks:
+                if task.done() and not task.cancelled() and task.exception():
+                    self.error = task.exception()
+                    self.events.event("pipeline_failed", level=QUIET, pipeline=self.name,
+                                      stage=self.stages[tasks.index(task)].name, error=repr(self.error))
+                    break
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _stage_loop(self, stage, executor, inbox, outbox, next_stage):
+        loop = asyncio.get_running_loop()
+        while True:
+            args = ()
+            if inbox is not None:
+                args = (await inbox.get(),)
+            started = time.perf_counter()
+            if executor:
+                result = await loop.run_in_executor(executor, stage.func, *args)
+            else:
+                result = stage.func(*args)
+            elapsed = time.perf_counter() - started
+            stage.items += 1
+            stage.busy += elapsed
+            stage.max_time = max(stage.max_time, elapsed)
+            if result is None:
+                continue
+            for item in (result if stage.many else (result,)):
+                stage.emitted += 1
+                if outbox is not None:
+                    await outbox.put(item)
+                    next_stage.max_queue = max(next_stage.max_queue, outbox.qsize())
+
+    def _summary(self):
+        end = self.stopped_at or time.perf_counter()
+        uptime = end - self.started_at if self.started_at else 0.0
+        source = self.stages[0].items if self.stages else 0
+        return {
+            "uptime": round(uptime, 3),
+            "throughput": round(source / uptime, 2) if uptime else None,
+            "shutdown_ms": round(self.shutdown_latency * 1000, 2) if self.shutdown_latency is not None else None,
+        }
+
+    def stats(self):
+        """Snapshot for /metrics and the benchmark."""
+        return {"running": self.running, **self._summary(),
+                "stages": {stage.name: stage.stats() for stage in self.stages}}
+
+
+def run_benchmark(seconds=5.0, read_ms=256.0, decode_ms=20.0, final_every=4, queue_size=4):
+    """Synthetic capture/decode/match/dispatch chain: throughput, per-stage time, shutdown latency."""
+    chunk = bytes(2 * 4096)
+    dispatched = []
+
+    def capture():
+        if read_ms:
+            time.sleep(read_ms / 1000)
+        return chunk
+
+    counter = {"n": 0}
+
+    def decode(data):
+        if decode_ms:
+            time.sleep(decode_ms / 1000)
+        counter["n"] += 1
+        return {"text": "forward"} if counter["n"] % final_every == 0 else None
+
+    stages = [
+        Stage("capture", capture, blocking=True),
+        Stage("decode", decode, blocking=True, queue_size=queue_size),
+        Stage("match", lambda result: result["text"], queue_size=queue_size),
+        Stage("dispatch", dispatched.append, queue_size=queue_size),
+    ]
+    pipeline = Pipeline(stages, name="benchmark")
+    pipeline.start()
+    time.sleep(seconds)
+    pipeline.stop()
+    stats = pipeline.stats()
+    stats["dispatched"] = len(dispatched)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the asyncio pipeline core with synthetic stages")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--read-ms", type=float, default=256.0, help="blocking read per chunk (0 = free-running)")
+    parser.add_argument("--decode-ms", type=float, default=20.0, help="blocking decode per chunk")
+    parser.add_argument("--final-every", type=int, default=4, help="chunks per final result")
+    parser.add_argument("--queue-size", type=int, default=4)
+    args = parser.parse_args()
+    stats = run_benchmark(args.seconds, args.read_ms, args.decode_ms, args.final_every, args.queue_size)
+    print(f"Throughput: {stats['throughput']} chunks/s over {stats['uptime']} s, "
+          f"{stats['dispatched']} commands dispatched")
+    print(f"Shutdown latency: {stats['shutdown_ms']} ms")
+    for name, stage in stats["stages"].items():
+        print(f"   {name:<9} items={stage['items']:<7} mean={stage['mean_ms']} ms  max={stage['max_ms']} ms  "
+              f"max_queue={stage['max_queue']}")
+
+
+if __name__ == "__main__":
+    main()
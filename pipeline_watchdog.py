@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+
+# Dead-man watchdog for the voice pipeline.
+# The capture loop, the decoder and the actuation thread each call beat(stage)
+# as they make progress. A stage is armed by its first beat and disarmed by
+# idle(stage) (recognition stopped, movement finished). If an armed stage goes
+# longer than its deadline without a beat while a movement is running, the
+# watchdog stops the motors itself instead of waiting on the stalled thread.
+# Every gap between beats lands in a per-stage histogram, so stall frequency
+# can be read from the event log or the API's /metrics endpoint.
+# A deadline may be a callable; the actuation deadline is one, following the
+# longest calibrated movement duration plus a margin, so a legitimately long
+# movement never trips it.
+
+import time
+import bisect
+import threading
+
+from event_log import get_event_log, QUIET
+
+# Upper bounds (seconds) of the heartbeat-gap histogram buckets; the last bucket is open
+GAP_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0)
+STAGES = ("capture", "decode", "actuation")
+
+
+class _Stage:
+    def __init__(self, deadline):
+        self._deadline = deadline  # seconds, or () -> seconds
+        self.last = None       # monotonic time of the last beat while armed
+        self.tripped = False   # already reported for the current stall
+        self.beats = 0
+        self.max_gap = 0.0
+        self.stalls = 0
+        self.trips = 0
+        self.histogram = [0] * (len(GAP_BUCKETS) + 1)
+
+    @property
+    def deadline(self):
+        return self._deadline() if callable(self._deadline) else self._deadline
+
+
+class Watchdog:
+    """Stops the motors when a pipeline stage misses its heartbeat deadline during motion."""
+
+    def __init__(self, on_trip, motion_active, deadlines=None, check_interval=0.05, stats_interval=300.0):
+        self.on_trip = on_trip              # on_trip(stage, gap)
+        self.motion_active = motion_active  # () -> bool
+        self.check_interval = check_interval
+        self.stats_interval = stats_interval
+        self.events = get_event_log()
+        deadlines = deadlines or {}
+        self._stages = {name: _Stage(deadlines.get(name, 1.0)) for name in STAGES}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def from_calibration(cls, calibration_manager, on_trip, motion_active):
+        """Build from the "watchdog" calibration category; the actuation deadline tracks the
+        "movement_duration" settings as they are changed."""
+        get = calibration_manager.get_setting
+
+        def actuation_deadline():
+            longest = max(float(get("movement_duration", key)) for key in ("default_duration", "turn_duration"))
+            return longest + float(get("watchdog", "actuation_margin"))
+
+        return cls(
+            on_trip, motion_active,
+            deadlines={
+                "capture": float(get("watchdog", "capture_deadline")),
+                "decode": float(get("watchdog", "decode_deadline")),
+                "actuation": actuation_deadline,
+            },
+            check_interval=float(get("watchdog", "check_interval")),
+            stats_interval=float(get("watchdog", "stats_interval")),
+        )
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="watchdog")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=1.0)
+
+    def beat(self, stage):
+        """Record progress for a stage (arms it if idle)."""
+        now = time.monotonic()
+        with self._lock:
+            s = self._stages[stage]
+            if s.last is not None:
+                gap = now - s.last
+                s.histogram[bisect.bisect_left(GAP_BUCKETS, gap)] += 1
+                if gap > s.max_gap:
+                    s.max_gap = gap
+            s.last = now
+            s.tripped = False
+            s.beats += 1
+
+    def idle(self, stage):
+        """The stage is legitimately not running; stop watching it."""
+        with self._lock:
+            s = self._stages[stage]
+            if s.last is not None:
+                gap = time.monotonic() - s.last
+                s.histogram[bisect.bisect_left(GAP_BUCKETS, gap)] += 1
+                s.max_gap = max(s.max_gap, gap)
+            s.last = None
+            s.tripped = False
+
+    def stats(self):
+        """Per-stage beat counts, stalls, trips and heartbeat-gap histograms."""
+        labels = [f"<={bound:g}s" for bound in GAP_BUCKETS] + [f">{GAP_BUCKETS[-1]:g}s"]
+        with self._lock:
+            return {
+                name: {
+                    "deadline": s.deadline,
+                    "beats": s.beats,
+                    "max_gap": round(s.max_gap, 4),
+                    "stalls": s.stalls,
+                    "trips": s.trips,
+                    "histogram": dict(zip(labels, s.histogram)),
+                }
+                for name, s in self._stages.items()
+            }
+
+    def log_stats(self):
+        self.events.event("watchdog_stats", level=QUIET, **self.stats())
+
+    def _run(self):
+        last_stats = time.monotonic()
+        while not self._stop.wait(self.check_interval):
+            now = time.monotonic()
+            stalled = []
+            with self._lock:
+                for name, s in self._stages.items():
+                    if s.last is None or s.tripped or now - s.last <= s.deadline:
+                        continue
+                    s.tripped = True
+                    s.stalls += 1
+                    stalled.append((name, now - s.last))
+            for name, gap in stalled:
+                moving = self.motion_active()
+                self.events.event("watchdog_stall", level=QUIET, stage=name, gap=round(gap, 3), motion=moving)
+                if moving:
+                    with self._lock:
+                        self._stages[name].trips += 1
+                    try:
+                        self.on_trip(name, gap)
+                    except Exception as e:
+                        self.events.event("watchdog_error", level=QUIET, stage=name, error=str(e))
+            if self.stats_interval and now - last_stats >= self.stats_interval:
+                last_stats = now
+                self.log_stats()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+
+# Runtime profiling hook for the voice controller.
+# Two modes:
+#   "sample"   - a background thread samples every thread's stack with
+#                sys._current_frames() and writes collapsed stacks
+#                (flamegraph.pl / speedscope format). Covers all threads with
+#                no cooperation from them.
+#   "cprofile" - each participating thread enables its own cProfile.Profile the
+#                next time it calls checkpoint(); stats are dumped as .prof files.
+# Sessions can be started and stopped at any time without restarting the app.
+
+import os
+import sys
+import time
+import cProfile
+import threading
+from collections import Counter
+
+from event_log import get_event_log, QUIET
+
+PROFILE_ENV_VAR = "VOSK_ROBOT_PROFILE"
+PROFILE_MODES = ("sample", "cprofile")
+
+
+def mode_from_env():
+    """Return the profiling mode requested through the environment, or None."""
+    value = os.environ.get(PROFILE_ENV_VAR, "").strip().lower()
+    if not value or value in ("0", "off", "false", "no"):
+        return None
+    if value in PROFILE_MODES:
+        return value
+    return "sample"
+
+
+class RuntimeProfiler:
+    """Start/stop profiling sessions across the recognition, actuation and Tk threads."""
+
+    def __init__(self, output_dir="profiles", mode="sample", sample_interval=0.005):
+        self.output_dir = output_dir
+        self.mode = mode if mode in PROFILE_MODES else "sample"
+        self.sample_interval = sample_interval
+        self.events = get_event_log()
+
+        self._lock = threading.Lock()
+        self._generation = 0        # id of the running session; 0 while idle
+        self._sessions = 0          # sessions started so far (source of the ids)
+        self._session = None
+        self._local = threading.local()
+        self._profiles = {}         # thread name -> cProfile.Profile (cprofile mode)
+        self._finished = set()      # thread names whose profile has been disabled
+        self._samples = Counter()
+        self._sample_count = 0
+        self._sampler = None
+        self._stop_sampling = threading.Event()
+
+    @classmethod
+    def from_calibration(cls, calibration_manager, output_dir=None, mode=None):
+        """Build a profiler from the "profiling" calibration category."""
+        get = calibration_manager.get_setting
+        return cls(
+            output_dir=output_dir or get("profiling", "output_dir"),
+            mode=mode or get("profiling", "mode"),
+            sample_interval=float(get("profiling", "sample_interval")),
+        )
+
+    @property
+    def active(self):
+        return self._generation != 0
+
+    def start(self, mode=None):
+        """Begin a profiling session. Returns False if one is already running."""
+        with self._lock:
+            if self.active:
+                return False
+            if mode in PROFILE_MODES:
+                self.mode = mode
+            self._sessions += 1
+            self._generation = self._sessions
+            # The counter keeps sessions started within the same second from sharing file names
+            self._session = f"{time.strftime('%Y%m%d-%H%M%S')}-{self._sessions}"
+            self._profiles = {}
+            self._finished = set()
+            self._samples = Counter()
+            self._sample_count = 0
+        if self.mode == "sample":
+            self._stop_sampling.clear()
+            self._sampler = threading.Thread(target=self._sample_loop, name="profiler-sampler")
+            self._sampler.daemon = True
+            self._sampler.start()
+        else:
+            # Profile the calling thread (usually the Tk main loop) immediately
+            self.checkpoint()
+        self.events.event("profiling_started", level=QUIET, mode=self.mode, session=self._session)
+        return True
+
+    def stop(self, wait=1.0):
+        """End the current session and write its output files. Returns the written paths."""
+        with self._lock:
+            if not self.active:
+                return []
+            self._generation = 0
+        if self.mode == "sample":
+            self._stop_sampling.set()
+            if self._sampler:
+                self._sampler.join(timeout=wait)
+            paths = [self._write_collapsed()]
+        else:
+            self.checkpoint()
+            # Give other threads a chance to reach their next checkpoint and disable
+            deadline = time.monotonic() + wait
+            while time.monotonic() < deadline and set(self._profiles) - self._finished:
+                time.sleep(0.01)
+            paths = self._write_prof_files()
+        self.events.event("profiling_stopped", level=QUIET, mode=self.mode, files=paths)
+        return paths
+
+    def toggle(self, mode=None):
+        """Start a session if idle, otherwise stop it."""
+        if self.active:
+            self.stop()
+            return False
+        return self.start(mode)
+
+    def checkpoint(self):
+        """Called from hot loops; enables/disables this thread's cProfile as needed."""
+        generation = self._generation
+        local = self._local
+        if getattr(local, "generation", 0) == generation:
+            return
+        profile = getattr(local, "profile", None)
+        if profile is not None:
+            profile.disable()
+            local.profile = None
+            self._finished.add(threading.current_thread().name)
+        local.generation = generation
+        if generation and self.mode == "cprofile":
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError as e:
+                # Python 3.12+ allows only one active profiler tool at a time
+                self.events.event("profiling_error", level=QUIET, error=str(e),
+                                  thread=threading.current_thread().name)
+                return
+            local.profile = profile
+            with self._lock:
+                self._profiles[threading.current_thread().name] = profile
+
+    def _sample_loop(self):
+        """Sample all thread stacks until stopped."""
+        own_id = threading.get_ident()
+        while not self._stop_sampling.wait(self.sample_interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self._samples[";".join(reversed(stack))] += 1
+            self._sample_count += 1
+
+    def _write_collapsed(self):
+        """Write samples in collapsed-stack format ("frame;frame;frame count")."""
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir, f"{self._session}.collapsed")
+        with open(path, "w") as f:
+            for stack, count in self._samples.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
+
+    def _write_prof_files(self):
+        """Dump one .prof file per profiled thread."""
+        os.makedirs(self.output_dir, exist_ok=True)
+        paths = []
+        for thread_name, profile in self._profiles.items():
+            safe_name = "".join(c if c.isalnum() or c in "-_" else "_" for c in thread_name)
+            path = os.path.join(self.output_dir, f"{self._session}-{safe_name}.prof")
+            profile.dump_stats(path)
+            paths.append(path)
+        return paths
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+
+# Recognizer maintenance for long sessions.
+# One KaldiRecognizer normally lives for a whole shift. RecognizerPolicy is
+# consulted at utterance boundaries (right after a final result, when no audio
+# is in flight) and answers whether to Reset() the recognizer, rebuild it from
+# the loaded model, or leave it alone:
+#   - reset_after:   seconds between Reset() calls (0 = never)
+#   - rebuild_after: seconds between rebuilds (0 = never)
+#   - rss_growth_mb: rebuild once resident memory has grown this much since the
+#                    last rebuild (0 = never)
+# Memory that grows for a legitimate reason (another model loaded or cached,
+# audio buffers enlarged or first touched) is not recognizer growth; rebaseline()
+# measures the baseline again at the next check.
+
+import os
+import time
+import threading
+
+from event_log import get_event_log
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def rss_bytes():
+    """Current resident set size of this process (0 if it cannot be read)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        # Peak, not current, but the best available without /proc (KiB on Linux, bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if peak > 1 << 32 else peak * 1024
+    except (ImportError, OSError):
+        return 0
+
+
+def native_thread_count():
+    """OS-level threads in this process (includes PortAudio/Kaldi threads), else Python threads."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("Threads:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return threading.active_count()
+
+
+class RecognizerPolicy:
+    """Decides when a long-lived recognizer should be reset or rebuilt."""
+
+    def __init__(self, reset_after=0.0, rebuild_after=0.0, rss_growth_mb=0.0):
+        self.reset_after = reset_after
+        self.rebuild_after = rebuild_after
+        self.rss_growth = rss_growth_mb * 1024 * 1024
+        self.resets = 0
+        self.rebuilds = 0
+        self.events = get_event_log()
+        now = time.monotonic()
+        self._last_reset = now
+        self._last_rebuild = now
+        self._baseline = rss_bytes()
+
+    @classmethod
+    def from_calibration(cls, calibration_manager):
+        """Build from the "recognizer_maintenance" calibration category."""
+        get = calibration_manager.get_setting
+        return cls(
+            reset_after=float(get("recognizer_maintenance", "reset_after")),
+            rebuild_after=float(get("recognizer_maintenance", "rebuild_after")),
+            rss_growth_mb=float(get("recognizer_maintenance", "rss_growth_mb")),
+        )
+
+    @property
+    def active(self):
+        return bool(self.reset_after or self.rebuild_after or self.rss_growth)
+
+    def rebaseline(self):
+        """Forget the RSS baseline after a legitimate memory change; re-measured at the next check."""
+        self._baseline = None
+
+    def check(self):
+        """Return "rebuild", "reset" or None. Call only between utterances."""
+        if not self.active:
+            return None
+        now = time.monotonic()
+        rss = rss_bytes()
+        if self._baseline is None:
+            self._baseline = rss
+        reason = None
+        if self.rss_growth and rss - self._baseline > self.rss_growth:
+            reason = "rss_growth"
+        elif self.rebuild_after and now - self._last_rebuild >= self.rebuild_after:
+            reason = "interval"
+        if reason:
+            self.rebuilds += 1
+            self.events.event("recognizer_maintenance", action="rebuild", reason=reason,
+                              rss_mb=round(rss / 1048576, 1), baseline_mb=round(self._baseline / 1048576, 1))
+            self._last_rebuild = self._last_reset = now
+            self._baseline = None  # re-measured at the next check, once the old recognizer is gone
+            return "rebuild"
+        if self.reset_after and now - self._last_reset >= self.reset_after:
+            self.resets += 1
+            self._last_reset = now
+            self.events.event("recognizer_maintenance", action="reset", rss_mb=round(rss / 1048576, 1))
+            return "reset"
+        return None
+
+    def apply(self, recognizer, build):
+        """Run check() and act on it; returns the recognizer to use from now on."""
+        action = self.check()
+        if action == "reset":
+            recognizer.Reset()
+        elif action == "rebuild":
+            recognizer = build()
+        return recognizer
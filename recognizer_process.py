@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+
+# Out-of-process recognizer with a shared-memory audio ring.
+# With the recognizer in the GUI process, Kaldi decoding, result JSON parsing,
+# PyAudio capture and Tk redraws all take turns on one GIL. RecognizerProcess
+# moves the KaldiRecognizer (and the wake-word gate, if enabled) into a child
+# process:
+#   - audio: the capture loop copies each chunk into a SharedAudioRing (a byte ring
+#     in multiprocessing.shared_memory) and sends only the new write offset over
+#     the pipe. Audio itself is never pickled.
+#   - results: the child sends back one small tuple per decoded block (end offset,
+#     decode time, the final result dict or None). Its events are forwarded too
+#     and written by the parent's event log.
+#   - restarts: the ring header records how far the child has read. If the child
+#     dies, it is respawned (with a growing delay while it keeps failing), and the
+#     new child resumes from that offset. Audio captured meanwhile is decoded late
+#     instead of lost, as long as the ring has not wrapped past it.
+# A model switch also restarts the child; grammar swaps and wake-window changes
+# go over the pipe. The replaced child still decodes the audio notices queued to
+# it before "stop" (and advances the read offset past that audio), so its pipe is
+# drained and those results delivered before it is reaped. The parent then needs no recognizer (or model) of its own.
+
+import os
+import json
+import time
+import struct
+import threading
+import multiprocessing
+from multiprocessing import shared_memory
+
+from event_log import get_event_log, set_event_log, NORMAL, QUIET
+
+SAMPLE_WIDTH = 2  # paInt16
+HEADER = struct.Struct("<QQ")  # bytes written by the capture loop, bytes consumed by the decoder
+CONSUMED_OFFSET = 8
+
+
+class SharedAudioRing:
+    """Single-producer, single-consumer byte ring in a shared memory block.
+
+    Offsets are absolute byte counts; the header holds the producer's and the
+    consumer's current ones so either side can be restarted.
+    """
+
+    def __init__(self, size, name=None):
+        self.size = size
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=HEADER.size + size)
+            HEADER.pack_into(self.shm.buf, 0, 0, 0)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+        self._data = self.shm.buf[HEADER.size:HEADER.size + size]
+        self.written = HEADER.unpack_from(self.shm.buf, 0)[0]
+
+    @property
+    def consumed(self):
+        return HEADER.unpack_from(self.shm.buf, 0)[1]
+
+    def write(self, data):
+        """Append a chunk (producer side); returns the new write offset."""
+        n = len(data)
+        if n > self.size:
+            self.written += n - self.size
+            data, n = data[-self.size:], self.size
+        pos = self.written % self.size
+        first = min(n, self.size - pos)
+        self._data[pos:pos + first] = data[:first]
+        if first < n:
+            self._data[:n - first] = data[first:]
+        self.written += n
+        struct.pack_into("<Q", self.shm.buf, 0, self.written)
+        return self.written
+
+    def read(self, start, end):
+        """Copy out [start, end) (consumer side). Returns (data, bytes lost to wrap-around)."""
+        dropped = max(0, end - self.size - start)
+        start += dropped
+        pos = start % self.size
+        first = min(end - start, self.size - pos)
+        data = bytes(self._data[pos:pos + first])
+        if first < end - start:
+            data += bytes(self._data[:end - start - first])
+        struct.pack_into("<Q", self.shm.buf, CONSUMED_OFFSET, end)
+        return data, dropped
+
+    def close(self):
+        self._data.release()
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class _PipeEventLog:
+    """Event log for the child process: forwards events to the parent's log."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def enabled(self, level=NORMAL):
+        return True
+
+    def event(self, name, level=NORMAL, **fields):
+        try:
+            self.conn.send(("event", name, level, fields))
+        except (OSError, ValueError):
+            pass
+
+    def close(self, timeout=0):
+        pass
+
+
+def _recognizer_main(ring_name, ring_size, model_path, grammar, rate, wake, conn):
+    """Child process: decode audio from the shared ring as the parent announces it."""
+    set_event_log(_PipeEventLog(conn))
+    import vosk
+
+    started = time.perf_counter()
+    model = vosk.Model(model_path)
+    recognizer = vosk.KaldiRecognizer(model, rate, grammar)
+    recognizer.SetWords(True)
+    gate = None
+    if wake:
+        from wake_word import WakeWordGate
+        gate = WakeWordGate(model, recognizer, wake["phrase"], wake["window"], rate,
+                            on_state=lambda awake: conn.send(("wake", awake)))
+    ring = SharedAudioRing(ring_size, name=ring_name)
+    position = ring.consumed
+    conn.send(("ready", os.getpid(), round((time.perf_counter() - started) * 1000, 1)))
+    try:
+        while True:
+            try:
+                message = conn.recv()
+            except EOFError:
+                break
+            kind = message[0]
+            if kind == "stop":
+                break
+            if kind == "grammar":
+                if hasattr(recognizer, "SetGrammar"):
+                    recognizer.SetGrammar(message[1])
+                else:
+                    recognizer = vosk.KaldiRecognizer(model, rate, message[1])
+                    recognizer.SetWords(True)
+                    if gate:
+                        gate.command_recognizer = recognizer
+                continue
+            if kind == "reset":
+                recognizer.Reset()
+                continue
+            if kind == "wake_window":
+                if gate:
+                    gate.window = message[1]
+                continue
+            # ("audio", end): the ring holds new audio up to offset `end`
+            end = message[1]
+            if end <= position:
+                continue
+            data, dropped = ring.read(position, end)
+            position = end
+            decode_started = time.perf_counter()
+            if gate:
+                result = gate.accept(data)
+            elif recognizer.AcceptWaveform(data):
+                result = json.loads(recognizer.Result())
+            else:
+                result = None
+            # The wake recognizer ends utterances too, without a command result
+            final = result is not None or (gate is not None and gate.finalized)
+            conn.send(("decoded", end, dropped, time.perf_counter() - decode_started, result, final))
+    finally:
+        ring.close()
+
+
+class RecognizerProcess:
+    """Runs the recognizer in a child process fed through a shared-memory audio ring."""
+
+    def __init__(self, model_path, grammar, on_result, on_decoded=None, on_wake_state=None, rate=16000,
+                 ring_seconds=10.0, wake=None, restart_delay=0.5, max_restart_delay=10.0, max_pending=64):
+        self.model_path = model_path
+        self.grammar = grammar
+        self.on_result = on_result          # on_result(result dict) for each final result
+        self.on_decoded = on_decoded        # on_decoded(decode seconds, final) for each decoded block
+        self.on_wake_state = on_wake_state  # on_wake_state(awake)
+        self.rate = rate
+        self.wake = wake                    # {"phrase": ..., "window": ...} or None
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        self.max_pending = max_pending
+        self.events = get_event_log()
+        self.ring = SharedAudioRing(int(ring_seconds * rate) * SAMPLE_WIDTH)
+
+        self.ready = False
+        self.awake = False                  # the child's wake-word window is open
+        self.pid = None
+        self.restarts = 0
+        self.crashes = 0
+        self.blocks = 0
+        self.dropped_bytes = 0
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self._ctx = multiprocessing.get_context("spawn")
+        self._process = None
+        self._conn = None
+        self._pending = 0           # audio notices not yet answered (capture and reader threads)
+        self._pending_lock = threading.Lock()
+        self._failures = 0          # crashes since the last successful start
+        self._retired = []          # (conn, process, since) replaced children still shutting down
+        self._send_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._reader = None
+
+    @classmethod
+    def from_calibration(cls, calibration_manager, model_path, grammar, on_result, on_decoded=None,
+                         on_wake_state=None):
+        """Build from the "recognizer_process" calibration category (and "wake_word")."""
+        get = calibration_manager.get_setting
+        wake = None
+        if get("wake_word", "enabled"):
+            wake = {"phrase": get("wake_word", "phrase"), "window": float(get("wake_word", "window"))}
+        return cls(
+            model_path, grammar, on_result, on_decoded, on_wake_state,
+            ring_seconds=float(get("recognizer_process", "ring_seconds")),
+            wake=wake,
+            restart_delay=float(get("recognizer_process", "restart_delay")),
+            max_restart_delay=float(get("recognizer_process", "max_restart_delay")),
+        )
+
+    def start(self):
+        """Spawn the child and the thread that reads its results."""
+        self._stop.clear()
+        self._spawn()
+        self._reader = threading.Thread(target=self._read_results, name="recognizer-results")
+        self._reader.daemon = True
+        self._reader.start()
+
+    def _spawn(self):
+        parent_conn, child_conn = self._ctx.Pipe()
+        process = self._ctx.Process(
+            target=_recognizer_main,
+            args=(self.ring.name, self.ring.size, self.model_path, self.grammar, self.rate, self.wake, child_conn),
+            name="recognizer",
+        )
+        process.daemon = True
+        process.start()
+        child_conn.close()
+        self.ready = False
+        self.awake = False
+        with self._pending_lock:
+            self._pending = 0
+        self._process, self._conn = process, parent_conn
+
+    def _send(self, message):
+        try:
+            with self._send_lock:
+                self._conn.send(message)
+            return True
+        except (OSError, ValueError):
+            return False  # child gone; the reader thread restarts it
+
+    def write(self, data):
+        """Capture thread: put a chunk in the ring and tell the child how far it goes."""
+        end = self.ring.write(data)
+        # Each notice covers all audio before it, so notices can be skipped while the
+        # child is loading or behind; it catches up from the ring on the next one
+        with self._pending_lock:
+            if not self.ready or self._pending >= self.max_pending:
+                return
+            self._pending += 1
+        if not self._send(("audio", end)):
+            with self._pending_lock:
+                self._pending = max(0, self._pending - 1)
+
+    def set_grammar(self, grammar):
+        """Swap the grammar in the child (also used by later restarts)."""
+        self.grammar = grammar
+        if self._process is not None and self._process.is_alive():
+            self._send(("grammar", grammar))
+
+    def set_wake_window(self, window):
+        """Change the wake-word window in the child (also used by later restarts)."""
+        if self.wake is None:
+            return
+        self.wake["window"] = window
+        if self._process is not None and self._process.is_alive():
+            self._send(("wake_window", window))
+
+    def reset(self):
+        self._send(("reset",))
+
+    def set_model(self, model_path, grammar):
+        """Restart the child on another model; audio in the meantime waits in the ring."""
+        self.model_path, self.grammar = model_path, grammar
+        self.restart()
+
+    def restart(self):
+        """Replace the child without blocking; the reader thread reaps the old one."""
+        self._send(("stop",))
+        self._retired.append((self._conn, self._process, time.monotonic()))
+        self._spawn()
+        self.restarts += 1
+
+    def _read_results(self):
+        while not self._stop.is_set():
+            if self._retired:
+                self._reap_retired()
+            conn, process = self._conn, self._process
+            try:
+                if not conn.poll(0.2):
+                    if process.is_alive() or conn is not self._conn:
+                        continue
+                    raise EOFError
+                message = conn.recv()
+            except (EOFError, OSError):
+                if not self._stop.is_set() and conn is self._conn:
+                    self._crashed(conn, process)
+                continue
+            if conn is self._conn:
+                self._handle(message)
+            elif message[0] in ("decoded", "event"):
+                self._handle(message, retired=True)  # the child was replaced while this was read
+
+    def _handle(self, message, retired=False):
+        kind = message[0]
+        if kind == "decoded":
+            _, end, dropped, seconds, result, final = message
+            if not retired:
+                with self._pending_lock:
+                    self._pending = max(0, self._pending - 1)
+            self.blocks += 1
+            self.dropped_bytes += dropped
+            self.lag = (self.ring.written - end) / (SAMPLE_WIDTH * self.rate)
+            self.max_lag = max(self.max_lag, self.lag)
+            if self.on_decoded:
+                self.on_decoded(seconds, final)
+            if result is not None:
+                self.on_result(result)
+        elif kind == "wake":
+            self.awake = message[1]
+            if self.on_wake_state:
+                self.on_wake_state(message[1])
+        elif kind == "event":
+            _, name, level, fields = message
+            self.events.event(name, level=level, **fields)
+        elif kind == "ready":
+            _, self.pid, load_ms = message
+            self.ready = True
+            self._failures = 0
+            self.events.event("recognizer_process_ready", level=QUIET, pid=self.pid, load_ms=load_ms,
+                              restarts=self.restarts, resume_lag=round(
+                                  (self.ring.written - self.ring.consumed) / (SAMPLE_WIDTH * self.rate), 2))
+
+    def _reap(self, conn, process, timeout=1.0):
+        conn.close()
+        process.join(timeout=timeout)
+        if process.is_alive():
+            process.terminate()
+            process.join(timeout=timeout)
+
+    def _drain(self, conn):
+        """Deliver what a replaced child decoded; its wake state and readiness no longer apply."""
+        try:
+            while conn.poll():
+                message = conn.recv()
+                if message[0] in ("decoded", "event"):
+                    self._handle(message, retired=True)
+        except (EOFError, OSError):
+            pass
+
+    def _reap_retired(self, grace=2.0):
+        """Collect replaced children once they exit (terminated after `grace` seconds)."""
+        for item in list(self._retired):
+            conn, process, since = item
+            alive = process.is_alive()
+            # Checked before draining, so an exited child has sent everything it will send
+            if not self._stop.is_set():
+                self._drain(conn)
+            if alive and time.monotonic() - since < grace:
+                continue
+            self._reap(conn, process, timeout=0.5)
+            self._retired.remove(item)
+
+    def _crashed(self, conn, process):
+        """The child died on its own: log it and start another after a growing delay."""
+        self._reap(conn, process)
+        self.ready = False
+        self.crashes += 1
+        delay = min(self.restart_delay * 2 ** self._failures, self.max_restart_delay)
+        self._failures += 1
+        self.events.event("recognizer_process_crashed", level=QUIET, pid=process.pid, exitcode=process.exitcode,
+                          crashes=self.crashes, restart_in=round(delay, 2))
+        if self.on_decoded:
+            self.on_decoded(0.0, True)  # the utterance in progress died with the child
+        if self._stop.wait(delay):
+            return
+        self._spawn()
+        self.restarts += 1
+
+    def stop(self, timeout=1.0):
+        """Stop the child and the reader thread and free the shared memory."""
+        self._stop.set()
+        if self._process is not None:
+            self._send(("stop",))
+            self._process.join(timeout=timeout)
+            if self._process.is_alive():
+                self._process.terminate()
+        if self._reader:
+            self._reader.join(timeout=timeout)
+        if self._conn is not None:
+            self._conn.close()
+        self._reap_retired(grace=0)
+        self.ring.close()
+        self.events.event("recognizer_process_stats", level=QUIET, **self.stats())
+
+    def stats(self):
+        """Snapshot for the API and the exit log."""
+        return {
+            "pid": self.pid, "ready": self.ready, "model": self.model_path, "restarts": self.restarts,
+            "crashes": self.crashes, "blocks": self.blocks, "dropped_bytes": self.dropped_bytes,
+            "lag": round(self.lag, 3), "max_lag": round(self.max_lag, 3),
+        }
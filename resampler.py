@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+
+# Streaming polyphase resampler for the capture path.
+# Many USB microphones only run natively at 44.1/48 kHz. Instead of letting ALSA's
+# plug layer convert, the stream is opened at the device's native rate and each
+# chunk is converted to the recognizer's 16 kHz here: a windowed-sinc low-pass
+# split into `up` polyphase branches, evaluated for a whole chunk at once with
+# NumPy into preallocated buffers. Filter state carries across chunks. Each output
+# reads a sliding-window view of the input buffer; the window starts and branch
+# numbers are recomputed for each chunk into fixed arrays, so memory does not
+# depend on how many phase offsets the stream visits.
+#
+# Benchmark:  python3 resampler.py --rate 48000 --seconds 60
+
+import math
+import time
+import argparse
+
+import numpy as np
+
+
+class PolyphaseResampler:
+    """Rational-ratio int16 mono resampler (e.g. 48000 -> 16000, 44100 -> 16000)."""
+
+    def __init__(self, in_rate, out_rate=16000, half_width=8, max_chunk=16384, beta=8.0):
+        g = math.gcd(int(in_rate), int(out_rate))
+        self.in_rate = int(in_rate)
+        self.out_rate = int(out_rate)
+        self.up = self.out_rate // g
+        self.down = self.in_rate // g
+        self.max_chunk = max_chunk
+
+        # Low-pass just under the lower Nyquist (in the upsampled domain), Kaiser-windowed
+        # sinc spanning half_width zero crossings either side at the lower rate
+        taps_per_phase = int(math.ceil(2 * half_width * max(self.up, self.down) / self.up))
+        self.taps = taps_per_phase
+        n_taps = taps_per_phase * self.up
+        cutoff = 0.5 / max(self.up, self.down) * 0.9
+        t = np.arange(n_taps) - (n_taps - 1) / 2.0
+        h = 2 * cutoff * np.sinc(2 * cutoff * t) * np.kaiser(n_taps, beta)
+        h *= self.up / h.sum()
+        # Branch p holds h[p], h[p + up], h[p + 2 up], ...
+        self.branches = np.ascontiguousarray(h.reshape(taps_per_phase, self.up).T, dtype=np.float32)
+        # The same taps oldest sample first, to match a window of the input buffer
+        self._reversed = np.ascontiguousarray(self.branches[:, ::-1])
+
+        history = taps_per_phase - 1
+        max_out = (max_chunk * self.up) // self.down + 2
+        self._history = history
+        self._input = np.zeros(history + max_chunk, dtype=np.float32)
+        # Row i is input[i:i + taps], the samples under output i's filter (a view, no copy)
+        self._windows = np.lib.stride_tricks.sliding_window_view(self._input, taps_per_phase)
+        self._gather = np.empty((max_out, taps_per_phase), dtype=np.float32)
+        self._coefficients = np.empty((max_out, taps_per_phase), dtype=np.float32)
+        self._output = np.empty(max_out, dtype=np.float32)
+        self._output16 = np.empty(max_out, dtype=np.int16)
+        # Index planning: output k sits at up-domain position first + k * down
+        self._steps = np.arange(max_out, dtype=np.intp) * self.down
+        self._positions = np.empty(max_out, dtype=np.intp)
+        self._starts = np.empty(max_out, dtype=np.intp)
+        self._phases = np.empty(max_out, dtype=np.intp)
+        self._position = 0  # up-domain position of the next output, relative to the chunk start
+
+    def reset(self):
+        """Forget filter history (e.g. after a stream restart)."""
+        self._input[:self._history] = 0.0
+        self._position = 0
+
+    def output_frames(self, in_frames):
+        """Approximate number of output frames produced for in_frames of input."""
+        return in_frames * self.up // self.down
+
+    def process(self, data):
+        """Resample one chunk of int16 bytes; returns int16 bytes at out_rate."""
+        samples = np.frombuffer(data, dtype=np.int16)
+        n = len(samples)
+        if n > self.max_chunk:
+            return b"".join(self.process(data[i:i + self.max_chunk * 2])
+                            for i in range(0, len(data), self.max_chunk * 2))
+        history = self._history
+        buffer = self._input
+        np.copyto(buffer[history:history + n], samples, casting="unsafe")
+
+        starts, phases = self._plan(n, self._position)
+        n_out = len(phases)
+        if n_out:
+            gather = self._gather[:n_out]
+            coefficients = self._coefficients[:n_out]
+            output = self._output[:n_out]
+            np.take(self._windows, starts, axis=0, out=gather)
+            np.take(self._reversed, phases, axis=0, out=coefficients)
+            np.multiply(gather, coefficients, out=gather)
+            gather.sum(axis=1, out=output)
+            np.clip(output, -32768, 32767, out=output)
+            np.rint(output, out=output)
+            out16 = self._output16[:n_out]
+            np.copyto(out16, output, casting="unsafe")
+            result = out16.tobytes()
+        else:
+            result = b""
+
+        # Carry the filter history and phase into the next chunk
+        buffer[:history] = buffer[n:n + history]
+        self._position += n_out * self.down - n * self.up
+        return result
+
+    def _plan(self, n, position):
+        """First input window and branch number of each output of a chunk, in the preallocated arrays."""
+        n_out = max(0, -(-(n * self.up - position) // self.down))
+        positions = self._positions[:n_out]
+        starts = self._starts[:n_out]
+        phases = self._phases[:n_out]
+        np.add(self._steps[:n_out], position, out=positions)
+        np.floor_divide(positions, self.up, out=starts)
+        np.remainder(positions, self.up, out=phases)
+        return starts, phases
+
+
+def benchmark(in_rate=48000, out_rate=16000, seconds=60.0, chunk=None, half_width=8):
+    """CPU seconds spent per second of audio, plus stop-band attenuation of an aliasing tone."""
+    chunk = chunk or int(4096 * in_rate / out_rate)
+    resampler = PolyphaseResampler(in_rate, out_rate, half_width=half_width, max_chunk=chunk)
+    total = int(seconds * in_rate)
+    rng = np.random.default_rng(0)
+    t = np.arange(total) / in_rate
+    # 1 kHz (kept) plus a tone above the output Nyquist (must be removed)
+    alias_freq = out_rate * 0.5 + 2000
+    signal = 8000 * np.sin(2 * np.pi * 1000 * t) + 8000 * np.sin(2 * np.pi * alias_freq * t)
+    signal += rng.normal(0, 100, total)
+    pcm = signal.astype(np.int16).tobytes()
+
+    output = []
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    for offset in range(0, len(pcm), chunk * 2):
+        output.append(resampler.process(pcm[offset:offset + chunk * 2]))
+    cpu = time.process_time() - cpu_start
+    wall = time.perf_counter() - wall_start
+
+    y = np.frombuffer(b"".join(output), dtype=np.int16).astype(np.float64)
+    spectrum = np.abs(np.fft.rfft(y * np.hanning(len(y))))
+    freqs = np.fft.rfftfreq(len(y), 1.0 / out_rate)
+    kept = spectrum[np.argmin(np.abs(freqs - 1000))]
+    aliased = spectrum[np.argmin(np.abs(freqs - (out_rate - alias_freq)))]
+    return {
+        "in_rate": in_rate,
+        "out_rate": out_rate,
+        "chunk_frames": chunk,
+        "taps_per_phase": resampler.taps,
+        "audio_seconds": seconds,
+        "cpu_seconds": cpu,
+        "cpu_ms_per_audio_second": 1000 * cpu / seconds,
+        "realtime_factor": seconds / wall if wall else float("inf"),
+        "output_frames": len(y),
+        "alias_rejection_db": 20 * math.log10(kept / max(aliased, 1e-9)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the capture resampler")
+    parser.add_argument("--rate", type=int, default=48000, help="input (device) sample rate")
+    parser.add_argument("--out-rate", type=int, default=16000)
+    parser.add_argument("--seconds", type=float, default=60.0, help="seconds of audio to process")
+    parser.add_argument("--half-width", type=int, default=8, help="filter zero crossings on each side")
+    args = parser.parse_args()
+
+    report = benchmark(args.rate, args.out_rate, args.seconds, half_width=args.half_width)
+    for key, value in report.items():
+        print(f"{key:<26}{value:.3f}" if isinstance(value, float) else f"{key:<26}{value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+
+# Simulated drop-in for RPi_Robot_Hat_Lib.RobotController.
+# Each call pays a configurable bus latency (I2C/serial round trip with jitter),
+# motors approach their target velocity with a first-order lag, and a 2-D pose
+# (x, y, heading) of a mecanum base is integrated over time. Every call is
+# recorded in a timestamped trace, so the command pipeline can be load-tested
+# and checked for ordering on a machine with no robot attached.
+#
+# Load test:  python3 simulated_robot.py --commands 2000 --rate 500
+
+import os
+import sys
+import json
+import math
+import time
+import random
+import tempfile
+import argparse
+import threading
+from collections import deque
+
+from event_log import EventLog, get_event_log, set_event_log, QUIET
+
+DEFAULT_SIMULATOR = {
+    "bus_latency": 0.002,
+    "latency_jitter": 0.001,
+    "motor_time_constant": 0.15,
+    "max_speed": 0.5,
+    "max_turn_rate": 2.0,
+    "trace_limit": 100000,
+}
+
+
+class SimulatedRobotController:
+    """Implements the RobotController motor interface against a simulated base."""
+
+    def __init__(self, bus_latency=0.002, latency_jitter=0.001, motor_time_constant=0.15,
+                 max_speed=0.5, max_turn_rate=2.0, trace_limit=100000, seed=None):
+        self.bus_latency = bus_latency
+        self.latency_jitter = latency_jitter
+        self.motor_time_constant = motor_time_constant
+        self.max_speed = max_speed          # m/s at speed 100
+        self.max_turn_rate = max_turn_rate  # rad/s at speed 100
+        self.trace = deque(maxlen=trace_limit)
+        self.call_count = 0
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._bus = threading.Lock()  # one transaction on the bus at a time
+        self._target = (0.0, 0.0, 0.0)    # (forward m/s, left m/s, yaw rad/s) in the body frame
+        self._velocity = (0.0, 0.0, 0.0)
+        self._pose = [0.0, 0.0, 0.0]      # x, y, heading
+        self._updated = time.monotonic()
+
+    @classmethod
+    def from_calibration(cls, calibration_manager):
+        """Build from the "simulator" calibration category."""
+        get = calibration_manager.get_setting
+        return cls(**{key: type(default)(get("simulator", key)) for key, default in DEFAULT_SIMULATOR.items()})
+
+    # RobotController interface
+    def Forward(self, speed):
+        self._command("Forward", speed, (1.0, 0.0, 0.0))
+
+    def Backward(self, speed):
+        self._command("Backward", speed, (-1.0, 0.0, 0.0))
+
+    def turn_left(self, speed):
+        self._command("turn_left", speed, (0.0, 0.0, 1.0))
+
+    def turn_right(self, speed):
+        self._command("turn_right", speed, (0.0, 0.0, -1.0))
+
+    def Horizontal_Left(self, speed):
+        self._command("Horizontal_Left", speed, (0.0, 1.0, 0.0))
+
+    def Horizontal_Right(self, speed):
+        self._command("Horizontal_Right", speed, (0.0, -1.0, 0.0))
+
+    def stop(self):
+        self._command("stop", 0, (0.0, 0.0, 0.0))
+
+    def pose(self):
+        """Current (x, y, heading) after integrating up to now."""
+        with self._lock:
+            self._integrate(time.monotonic())
+            return tuple(self._pose)
+
+    def dump_trace(self, path):
+        """Write the command trace as JSON lines."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w") as f:
+            for record in list(self.trace):
+                f.write(json.dumps(record) + "\n")
+
+    def _command(self, name, speed, direction):
+        requested = time.monotonic()
+        with self._bus:
+            latency = max(0.0, self.bus_latency + self._random.uniform(-1, 1) * self.latency_jitter)
+            if latency:
+                time.sleep(latency)
+            applied = time.monotonic()
+            scale = max(0.0, min(float(speed), 100.0)) / 100.0
+            with self._lock:
+                self._integrate(applied)
+                self._target = (
+                    direction[0] * scale * self.max_speed,
+                    direction[1] * scale * self.max_speed,
+                    direction[2] * scale * self.max_turn_rate,
+                )
+                self.call_count += 1
+                self.trace.append({
+                    "seq": self.call_count,
+                    "t": requested,
+                    "applied": applied,
+                    "method": name,
+                    "speed": speed,
+                    "thread": threading.current_thread().name,
+                    "pose": [round(v, 4) for v in self._pose],
+                })
+
+    def _integrate(self, now, step=0.01):
+        """Advance velocity (first-order lag) and pose from the last update to now."""
+        remaining = now - self._updated
+        self._updated = now
+        tau = self.motor_time_constant
+        while remaining > 0:
+            dt = min(step, remaining)
+            remaining -= dt
+            alpha = 1.0 - math.exp(-dt / tau) if tau > 0 else 1.0
+            self._velocity = tuple(v + (t - v) * alpha for v, t in zip(self._velocity, self._target))
+            forward, left, yaw = self._velocity
+            if forward == left == yaw == 0.0:
+                continue
+            heading = self._pose[2]
+            self._pose[0] += (forward * math.cos(heading) - left * math.sin(heading)) * dt
+            self._pose[1] += (forward * math.sin(heading) + left * math.cos(heading)) * dt
+            self._pose[2] = (heading + yaw * dt + math.pi) % (2 * math.pi) - math.pi
+
+
+def _load_rc_script():
+    """Load MovementController and CalibrationManager from the RC script."""
+    import runpy
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "vosk-controll(RC).py")
+    return runpy.run_path(script)
+
+
+def run_load_test(commands=2000, rate=500.0, movement_duration=0.002, seed=1):
+    """Drive dispatcher -> motion queue -> MovementController -> simulator at a fixed rate."""
+    from dispatcher import CommandDispatcher, MotionQueue
+    from command_vocabulary import CommandVocabulary
+
+    namespace = _load_rc_script()
+    # A calibration file that does not exist yet, so the defaults are used
+    calibration = namespace["CalibrationManager"](
+        config_file=os.path.join(tempfile.mkdtemp(), "robot_calibration.json")
+    )
+    calibration.set_setting("movement_duration", "default_duration", movement_duration)
+    calibration.set_setting("movement_duration", "turn_duration", movement_duration)
+
+    simulator = SimulatedRobotController(seed=seed)
+    controller = namespace["MovementController"](calibration, backend=simulator)
+    keywords = CommandVocabulary.load().keywords
+    motion = MotionQueue(controller, maxsize=64)
+    dispatcher = CommandDispatcher(keywords, motion)
+
+    movement_methods = {
+        "forward": "Forward", "backward": "Backward", "left": "turn_left", "right": "turn_right",
+        "horizontal_left": "Horizontal_Left", "horizontal_right": "Horizontal_Right",
+    }
+    phrases = [p for command in movement_methods for p in keywords[command]]
+    rng = random.Random(seed)
+    submitted = []  # (time, method) of accepted movements
+    interval = 1.0 / rate
+    started = time.monotonic()
+    for i in range(commands):
+        phrase = rng.choice(phrases)
+        rejected_before = motion.rejected
+        dispatched_at = time.monotonic()
+        command = dispatcher.dispatch(phrase, source="load_test")
+        if motion.rejected == rejected_before:
+            submitted.append((dispatched_at, movement_methods[command]))
+        delay = started + (i + 1) * interval - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+    send_time = time.monotonic() - started
+
+    motion.wait_idle()
+    motion.close()
+
+    # Movements must reach the motors in the order they were accepted
+    executed = [r for r in simulator.trace if r["method"] != "stop"]
+    latencies = []
+    position = 0
+    in_order = True
+    for record in executed:
+        while position < len(submitted) and submitted[position][1] != record["method"]:
+            position += 1
+        if position == len(submitted):
+            in_order = False
+            break
+        latencies.append(record["t"] - submitted[position][0])
+        position += 1
+    latencies.sort()
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))] if latencies else 0.0
+
+    return {
+        "commands": commands,
+        "target_rate": rate,
+        "achieved_rate": commands / send_time if send_time else 0.0,
+        "rejected": motion.rejected,
+        "executed": len(executed),
+        "bus_calls": simulator.call_count,
+        "in_order": in_order,
+        "dispatch_to_motor_p50": percentile(0.50),
+        "dispatch_to_motor_p99": percentile(0.99),
+        "pose": simulator.pose(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the command pipeline against the simulated robot")
+    parser.add_argument("--commands", type=int, default=2000, help="number of phrases to dispatch")
+    parser.add_argument("--rate", type=float, default=500.0, help="phrases per second")
+    parser.add_argument("--duration", type=float, default=0.002, help="movement duration used for every command")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    # Keep thousands of per-command events off the console
+    set_event_log(EventLog(echo=False))
+    report = run_load_test(args.commands, args.rate, args.duration, args.seed)
+    get_event_log().event("load_test", level=QUIET, **report)
+    get_event_log().close()
+    print(json.dumps(report, indent=2))
+    sys.exit(0 if report["in_order"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+
+# Soak test: hours of looped speech through the application's recognition path:
+# the capture -> decode -> match -> dispatch pipeline (pipeline.py) with the
+# resampler, pre-processing, noise floor/gate and the [unk] grammar built by
+# GrammarBuilder, then the motion queue -> MovementController -> simulated robot.
+# A corpus of recorded utterances (WAV, or FLAC with soundfile installed) is
+# replayed in a loop at real-time pace, at the capture rate, each utterance
+# followed by a second of silence so the recognizer finalizes it. Settings come
+# from a calibration file (--calibration) or the defaults, exactly as in the
+# application. Every sample interval the process RSS, thread count,
+# result latency (end of utterance audio -> final result), per-chunk decode time
+# and accuracy (over clips whose JSON sidecar has a "label") are appended to a
+# JSONL file. At the end the run is checked for drift: RSS growing faster than a
+# threshold, threads accumulating, or decode time / latency getting slower than at
+# the start. The recognizer maintenance policy (reset / rebuild) is the same one
+# the application uses.
+#
+# Usage:  python3 soak_test.py --corpus utterances --hours 8
+
+import os
+import sys
+import json
+import time
+import wave
+import argparse
+import tempfile
+import threading
+import importlib.util
+
+from event_log import EventLog, set_event_log, get_event_log, QUIET
+from recognizer_policy import RecognizerPolicy, rss_bytes, native_thread_count
+from grammar_builder import GrammarBuilder, strip_garbage
+
+RATE = 16000
+CHUNK_FRAMES = 4096
+TRAILING_SILENCE = 1.0
+
+
+def _label_for(path):
+    """Expected text from the JSON sidecar's "label" (or "expected") field; None if unlabeled.
+
+    The sidecar's "text" is what the recognizer heard, not what was said, so it is
+    never used as the label; an empty label marks a clip with no command in it.
+    """
+    sidecar = os.path.splitext(path)[0] + ".json"
+    try:
+        with open(sidecar) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    label = meta.get("label", meta.get("expected"))
+    return " ".join(label.lower().split()) if isinstance(label, str) else None
+
+
+def read_audio(path):
+    """Mono int16 16 kHz bytes from a WAV or FLAC file."""
+    if path.endswith(".flac"):
+        import soundfile
+        samples, rate = soundfile.read(path, dtype="int16", always_2d=True)
+        channels, data = samples.shape[1], samples.tobytes()
+    else:
+        with wave.open(path, "rb") as w:
+            if w.getsampwidth() != 2:
+                raise ValueError(f"{path}: only 16-bit audio is supported")
+            rate, channels, data = w.getframerate(), w.getnchannels(), w.readframes(w.getnframes())
+    if channels > 1 or rate != RATE:
+        import numpy as np
+        samples = np.frombuffer(data, dtype=np.int16)[::channels]
+        data = samples.tobytes()
+        if rate != RATE:
+            from resampler import PolyphaseResampler
+            data = PolyphaseResampler(rate, RATE, max_chunk=len(samples)).process(data)
+    return data
+
+
+def list_corpus(directory):
+    """[(path, expected text or None)] for every audio file under directory."""
+    extensions = (".wav", ".flac") if importlib.util.find_spec("soundfile") else (".wav",)
+    corpus = []
+    for root, _, files in os.walk(directory):
+        for name in sorted(files):
+            if name.lower().endswith(extensions):
+                path = os.path.join(root, name)
+                corpus.append((path, _label_for(path)))
+    return corpus
+
+
+def load_corpus(directory):
+    """[(path, expected text, audio bytes)] for every audio file under directory."""
+    return [(path, label, read_audio(path)) for path, label in list_corpus(directory)]
+
+
+def _percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))]
+
+
+def _slope_per_hour(points):
+    """Least-squares slope of (seconds, value) points, in value units per hour."""
+    if len(points) < 3:
+        return 0.0
+    n = len(points)
+    mean_t = sum(t for t, _ in points) / n
+    mean_v = sum(v for _, v in points) / n
+    var = sum((t - mean_t) ** 2 for t, _ in points)
+    if not var:
+        return 0.0
+    return 3600 * sum((t - mean_t) * (v - mean_v) for t, v in points) / var
+
+
+class SoakRun:
+    """Replays the corpus through the recognition pipeline and samples resource usage and timing."""
+
+    def __init__(self, corpus, model_path, policy, speed=1.0, sample_interval=60.0, output=None, seed=1,
+                 calibration_file=None):
+        from simulated_robot import SimulatedRobotController, _load_rc_script
+        from dispatcher import CommandDispatcher, MotionQueue
+        from command_vocabulary import CommandVocabulary
+        from noise_floor import NoiseFloorEstimator
+        from pipeline import Pipeline, Stage
+
+        self.speed = speed
+        self.sample_interval = sample_interval
+        self.output = output
+        self.policy = policy
+        self.events = get_event_log()
+
+        namespace = _load_rc_script()
+        # The robot's calibration file, or one that does not exist yet so the defaults are used
+        calibration = namespace["CalibrationManager"](
+            config_file=calibration_file or os.path.join(tempfile.mkdtemp(), "robot_calibration.json")
+        )
+        get = calibration.get_setting
+        # Short movements so the motion queue keeps up with back-to-back commands
+        calibration.set_setting("movement_duration", "default_duration", 0.05)
+        calibration.set_setting("movement_duration", "turn_duration", 0.05)
+        self.simulator = SimulatedRobotController(seed=seed, trace_limit=10000)
+        controller = namespace["MovementController"](calibration, backend=self.simulator)
+        vocabulary = CommandVocabulary.load()
+        self.motion = MotionQueue(controller, maxsize=64)
+        self.dispatcher = CommandDispatcher(vocabulary.keywords, self.motion, vocabulary.index)
+
+        # The same front end as the application: native-rate audio resampled to 16 kHz,
+        # optional pre-processing, the noise floor and gate, and the checked [unk] grammar
+        self.capture_rate = int(get("audio", "capture_rate")) or RATE
+        self.resampler = None
+        if self.capture_rate != RATE:
+            from resampler import PolyphaseResampler
+            self.resampler = PolyphaseResampler(self.capture_rate, RATE,
+                                                half_width=int(get("audio", "resample_half_width")))
+        self.preprocessor = None
+        if get("preprocess", "enabled"):
+            from audio_preprocess import AudioPreprocessor
+            self.preprocessor = AudioPreprocessor.from_calibration(calibration)
+            self.motion.listeners.append(self.preprocessor.on_motion_state)
+        self.noise_floor = NoiseFloorEstimator.from_calibration(calibration)
+        self.grammar_builder = GrammarBuilder.from_calibration(calibration, model_path)
+        self.grammar = self.grammar_builder.build(vocabulary.phrases)
+        self.corpus = [(path, label, self._to_capture_rate(audio)) for path, label, audio in corpus]
+
+        import vosk
+        self.model = vosk.Model(model_path)
+        self.recognizer = self._build_recognizer()
+
+        queue_size = int(get("pipeline", "queue_size"))
+        self.pipeline = Pipeline([
+            Stage("capture", self._capture_stage, blocking=True),
+            Stage("decode", self._decode_stage, blocking=True, queue_size=queue_size),
+            Stage("match", self._match_stage, queue_size=queue_size),
+            Stage("dispatch", self._dispatch_stage, queue_size=queue_size),
+        ], name="soak")
+
+        self.samples = []
+        self._window = {"latency": [], "decode": [], "results": 0, "correct": 0, "labelled": 0}
+        self._lock = threading.Lock()
+        self._started = None
+        self._chunks = None
+
+    def _build_recognizer(self):
+        import vosk
+        recognizer = vosk.KaldiRecognizer(self.model, RATE, self.grammar)
+        recognizer.SetWords(True)
+        return recognizer
+
+    def _to_capture_rate(self, audio):
+        """16 kHz corpus audio as the microphone would deliver it."""
+        if self.capture_rate == RATE:
+            return audio
+        from resampler import PolyphaseResampler
+        return PolyphaseResampler(RATE, self.capture_rate, max_chunk=len(audio) // 2 or 1).process(audio)
+
+    def _stream(self):
+        """Endless (chunk, expected text, end-of-utterance time) at the capture rate, paced like a microphone."""
+        chunk_frames = CHUNK_FRAMES * self.capture_rate // RATE
+        chunk_bytes = chunk_frames * 2
+        chunk_time = chunk_frames / self.capture_rate / self.speed if self.speed > 0 else 0.0
+        silence = bytes(int(TRAILING_SILENCE * self.capture_rate) * 2)
+        clock = time.monotonic()
+        while True:
+            for path, label, audio in self.corpus:
+                utterance_end = None
+                stream = audio + silence
+                for offset in range(0, len(stream), chunk_bytes):
+                    if chunk_time:
+                        clock += chunk_time
+                        delay = clock - time.monotonic()
+                        if delay > 0:
+                            time.sleep(delay)
+                        else:
+                            clock = time.monotonic()
+                    if offset + chunk_bytes >= len(audio) and utterance_end is None:
+                        utterance_end = time.monotonic()
+                    yield stream[offset:offset + chunk_bytes], label, utterance_end
+
+    def run(self, hours):
+        """Loop the corpus until `hours` have passed."""
+        self._started = time.monotonic()
+        deadline = self._started + hours * 3600
+        next_sample = self._started + self.sample_interval
+        self._sample()  # baseline
+        self._chunks = self._stream()
+        self.policy.rebaseline()  # the model and corpus were loaded after the policy was built
+        self.pipeline.start()
+        while self.pipeline.running:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            time.sleep(max(0.0, min(deadline, next_sample, now + 0.5) - now))
+            if time.monotonic() >= next_sample:
+                next_sample += self.sample_interval
+                self._sample()
+        self.pipeline.stop()
+        if self.pipeline.error is not None:
+            raise self.pipeline.error
+        self._sample()
+        self.motion.wait_idle()
+        self.motion.close()
+
+    def _capture_stage(self):
+        """Next corpus chunk, resampled to 16 kHz as the application's capture stage does."""
+        chunk, label, utterance_end = next(self._chunks)
+        if self.resampler:
+            chunk = self.resampler.process(chunk)
+        return chunk, label, utterance_end
+
+    def _decode_stage(self, item):
+        """Pre-process, gate and decode one chunk; a final result goes on with its label."""
+        data, label, utterance_end = item
+        if self.preprocessor:
+            data = self.preprocessor.process(data)
+        data = self.noise_floor.gate(data)
+        started = time.perf_counter()
+        final = self.recognizer.AcceptWaveform(data)
+        decode = time.perf_counter() - started
+        with self._lock:
+            self._window["decode"].append(decode)
+        if not final:
+            return None
+        result = json.loads(self.recognizer.Result())
+        self.recognizer = self.policy.apply(self.recognizer, self._build_recognizer)
+        return result, label, utterance_end
+
+    def _match_stage(self, item):
+        result, label, utterance_end = item
+        text = strip_garbage(result.get("text", "").lower())
+        return text, self.dispatcher.match(text) if text else None, label, utterance_end
+
+    def _dispatch_stage(self, item):
+        text, command, label, utterance_end = item
+        if text:
+            self.dispatcher.dispatch_matched(text, command, source="soak")
+        with self._lock:
+            self._window["results"] += 1
+            if utterance_end is not None:
+                self._window["latency"].append(time.monotonic() - utterance_end)
+            if label:  # unlabeled clips only add load
+                self._window["labelled"] += 1
+                self._window["correct"] += text == label
+
+    def _sample(self):
+        with self._lock:
+            window = self._window
+            self._window = {"latency": [], "decode": [], "results": 0, "correct": 0, "labelled": 0}
+        sample = {
+            "elapsed": round(time.monotonic() - self._started, 1),
+            "rss_mb": round(rss_bytes() / 1048576, 2),
+            "threads": native_thread_count(),
+            "python_threads": threading.active_count(),
+            "results": window["results"],
+            "accuracy": round(window["correct"] / window["labelled"], 3) if window["labelled"] else None,
+            "latency_p50": _percentile(window["latency"], 0.50),
+            "latency_p95": _percentile(window["latency"], 0.95),
+            "decode_ms_p50": _ms(_percentile(window["decode"], 0.50)),
+            "decode_ms_p95": _ms(_percentile(window["decode"], 0.95)),
+            "motion_rejected": self.motion.rejected,
+            "gated": self.noise_floor.gated,
+            "resets": self.policy.resets,
+            "rebuilds": self.policy.rebuilds,
+        }
+        self.samples.append(sample)
+        if self.output:
+            with open(self.output, "a") as f:
+                f.write(json.dumps(sample) + "\n")
+        self.events.event("soak_sample", level=QUIET, **sample)
+        print(f"[{sample['elapsed']:>8.0f}s] rss={sample['rss_mb']}MB threads={sample['threads']} "
+              f"results={sample['results']} latency_p95={sample['latency_p95']} "
+              f"decode_ms_p95={sample['decode_ms_p95']}")
+
+    def report(self, rss_mb_per_hour=5.0, slowdown=1.25, warmup=0.1):
+        """Compare the start of the run (after warmup) with its end and flag drift."""
+        samples = [s for s in self.samples if s["elapsed"] > 0]
+        skip = int(len(samples) * warmup)
+        steady = samples[skip:] or samples
+        third = max(1, len(steady) // 3)
+        early, late = steady[:third], steady[-third:]
+
+        def mean(rows, key):
+            values = [r[key] for r in rows if r[key] is not None]
+            return sum(values) / len(values) if values else None
+
+        flags = []
+        rss_slope = _slope_per_hour([(s["elapsed"], s["rss_mb"]) for s in steady])
+        if rss_slope > rss_mb_per_hour:
+            flags.append(f"rss growing {rss_slope:.1f} MB/h")
+        if steady and steady[-1]["threads"] > steady[0]["threads"]:
+            flags.append(f"threads {steady[0]['threads']} -> {steady[-1]['threads']}")
+        for key in ("decode_ms_p50", "latency_p95"):
+            before, after = mean(early, key), mean(late, key)
+            if before and after and after > before * slowdown:
+                flags.append(f"{key} {before:.4f} -> {after:.4f}")
+        return {
+            "duration_hours": round(samples[-1]["elapsed"] / 3600, 3) if samples else 0.0,
+            "samples": len(self.samples),
+            "rss_start_mb": steady[0]["rss_mb"] if steady else None,
+            "rss_end_mb": steady[-1]["rss_mb"] if steady else None,
+            "rss_slope_mb_per_hour": round(rss_slope, 3),
+            "results": sum(s["results"] for s in self.samples),
+            "accuracy": mean(steady, "accuracy"),
+            "resets": self.policy.resets,
+            "rebuilds": self.policy.rebuilds,
+            "drift": flags,
+        }
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3) if seconds is not None else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Soak-test the recognition pipeline against the simulated robot")
+    parser.add_argument("--corpus", required=True, help="directory of WAV/FLAC utterances")
+    parser.add_argument("--hours", type=float, default=1.0)
+    parser.add_argument("--model", default="model/vosk-model-small-en-us-0.15")
+    parser.add_argument("--calibration", default=None,
+                        help="robot_calibration.json to take audio/grammar settings from (default: built-in defaults)")
+    parser.add_argument("--speed", type=float, default=1.0, help="playback speed (0 = as fast as possible)")
+    parser.add_argument("--sample-interval", type=float, default=60.0, help="seconds between samples")
+    parser.add_argument("--output", default=None, help="JSONL sample file (default logs/soak_<time>.jsonl)")
+    parser.add_argument("--reset-after", type=float, default=0.0, help="Reset() the recognizer every N seconds")
+    parser.add_argument("--rebuild-after", type=float, default=0.0, help="rebuild the recognizer every N seconds")
+    parser.add_argument("--rss-growth-mb", type=float, default=0.0, help="rebuild when RSS grows this much")
+    parser.add_argument("--rss-drift", type=float, default=5.0, help="flag RSS growth above this many MB/hour")
+    parser.add_argument("--slowdown", type=float, default=1.25, help="flag decode/latency slower by this factor")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    if not corpus:
+        sys.exit(f"No audio files found in {args.corpus}")
+    output = args.output or os.path.join("logs", time.strftime("soak_%Y%m%d_%H%M%S.jsonl"))
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    set_event_log(EventLog(echo=False))
+
+    policy = RecognizerPolicy(args.reset_after, args.rebuild_after, args.rss_growth_mb)
+    run = SoakRun(corpus, args.model, policy, speed=args.speed,
+                  sample_interval=args.sample_interval, output=output, calibration_file=args.calibration)
+    labelled = sum(label is not None for _, label, _ in corpus)
+    print(f"Soaking {len(corpus)} utterances ({labelled} labeled) for {args.hours} h; samples -> {output}")
+    run.run(args.hours)
+    report = run.report(args.rss_drift, args.slowdown)
+    get_event_log().event("soak_report", level=QUIET, **report)
+    get_event_log().close()
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if report["drift"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+
+# Startup timing for the voice controller.
+# Import this module first so PROCESS_START is taken before any other import.
+# Phases (imports, model load, audio open, hardware init, ...) and milestones
+# ("ui_shown", "ready", "listening") are measured from PROCESS_START. With
+# --startup-profile a breakdown is printed and appended to a JSONL history so
+# cold-start time can be tracked across releases and units.
+
+import time
+
+PROCESS_START = time.perf_counter()
+
+import os
+import json
+import threading
+from contextlib import contextmanager
+
+from event_log import get_event_log, QUIET
+
+
+class StartupProfiler:
+    """Records how long each startup phase takes and when milestones are reached."""
+
+    def __init__(self, enabled=False, history_path="logs/startup_history.jsonl"):
+        self.enabled = enabled
+        self.history_path = history_path
+        self.phases = []       # (name, start offset, duration, thread name)
+        self.milestones = {}   # name -> offset from process start
+        self._lock = threading.Lock()
+        self._reported = False
+
+    def _now(self):
+        return time.perf_counter() - PROCESS_START
+
+    @contextmanager
+    def phase(self, name):
+        """Time a block of startup work."""
+        start = self._now()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.phases.append((name, start, self._now() - start, threading.current_thread().name))
+
+    def mark(self, name):
+        """Record a milestone (first occurrence wins)."""
+        with self._lock:
+            self.milestones.setdefault(name, self._now())
+
+    def report(self):
+        """Log the startup summary; with profiling enabled, print it and append to the history."""
+        if self._reported:
+            return
+        self._reported = True
+        record = {
+            "wall": time.time(),
+            "phases": {name: round(duration, 4) for name, _, duration, _ in self.phases},
+            "milestones": {name: round(offset, 4) for name, offset in self.milestones.items()},
+        }
+        get_event_log().event("startup", level=QUIET, **record)
+        if not self.enabled:
+            return
+
+        previous = self._load_history()
+        print("\n" + "=" * 60)
+        print("STARTUP PROFILE".center(60))
+        print("=" * 60)
+        print(f"{'phase':<22}{'start (s)':>10}{'duration (s)':>14}  thread")
+        for name, start, duration, thread in sorted(self.phases, key=lambda p: p[1]):
+            print(f"{name:<22}{start:>10.3f}{duration:>14.3f}  {thread}")
+        print("-" * 60)
+        for name, offset in sorted(self.milestones.items(), key=lambda m: m[1]):
+            line = f"{name:<22}{offset:>10.3f}"
+            history = sorted(r["milestones"][name] for r in previous if name in r.get("milestones", {}))
+            if history:
+                median = history[len(history) // 2]
+                line += f"   (median of last {len(history)}: {median:.3f}, {offset - median:+.3f})"
+            print(line)
+        print("=" * 60 + "\n")
+        self._append_history(record)
+
+    def _load_history(self, limit=20):
+        if not os.path.exists(self.history_path):
+            return []
+        try:
+            with open(self.history_path) as f:
+                return [json.loads(line) for line in f.readlines()[-limit:] if line.strip()]
+        except (OSError, ValueError):
+            return []
+
+    def _append_history(self, record):
+        directory = os.path.dirname(self.history_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.history_path, "a") as f:
+            f.write(json.dumps(record) + "\n")
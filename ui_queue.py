@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+
+# Thread-safe, throttled GUI updates.
+# Worker threads never touch Tk widgets. They post (key, callback, args) to a
+# UIUpdateQueue, which keeps only the latest update per key (one key per widget).
+# The Tk main loop drains it at a fixed frame rate, so a burst of results, level
+# meter samples or metrics costs at most one redraw per widget per frame.
+
+import threading
+import time
+
+
+class UIUpdateQueue:
+    """Latest-value-per-widget update buffer drained by the Tk main loop."""
+
+    def __init__(self, master, fps=20):
+        self.master = master
+        self.interval_ms = max(1, int(1000 / fps))
+        self.posted = 0
+        self.applied = 0
+        self.frames = 0
+        self.max_frame_time = 0.0
+
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._running = False
+
+    def start(self):
+        """Begin draining on the Tk thread."""
+        if not self._running:
+            self._running = True
+            self.master.after(self.interval_ms, self._drain)
+
+    def stop(self):
+        self._running = False
+
+    def post(self, key, callback, *args, **kwargs):
+        """Schedule callback(*args, **kwargs) on the Tk thread; replaces any pending update for key."""
+        with self._lock:
+            self._pending[key] = (callback, args, kwargs)
+            self.posted += 1
+
+    def stats(self):
+        """Counters for metrics: how many updates were posted vs. actually applied."""
+        return {
+            "posted": self.posted,
+            "applied": self.applied,
+            "coalesced": self.posted - self.applied - len(self._pending),
+            "frames": self.frames,
+            "max_frame_time": self.max_frame_time,
+        }
+
+    def _drain(self):
+        if not self._running:
+            return
+        # Reschedule first so a failing callback cannot stop the refresh loop
+        self.master.after(self.interval_ms, self._drain)
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if pending:
+            started = time.perf_counter()
+            for callback, args, kwargs in pending.values():
+                callback(*args, **kwargs)
+            self.applied += len(pending)
+            self.frames += 1
+            self.max_frame_time = max(self.max_frame_time, time.perf_counter() - started)
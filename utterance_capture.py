@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+
+# Always-on pre-roll capture of recognized utterances.
+# Every chunk read by the capture stage is copied into a fixed-size in-memory ring buffer.
+# feed() returns the ring offset at the end of the chunk; the chunk carries it
+# through decoding, so a final result is cut at the audio that produced it even
+# though the capture stage has read further ahead by the time it is dispatched.
+# The audio since the previous final result (plus a little pre-roll) is
+# snapshotted and handed to a background writer thread, which
+# saves it as FLAC (if the soundfile package is installed) or WAV next to a JSON
+# sidecar with the recognized text and timing. A disk quota evicts the oldest
+# recordings. The audio thread only ever does an in-memory copy.
+
+import os
+import json
+import time
+import wave
+import queue
+import threading
+import importlib.util
+from collections import deque
+
+from event_log import get_event_log, QUIET
+
+SAMPLE_WIDTH = 2  # paInt16
+
+
+class AudioRingBuffer:
+    """Fixed-size byte ring holding the most recent mono int16 audio (written and read from different threads)."""
+
+    def __init__(self, seconds, rate=16000):
+        self.size = int(seconds * rate) * SAMPLE_WIDTH
+        self._buffer = bytearray(self.size)
+        self._pos = 0
+        self._lock = threading.Lock()
+        self.total = 0  # bytes written since creation
+
+    def write(self, data):
+        """Append audio, overwriting the oldest bytes. Returns the absolute offset after it."""
+        n = len(data)
+        with self._lock:
+            if n >= self.size:
+                self._buffer[:] = data[-self.size:]
+                self._pos = 0
+            else:
+                end = self._pos + n
+                if end <= self.size:
+                    self._buffer[self._pos:end] = data
+                else:
+                    first = self.size - self._pos
+                    self._buffer[self._pos:] = data[:first]
+                    self._buffer[:n - first] = data[first:]
+                self._pos = end % self.size
+            self.total += n
+            return self.total
+
+    def since(self, offset, end=None):
+        """Return the audio between absolute byte offsets offset and end (default: the newest
+        byte), as far back as the ring reaches."""
+        with self._lock:
+            end = self.total if end is None else min(end, self.total)
+            start = max(offset, 0, self.total - self.size)
+            nbytes = end - start
+            if nbytes <= 0:
+                return b""
+            first = (self._pos - (self.total - start)) % self.size
+            if first + nbytes <= self.size:
+                return bytes(self._buffer[first:first + nbytes])
+            return bytes(self._buffer[first:]) + bytes(self._buffer[:nbytes - (self.size - first)])
+
+
+class UtteranceRecorder:
+    """Snapshots utterances from the ring buffer and writes them on a background thread."""
+
+    def __init__(self, output_dir="utterances", rate=16000, ring_seconds=10.0, pre_roll=0.5,
+                 save="misses", confidence_threshold=0.7, quota_mb=200, file_format="flac"):
+        self.output_dir = output_dir
+        self.rate = rate
+        self.pre_roll_bytes = int(pre_roll * rate) * SAMPLE_WIDTH
+        self.save = save
+        self.confidence_threshold = confidence_threshold
+        self.quota_bytes = int(quota_mb * 1024 * 1024)
+        # soundfile (and numpy behind it) is only imported by the writer thread
+        has_soundfile = importlib.util.find_spec("soundfile") is not None
+        self.file_format = "flac" if file_format == "flac" and has_soundfile else "wav"
+        self.events = get_event_log()
+        self.ring = AudioRingBuffer(ring_seconds, rate)
+        self.dropped = 0
+
+        self._segment_start = 0
+        self._segment_started_at = time.monotonic()
+        self._sequence = 0
+        self._files = deque()  # (path, bytes) oldest first
+        self._disk_usage = 0
+        self._queue = queue.Queue(maxsize=32)
+        self._writer = threading.Thread(target=self._run, name="utterance-writer")
+        self._writer.daemon = True
+        self._writer.start()
+
+    @classmethod
+    def from_calibration(cls, calibration_manager, rate=16000):
+        """Build from the "utterance_capture" calibration category."""
+        get = calibration_manager.get_setting
+        return cls(
+            output_dir=get("utterance_capture", "output_dir"),
+            rate=rate,
+            ring_seconds=float(get("utterance_capture", "ring_seconds")),
+            pre_roll=float(get("utterance_capture", "pre_roll")),
+            save=get("utterance_capture", "save"),
+            confidence_threshold=float(get("voice_recognition", "confidence_threshold")),
+            quota_mb=float(get("utterance_capture", "quota_mb")),
+            file_format=get("utterance_capture", "format"),
+        )
+
+    def feed(self, data):
+        """Copy a chunk of captured audio into the ring (called from the audio thread).
+        Returns the ring offset at the end of the chunk."""
+        return self.ring.write(data)
+
+    def utterance_end(self, text, command=None, confidence=None, end=None):
+        """Mark the end of an utterance and queue it for saving if the policy says so.
+
+        end is the ring offset returned by feed() for the chunk that completed the
+        result; without it the utterance is cut at the newest audio.
+        """
+        now = time.monotonic()
+        if end is None:
+            end = self.ring.total
+        start_offset = self._segment_start
+        started_at = self._segment_started_at
+        self._segment_start = end
+        self._segment_started_at = now
+        if not text or not self._should_save(command, confidence):
+            return
+        audio = self.ring.since(start_offset - self.pre_roll_bytes, end)
+        meta = {
+            "label": None,  # what was actually said, filled in by hand for soak_test / keyword_eval
+            "text": text,
+            "command": command,
+            "confidence": confidence,
+            "segment_start": started_at,
+            "segment_end": now,
+            "duration": len(audio) / (self.rate * SAMPLE_WIDTH),
+            "pre_roll": self.pre_roll_bytes / (self.rate * SAMPLE_WIDTH),
+            "wall": time.time(),
+        }
+        try:
+            self._queue.put_nowait((audio, meta))
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self, timeout=2.0):
+        """Finish pending writes and stop the writer thread."""
+        self._queue.put(None)
+        self._writer.join(timeout=timeout)
+
+    def _should_save(self, command, confidence):
+        if self.save == "all":
+            return True
+        if self.save == "misses":
+            low_confidence = confidence is not None and confidence < self.confidence_threshold
+            return command is None or low_confidence
+        return False
+
+    def _run(self):
+        """Writer thread: save queued utterances and enforce the disk quota."""
+        self._scan_existing()
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            audio, meta = item
+            try:
+                self._write(audio, meta)
+            except (OSError, RuntimeError) as e:
+                self.events.event("utterance_error", level=QUIET, error=str(e))
+
+    def _scan_existing(self):
+        """Account for recordings left from earlier runs, oldest first."""
+        if not os.path.isdir(self.output_dir):
+            return
+        entries = []
+        for name in os.listdir(self.output_dir):
+            path = os.path.join(self.output_dir, name)
+            if os.path.isfile(path):
+                entries.append((os.path.getmtime(path), path, os.path.getsize(path)))
+        for _, path, size in sorted(entries):
+            self._files.append((path, size))
+            self._disk_usage += size
+
+    def _write(self, audio, meta):
+        os.makedirs(self.output_dir, exist_ok=True)
+        self._sequence += 1
+        label = meta["command"] or "miss"
+        stem = os.path.join(
+            self.output_dir,
+            f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(meta['wall']))}-{self._sequence:04d}-{label}"
+        )
+        audio_path = f"{stem}.{self.file_format}"
+        if self.file_format == "flac":
+            import numpy as np
+            import soundfile
+            soundfile.write(audio_path, np.frombuffer(audio, dtype="<i2"), self.rate, format="FLAC")
+        else:
+            with wave.open(audio_path, "wb") as f:
+                f.setnchannels(1)
+                f.setsampwidth(SAMPLE_WIDTH)
+                f.setframerate(self.rate)
+                f.writeframes(audio)
+        meta_path = f"{stem}.json"
+        with open(meta_path, "w") as f:
+            json.dump(meta, f, indent=2)
+
+        for path in (audio_path, meta_path):
+            size = os.path.getsize(path)
+            self._files.append((path, size))
+            self._disk_usage += size
+        self.events.event("utterance_saved", path=audio_path, text=meta["text"], command=meta["command"])
+        self._enforce_quota()
+
+    def _enforce_quota(self):
+        while self._disk_usage > self.quota_bytes and self._files:
+            path, size = self._files.popleft()
+            self._disk_usage -= size
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def result_confidence(result):
+    """Mean word confidence of a Vosk result (requires SetWords(True)), or None."""
+    words = result.get("result") or []
+    if not words:
+        return None
+    return sum(w.get("conf", 0.0) for w in words) / len(words)
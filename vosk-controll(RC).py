@@ -5,31 +5,27 @@
 # Contact Cyton.io for more information about the library and hardware
 
 
+from startup_profile import StartupProfiler  # first, so startup timing covers every import
 import os
 import sys
+import argparse
 import json
 import tkinter as tk
 from tkinter import ttk, messagebox
-import vosk
-import pyaudio
-import subprocess
 import threading
-from  RPi_Robot_Hat_Lib import RobotController
+import copy
+from event_log import EventLog, get_event_log, set_event_log, QUIET
+from profiling import RuntimeProfiler, mode_from_env, PROFILE_MODES
+from dispatcher import MotionQueue, CommandDispatcher
+from utterance_capture import UtteranceRecorder, result_confidence
+from recognizer_policy import RecognizerPolicy
+from grammar_builder import GrammarBuilder, strip_garbage
+from command_vocabulary import CommandVocabulary, VocabularyWatcher
+from model_registry import ModelRegistry
+from capture_monitor import CaptureMonitor
+from ui_queue import UIUpdateQueue
 import time 
 
-# Training keywords dictionary with synonyms for robot movements
-MOVEMENT_TRAINING_KEYWORDS = {
-    "forward": ["forward", "move forward", "go forward", "go straight", "ahead"],
-    "backward": ["backward", "back", "reverse", "move back", "go back"],
-    "left": ["left", "turn left", "go left", "rotate left"],
-    "right": ["right", "turn right", "go right", "rotate right"],
-    "horizontal_left": ["slide left", "strafe left", "shift left", "drift left", "horizontal left"],
-    "horizontal_right": ["slide right", "strafe right", "shift right", "drift right", "horizontal right"],
-    "stop": ["stop", "halt", "freeze", "brake", "stay"],
-    "pause": ["pause", "wait", "hold"],
-    "resume": ["resume", "continue", "go"],
-}
-
 # Default calibration settings
 DEFAULT_CALIBRATION = {
     "motor_speed": {
@@ -45,6 +41,148 @@ DEFAULT_CALIBRATION = {
     "movement_duration": {
         "default_duration": 1.0,
         "turn_duration": 0.5
+    },
+    "event_log": {
+        "verbosity": "normal",
+        "path": "logs/events.jsonl",
+        "echo": True,
+        "max_bytes": 1000000,
+        "backup_count": 3
+    },
+    "profiling": {
+        "output_dir": "profiles",
+        "mode": "sample",
+        "sample_interval": 0.005
+    },
+    "network_api": {
+        "enabled": False,
+        "host": "127.0.0.1",
+        "port": 8765,
+        "max_clients": 64,
+        "client_queue_size": 100
+    },
+    "fleet": {
+        "local_name": "robot one",
+        "remote": {},
+        "broadcast_words": ["all", "everyone"],
+        "dispatch_timeout": 0.25
+    },
+    "multi_mic": {
+        "enabled": False,
+        "devices": [],
+        "array_channels": 1,
+        "arbitration": "best",
+        "arbitration_window": 0.15
+    },
+    "utterance_capture": {
+        "enabled": True,
+        "output_dir": "utterances",
+        "ring_seconds": 10.0,
+        "pre_roll": 0.5,
+        "save": "misses",
+        "quota_mb": 200,
+        "format": "flac"
+    },
+    "wake_word": {
+        "enabled": False,
+        "phrase": "hey robot",
+        "window": 5.0
+    },
+    "simulator": {
+        "bus_latency": 0.002,
+        "latency_jitter": 0.001,
+        "motor_time_constant": 0.15,
+        "max_speed": 0.5,
+        "max_turn_rate": 2.0,
+        "trace_limit": 100000
+    },
+    "ui": {
+        "refresh_fps": 20
+    },
+    "audio": {
+        "device_patterns": ["USB PnP Sound Device"],
+        "probe_cache": "audio_probe_cache.json",
+        "capture_rate": 0,
+        "resample_half_width": 8,
+        "skip_silence_backlog": 0.5,
+        "grow_after_overflows": 3,
+        "max_buffer_seconds": 2.0,
+        "overflow_window": 10.0,
+        "overflow_warning_hold": 5.0
+    },
+    "preprocess": {
+        "enabled": False,
+        "frame": 512,
+        "highpass_hz": 120.0,
+        "noise_suppression": True,
+        "over_subtraction": 2.0,
+        "spectral_floor": 0.05,
+        "noise_adapt": 0.1,
+        "hangover": 0.5,
+        "agc": True,
+        "agc_target": 3000.0,
+        "agc_max_gain": 8.0
+    },
+    "noise_floor": {
+        "gate": False,
+        "auto_gate": True,
+        "window": 30.0,
+        "percentile": 20.0,
+        "margin": 0.1,
+        "hangover": 0.75,
+        "pre_roll": 0.25,
+        "calibration_seconds": 5.0
+    },
+    "watchdog": {
+        "enabled": True,
+        "capture_deadline": 1.0,
+        "decode_deadline": 1.0,
+        "actuation_margin": 1.0,
+        "check_interval": 0.05,
+        "stats_interval": 300.0
+    },
+    "recognizer_maintenance": {
+        "reset_after": 0.0,
+        "rebuild_after": 0.0,
+        "rss_growth_mb": 150.0
+    },
+    "grammar": {
+        "garbage_class": True,
+        "validate": True,
+        "vocabulary_cache": "vocabulary_cache.json"
+    },
+    "vocabulary": {
+        "path": "keywords.json",
+        "watch": True,
+        "poll_interval": 1.0
+    },
+    "macros": {
+        "enabled": True,
+        "path": "macros.json",
+        "names": ["patrol", "square", "one", "two", "three"],
+        "speedup": 1.0,
+        "max_steps": 200
+    },
+    "models": {
+        "default": "model/vosk-model-small-en-us-0.15",
+        "directory": "model",
+        "paths": {},
+        "memory_budget_mb": 1024.0
+    },
+    "idle": {
+        "enabled": True,
+        "idle_after": 30.0,
+        "wake_chunks": 1,
+        "pre_roll": 0.5
+    },
+    "recognizer_process": {
+        "enabled": False,
+        "ring_seconds": 10.0,
+        "restart_delay": 0.5,
+        "max_restart_delay": 10.0
+    },
+    "pipeline": {
+        "queue_size": 4
     }
 }
 
@@ -52,14 +190,20 @@ DEFAULT_CALIBRATION = {
 class VoskModelChecker:
     """Handles Vosk model verification and downloading."""
     
-    def __init__(self):
+    def __init__(self, registry=None, model_path="model/vosk-model-small-en-us-0.15"):
         self.model = None
+        self.model_path = None
+        self.registry = registry
+        self.default_path = model_path
 
     def check_model(self):
         """Check if Vosk model exists, download if necessary, and load it."""
-        model_path = "model/vosk-model-small-en-us-0.15"
+        model_path = self.default_path
+        model_name = os.path.basename(os.path.normpath(model_path))
         
         if not os.path.exists(model_path):
+            import subprocess
+
             print("Model not found.")
             print("Checking internet connection...")
             
@@ -72,21 +216,27 @@ class VoskModelChecker:
             
             print("Downloading model...")
             try:
-                subprocess.run(["wget", "https://alphacephei.com/vosk/models/vosk-model-small-en-us-0.15.zip", "-O", "model.zip"], check=True)
-                subprocess.run(["unzip", "model.zip", "-d", "model"], check=True)
+                subprocess.run(["wget", f"https://alphacephei.com/vosk/models/{model_name}.zip", "-O", "model.zip"], check=True)
+                subprocess.run(["unzip", "model.zip", "-d", os.path.dirname(model_path) or "."], check=True)
                 subprocess.run(["rm", "model.zip"], check=True)
                 print("Model downloaded and unpacked successfully.")
             except (subprocess.CalledProcessError, FileNotFoundError) as e:
                 print(f"Failed to download or unpack model: {e}")
                 return False
             
-            # The model path needs to be updated to where unzip places it
-            model_path = "model/vosk-model-small-en-us-0.15"
             if not os.path.exists(model_path):
                 print(f"Model directory not found at expected path: {model_path}")
                 return False
 
-        self.model = vosk.Model(model_path)
+        self.model_path = model_path
+        if self.registry:
+            # Loaded through the registry so a later switch back to it is instant
+            self.registry.register(model_name, model_path)
+            self.model = self.registry.get(model_name)
+            self.registry.set_active(model_name)
+        else:
+            import vosk
+            self.model = vosk.Model(model_path)
         print("Model loaded successfully.")
         return True
 
@@ -106,8 +256,8 @@ class CalibrationManager:
                     return json.load(f)
             except Exception as e:
                 print(f"Error loading calibration: {e}")
-                return DEFAULT_CALIBRATION.copy()
-        return DEFAULT_CALIBRATION.copy()
+                return copy.deepcopy(DEFAULT_CALIBRATION)
+        return copy.deepcopy(DEFAULT_CALIBRATION)
     
     def save_calibration(self):
         """Save calibration settings to file."""
@@ -121,8 +271,9 @@ class CalibrationManager:
             return False
     
     def get_setting(self, category, key):
-        """Get a specific calibration setting."""
-        return self.settings.get(category, {}).get(key, 0)
+        """Get a specific calibration setting, falling back to the defaults."""
+        default = DEFAULT_CALIBRATION.get(category, {}).get(key, 0)
+        return self.settings.get(category, {}).get(key, default)
     
     def set_setting(self, category, key, value):
         """Set a specific calibration setting."""
@@ -132,14 +283,14 @@ class CalibrationManager:
     
     def reset_to_defaults(self):
         """Reset all settings to defaults."""
-        self.settings = DEFAULT_CALIBRATION.copy()
+        self.settings = copy.deepcopy(DEFAULT_CALIBRATION)
         self.save_calibration()
 
 
 class CalibrationWindow:
     """Calibration UI window."""
     
-    def __init__(self, parent, calibration_manager, movement_controller):
+    def __init__(self, parent, calibration_manager, movement_controller, noise_floor=None):
         self.window = tk.Toplevel(parent)
         self.window.title("Robot Calibration")
         self.window.geometry("600x500")
@@ -147,6 +298,8 @@ class CalibrationWindow:
         
         self.calibration = calibration_manager
         self.movement = movement_controller
+        self.noise_floor = noise_floor
+        self._calibrations_seen = noise_floor.calibrations if noise_floor else 0
         
         self._create_ui()
     
@@ -228,7 +381,7 @@ class CalibrationWindow:
             "motor_speed",
             "forward",
             0, 100,
-            lambda: self.movement.forward()
+            lambda: self._test_movement("forward")
         )
         
         # Backward speed
@@ -238,7 +391,7 @@ class CalibrationWindow:
             "motor_speed",
             "backward",
             0, 100,
-            lambda: self.movement.backward()
+            lambda: self._test_movement("backward")
         )
         
         # Turn speed
@@ -248,7 +401,7 @@ class CalibrationWindow:
             "motor_speed",
             "turn_speed",
             0, 100,
-            lambda: self.movement.turn()
+            lambda: self._test_movement("left")
         )
         
         # Strafe speed
@@ -258,7 +411,7 @@ class CalibrationWindow:
             "motor_speed",
             "strafe_speed",
             0, 100,
-            lambda: self.movement.trafe()
+            lambda: self._test_movement("horizontal_left")
         )
     
     def _create_voice_tab(self, parent):
@@ -281,7 +434,7 @@ class CalibrationWindow:
         )
         
         # Volume threshold
-        self._create_slider(
+        self.volume_var, self.volume_label = self._create_slider(
             parent,
             "Volume Threshold:",
             "voice_recognition",
@@ -290,6 +443,19 @@ class CalibrationWindow:
             None,
             resolution=0.05
         )
+        if self.noise_floor:
+            self._create_level_meter(parent)
+        
+        # Wake-word command window
+        self._create_slider(
+            parent,
+            "Wake Window (s):",
+            "wake_word",
+            "window",
+            1.0, 15.0,
+            None,
+            resolution=0.5
+        )
         
         # Info text
         info = tk.Label(
@@ -332,6 +498,11 @@ class CalibrationWindow:
             resolution=1
         )
     
+    def _test_movement(self, command):
+        """Run one movement with the current settings (a stop issued earlier must not cut it short)."""
+        self.movement.halt.clear()
+        getattr(self.movement, command)()
+
     def _create_slider(self, parent, label, category, key, min_val, max_val, test_callback, resolution=1.0):
         """Create a labeled slider with value display and test button."""
         frame = tk.Frame(parent)
@@ -370,6 +541,61 @@ class CalibrationWindow:
             command=lambda v: self._update_value(category, key, value_var, value_label)
         )
         slider.pack(side='right', fill='x', expand=True, padx=5)
+        return value_var, value_label
+
+    def _create_level_meter(self, parent):
+        """Live microphone level, estimated noise floor and gate threshold."""
+        frame = tk.Frame(parent)
+        frame.pack(fill='x', padx=20, pady=5)
+
+        self.meter = tk.Canvas(frame, width=300, height=14, bg="#222222", highlightthickness=0)
+        self.meter.pack(side='left', padx=5)
+        tk.Button(
+            frame,
+            text="Calibrate (silence)",
+            command=self._calibrate_silence
+        ).pack(side='right', padx=5)
+
+        self.meter_label = tk.Label(parent, text="Level: -   Floor: -   Gate: -", font=("Arial", 9))
+        self.meter_label.pack()
+        self._refresh_level_meter()
+
+    def _refresh_level_meter(self):
+        """Redraw the meter from the estimator (polled on the Tk thread)."""
+        if not self.window.winfo_exists():
+            return
+        state = self.noise_floor.state()
+        if not self.noise_floor.auto:
+            self.noise_floor.threshold = float(self.calibration.get_setting("voice_recognition", "volume_threshold"))
+        width = int(self.meter["width"])
+        self.meter.delete("all")
+        self.meter.create_rectangle(0, 0, int(state["input_level"] * width), 14, fill="#4CAF50", width=0)
+        if state["floor"] is not None:
+            x = int(state["floor"] * width)
+            self.meter.create_line(x, 0, x, 14, fill="#2196F3", width=2)
+        x = int(state["threshold"] * width)
+        self.meter.create_line(x, 0, x, 14, fill="#f44336", width=2)
+        floor = f"{state['floor']:.2f}" if state["floor"] is not None else "-"
+        mode = "auto" if self.noise_floor.auto else "manual"
+        if self.noise_floor.calibrating:
+            text = "Calibrating - stay quiet..."
+        else:
+            text = f"Level: {state['input_level']:.2f}   Floor: {floor}   Gate: {state['threshold']:.2f} ({mode})"
+        self.meter_label.config(text=text)
+
+        if self.noise_floor.calibrations != self._calibrations_seen:
+            # A silence calibration finished: store the measured threshold
+            self._calibrations_seen = self.noise_floor.calibrations
+            self.calibration.set_setting("voice_recognition", "volume_threshold", round(state["threshold"], 2))
+            self.calibration.save_calibration()
+            self.volume_var.set(round(state["threshold"], 2))
+            self.volume_label.config(text=f"{state['threshold']:.2f}")
+        self.window.after(200, self._refresh_level_meter)
+
+    def _calibrate_silence(self):
+        """Measure the floor from a few seconds of silence and store the resulting threshold."""
+        seconds = float(self.calibration.get_setting("noise_floor", "calibration_seconds"))
+        self.noise_floor.start_calibration(seconds)
     
     def _update_value(self, category, key, var, label):
         """Update calibration value when slider changes."""
@@ -395,48 +621,443 @@ class CalibrationWindow:
 class VoiceRecognition:
     """GUI application for Vosk voice training and robot control."""
     
-    def __init__(self, master):
+    def __init__(self, master, args=None, startup=None):
         self.master = master
-        self.training_keywords = MOVEMENT_TRAINING_KEYWORDS
+        self.args = args if args is not None else parse_args([])
+        self.startup = startup if startup is not None else StartupProfiler()
         self.is_listening = False
-        self.listening_thread = None
-        
-        # Initialize components
-        self.model_checker = VoskModelChecker()
-        if not self.model_checker.check_model():
-            messagebox.showerror("Error", "Vosk model not available. Exiting.")
-            self.master.quit()
-            return
-            
+        self.pipeline = None
+        self.monitoring = False
+        self.monitor_thread = None
+        self._stream_started = False  # start/stop only on the Tk thread, the stream's owner
+        self._start_retry = None      # pending Tk callback while a previous reader finishes
+        self.ready = False
+        self.recognizer = None
+        self.wake_gate = None
+        self.multi_mic = None
+        self.recognizer_process = None
+        self.stream = None
+        self.resampler = None
+        self.preprocessor = None
+        self.noise_floor = None
+        self.capture_rate = 16000
+        self.input_device = None
+        self.capture = None
+        self._dropping_shown = False
+        self.recorder = None
+        self.idle_monitor = None
+
         self.calibration = CalibrationManager()
-        self.robot = MovementController(self.calibration)
-        
-        # Create a grammar from the training keywords for focused recognition
-        all_keywords = [keyword for keywords in self.training_keywords.values() for keyword in keywords]
-        grammar = json.dumps(all_keywords)
+        self.events = set_event_log(EventLog.from_calibration(self.calibration))
+
+        # Command vocabulary from keywords.json; edits are picked up while running
+        self.vocabulary = CommandVocabulary.from_calibration(self.calibration)
+        self.training_keywords = self.vocabulary.keywords
+        self.vocabulary_watcher = None
+        self._pending_vocabulary = None
+        self._pending_model = None
+        self._model_switch = None
+        self._swap_lock = threading.Lock()
+
+        # Known models; loaded ones stay cached within the memory budget for fast switching
+        self.models = ModelRegistry.from_calibration(self.calibration)
+        self.models.on_switch = self.switch_model
+        # Decoding in child processes: they load the model themselves, the parent only needs its path
+        self.remote_decoding = bool(self.calibration.get_setting("multi_mic", "enabled")
+                                    or self.calibration.get_setting("recognizer_process", "enabled"))
+        if self.remote_decoding:
+            self.models.loader = lambda path: path
+
+        # Runtime profiler: --profile / VOSK_ROBOT_PROFILE at startup, Ctrl+Shift+P toggles
+        profile_mode = self.args.profile or mode_from_env()
+        self.profiler = RuntimeProfiler.from_calibration(
+            self.calibration, output_dir=self.args.profile_dir, mode=profile_mode
+        )
+
+        # Show the window first; the model loads in the background while the
+        # robot and audio are initialized
+        with self.startup.phase("ui"):
+            # Setup window
+            self.master.title("Vosk Robot Controller")
+            self.master.geometry("400x380")
+
+            # Initialize UI components
+            self._create_widgets()
+            self.status_label.config(text="Status: Loading model...")
+            self.recognition_button.config(state='disabled')
+
+            # Load and display keywords
+            self._display_keywords()
+        self.master.after(0, self.startup.mark, "ui_shown")
+
+        # All widget updates from worker threads go through this queue
+        self.ui = UIUpdateQueue(self.master, fps=self.calibration.get_setting("ui", "refresh_fps"))
+        self.ui.start()
+
+        self.model_checker = VoskModelChecker(self.models, self.calibration.get_setting("models", "default"))
+        self.model_thread = threading.Thread(target=self._load_model, name="model-loader")
+        self.model_thread.daemon = True
+        self.model_thread.start()
+        self.master.after(50, self._poll_model)
+
+        with self.startup.phase("hardware_init"):
+            backend = None
+            if self.args.simulate:
+                from simulated_robot import SimulatedRobotController
+                backend = SimulatedRobotController.from_calibration(self.calibration)
+            self.robot = MovementController(self.calibration, backend=backend)
+
+            # Dead-man watchdog: stops the motors if capture, decoding or a movement stalls
+            self.watchdog = None
+            if self.calibration.get_setting("watchdog", "enabled"):
+                from pipeline_watchdog import Watchdog
+                self.watchdog = Watchdog.from_calibration(
+                    self.calibration, self._watchdog_trip, lambda: self.motion.current is not None
+                )
+                self.watchdog.start()
+
+            # Every input path (voice, network API) shares one dispatcher and motion queue
+            self.motion = MotionQueue(self.robot, watchdog=self.watchdog, profiler=self.profiler)
+            self.dispatcher = CommandDispatcher(self.vocabulary.keywords, self.motion, self.vocabulary.index)
+            self.api_server = None
+            if self.args.api or self.calibration.get_setting("network_api", "enabled"):
+                from command_server import CommandServer
+                self.api_server = CommandServer.from_calibration(
+                    self.dispatcher, self.calibration, port=self.args.api_port
+                )
+                if self.watchdog:
+                    self.api_server.metrics["watchdog"] = self.watchdog.stats
+                self.api_server.models = self.models
+                self.api_server.start()
+
+            # Optional fleet: addressed voice commands fan out to remote robots' command APIs
+            self.fleet = None
+            if self.calibration.get_setting("fleet", "remote"):
+                from fleet import FleetDispatcher
+                self.fleet = FleetDispatcher.from_calibration(self.dispatcher, self.calibration)
+
+            # Command macros: record dispatched commands, replay them without decoding
+            self.macros = None
+            if self.calibration.get_setting("macros", "enabled"):
+                from macros import MacroRecorder
+                self.macros = MacroRecorder.from_calibration(
+                    self.dispatcher, self.calibration, on_saved=self._on_macro_saved
+                )
+                if self.api_server:
+                    self.api_server.macros = self.macros
+
+        # Grammar phrases from the training keywords for focused recognition; checked
+        # against the model vocabulary (and given an [unk] entry) once the model is loaded
+        self.grammar_phrases = self._grammar_phrases(self.vocabulary)
+        self.grammar = json.dumps(self.grammar_phrases)
+        self.grammar_builder = None
 
-        # Initialize Vosk recognizer with the specific grammar
-        self.recognizer = vosk.KaldiRecognizer(self.model_checker.model, 16000, grammar)
-        
         # Initialize PyAudio
-        self.p = pyaudio.PyAudio()
-        self.stream = self.p.open(
-            format=pyaudio.paInt16,
-            channels=1,
-            rate=16000,
-            input=True,
-            frames_per_buffer=8192
+        with self.startup.phase("audio_open"):
+            import pyaudio
+            self.p = pyaudio.PyAudio()
+            if not self.calibration.get_setting("multi_mic", "enabled"):
+                # Pick the device by name pattern (cached probe results skip broken ones)
+                from audio_devices import select_input_device, load_probe_cache
+                self.input_device = select_input_device(
+                    self.p,
+                    self.calibration.get_setting("audio", "device_patterns"),
+                    load_probe_cache(self.calibration.get_setting("audio", "probe_cache"))
+                )
+                if self.input_device:
+                    self.events.event("audio_device", index=self.input_device["index"],
+                                      device=self.input_device["name"])
+                # Capture at the device's native rate (0 = ask the device) and
+                # resample to 16 kHz ourselves instead of through ALSA's plug layer
+                self.capture_rate = int(self.calibration.get_setting("audio", "capture_rate")) or \
+                    (self.input_device["default_rate"] if self.input_device else 16000)
+                if self.capture_rate != 16000:
+                    from resampler import PolyphaseResampler
+                    self.resampler = PolyphaseResampler(
+                        self.capture_rate, 16000,
+                        half_width=int(self.calibration.get_setting("audio", "resample_half_width"))
+                    )
+                    self.events.event("resampler", capture_rate=self.capture_rate, taps=self.resampler.taps)
+                buffer_frames = 8192 * self.capture_rate // 16000
+                self.stream = self._open_stream(buffer_frames)
+                # Overflow accounting and backpressure for the capture loop
+                self.capture = CaptureMonitor.from_calibration(
+                    self.calibration, self.capture_rate, buffer_frames, context=self._pipeline_context
+                )
+
+        # Optional high-pass / motor-noise suppression / AGC before the recognizer
+        if self.stream and self.calibration.get_setting("preprocess", "enabled"):
+            from audio_preprocess import AudioPreprocessor
+            self.preprocessor = AudioPreprocessor.from_calibration(self.calibration)
+            self.motion.listeners.append(self.preprocessor.on_motion_state)
+
+        # Ambient floor tracking and the volume gate
+        if self.stream:
+            from noise_floor import NoiseFloorEstimator
+            self.noise_floor = NoiseFloorEstimator.from_calibration(self.calibration)
+
+        # Idle duty-cycling: energy-only monitoring after a stretch without voice
+        if self.stream:
+            from idle_monitor import IdleMonitor
+            self.idle_monitor = IdleMonitor.from_calibration(self.calibration, on_state=self._on_idle_state)
+            if self.api_server:
+                self.api_server.metrics["idle"] = self.idle_monitor.stats
+
+        # Pre-roll ring buffer: saves misrecognized utterances for replay
+        if self.stream and self.calibration.get_setting("utterance_capture", "enabled"):
+            self.recorder = UtteranceRecorder.from_calibration(self.calibration)
+
+        # capture -> decode -> match -> dispatch, as stages of an asyncio pipeline
+        self.pipeline = self._build_pipeline()
+        if self.api_server:
+            self.api_server.metrics["pipeline"] = self.pipeline.stats
+
+        # Hidden profiling toggle
+        self.master.bind("<Control-Shift-P>", self.toggle_profiling)
+        if profile_mode:
+            self.toggle_profiling()
+
+    def _load_model(self):
+        """Import Vosk and load the model off the main thread."""
+        with self.startup.phase("vosk_import"):
+            import vosk  # noqa: F401 (timed separately from the model load)
+        with self.startup.phase("model_load"):
+            self.model_checker.check_model()
+        if self.model_checker.model is not None:
+            with self.startup.phase("grammar_build"):
+                self.grammar_builder = GrammarBuilder.from_calibration(
+                    self.calibration, self.model_checker.model_path
+                )
+                self.grammar = self.grammar_builder.build(self.grammar_phrases)
+
+    def _poll_model(self):
+        """Wait (on the Tk thread) for the model loader to finish."""
+        if self.model_thread.is_alive():
+            self.master.after(50, self._poll_model)
+            return
+        self._on_model_loaded()
+
+    def _on_model_loaded(self):
+        """Build the recognizers once the model is available and enable recognition."""
+        if self.model_checker.model is None:
+            messagebox.showerror("Error", "Vosk model not available. Exiting.")
+            self.quit()
+            return
+
+        with self.startup.phase("recognizer_build"):
+            # Initialize Vosk recognizer with the specific grammar (unless child processes decode)
+            if not self.remote_decoding:
+                self.recognizer = self._build_recognizer()
+            self.recognizer_policy = RecognizerPolicy.from_calibration(self.calibration)
+            self._report_rejected_phrases()
+
+            # Optional wake-word stage in front of the command grammar
+            if self.calibration.get_setting("wake_word", "enabled") and not self.remote_decoding:
+                from wake_word import WakeWordGate
+                self.wake_gate = WakeWordGate.from_calibration(
+                    self.model_checker.model, self.recognizer, self.calibration,
+                    on_state=self._on_wake_state
+                )
+
+            if self.calibration.get_setting("multi_mic", "enabled"):
+                # One decoder process per microphone channel, arbitrated before dispatch
+                from multi_mic import MultiMicRecognizer
+                self.multi_mic = MultiMicRecognizer.from_calibration(
+                    self.p, self.model_checker.model_path, self.grammar, self.handle_text, self.calibration
+                )
+            elif self.calibration.get_setting("recognizer_process", "enabled"):
+                # Decode in a child process: audio through shared memory, results over a pipe
+                from recognizer_process import RecognizerProcess
+                self.recognizer_process = RecognizerProcess.from_calibration(
+                    self.calibration, self.model_checker.model_path, self.grammar,
+                    on_result=self._on_remote_result, on_decoded=self._on_remote_decoded,
+                    on_wake_state=self._on_wake_state
+                )
+                self.recognizer_process.start()
+                if self.api_server:
+                    self.api_server.metrics["recognizer_process"] = self.recognizer_process.stats
+
+        if self.calibration.get_setting("vocabulary", "watch"):
+            self.vocabulary_watcher = VocabularyWatcher.from_calibration(
+                self.calibration, self.vocabulary, self._on_vocabulary_changed
+            )
+            self.vocabulary_watcher.start()
+
+        self.model_selector.config(values=self.models.names(), state="readonly")
+        self.model_var.set(self.models.active or "")
+        self.ready = True
+        self.set_status("Status: Idle")
+        self.recognition_button.config(state='normal')
+        self.startup.mark("ready")
+        if self.args.listen:
+            self.start_recognition()
+        self.startup.report()
+
+    def _grammar_phrases(self, vocabulary):
+        """Grammar entries: every keyword phrase, plus fleet target names and macro phrases."""
+        phrases = list(vocabulary.phrases)
+        if self.fleet:
+            phrases += self.fleet.target_phrases()
+        if self.macros:
+            phrases += self.macros.phrases()
+        return phrases
+
+    def _on_macro_saved(self, name, new):
+        """A macro under a new name needs "play macro <name>" in the grammar."""
+        if new:
+            self._on_vocabulary_changed(self.vocabulary)
+
+    def _on_vocabulary_changed(self, vocabulary):
+        """Watcher thread: build the new grammar and queue the swap for the next utterance boundary."""
+        phrases = self._grammar_phrases(vocabulary)
+        grammar = self.grammar_builder.build(phrases) if self.grammar_builder else json.dumps(phrases)
+        self._report_rejected_phrases()
+        with self._swap_lock:
+            self._pending_vocabulary = (vocabulary, phrases, grammar)
+        # Not listening: nothing is decoding, so swap on the Tk thread right away
+        self.ui.post("swap", self._apply_if_idle)
+
+    def _apply_if_idle(self):
+        # Multi-mic decoders run in their own processes; the dispatcher side can swap any time
+        if self.multi_mic or not self.pipeline.running:
+            self._apply_pending()
+
+    def _apply_pending(self):
+        """Apply a prepared model switch and/or vocabulary reload (between utterances only)."""
+        self._apply_pending_model()
+        self._apply_pending_vocabulary()
+
+    def _on_model_selected(self, event=None):
+        if not self.models.request_switch(self.model_var.get()):
+            self.model_var.set(self.models.active or "")  # refused: show the model still in use
+
+    def switch_model(self, name):
+        """Prepare another model in the background; it replaces the current one between utterances."""
+        if not self.ready or (self._model_switch and self._model_switch.is_alive()):
+            self.events.event("model_switch_busy", level=QUIET, model=name)
+            return False
+        self.set_status(f"Status: Loading {name}...")
+        self._model_switch = threading.Thread(
+            target=self._prepare_model, args=(name, time.perf_counter()), name="model-switch"
         )
-        
-        # Setup window
-        self.master.title("Vosk Robot Controller")
-        self.master.geometry("400x350")
-        
-        # Initialize UI components
-        self._create_widgets()
-        
-        # Load and display keywords
-        self._display_keywords()
+        self._model_switch.daemon = True
+        self._model_switch.start()
+        return True
+
+    def _prepare_model(self, name, requested):
+        """Model-switch thread: load (or reuse) the model, then build its grammar and recognizers."""
+        import vosk
+        try:
+            cached = self.models.is_loaded(name)
+            model = self.models.get(name)
+            loaded = time.perf_counter()
+            builder = GrammarBuilder.from_calibration(self.calibration, self.models.path(name))
+            grammar = builder.build(self._grammar_phrases(self.vocabulary))
+            recognizer = wake_gate = None
+            if not self.remote_decoding:
+                recognizer = vosk.KaldiRecognizer(model, 16000, grammar)
+                recognizer.SetWords(True)
+            if self.wake_gate:
+                from wake_word import WakeWordGate
+                wake_gate = WakeWordGate.from_calibration(
+                    model, recognizer, self.calibration, on_state=self._on_wake_state
+                )
+        except Exception as e:
+            self.events.event("model_switch_failed", level=QUIET, model=name, error=str(e))
+            self.set_status(f"Status: Could not load {name}")
+            self.ui.post("model_selector", self.model_var.set, self.models.active or "")
+            return
+        with self._swap_lock:
+            self._pending_model = {
+                "name": name, "model": model, "builder": builder, "grammar": grammar,
+                "recognizer": recognizer, "wake_gate": wake_gate, "cached": cached,
+                "requested": requested, "load_ms": round((loaded - requested) * 1000, 1),
+                "build_ms": round((time.perf_counter() - loaded) * 1000, 1),
+            }
+        self.ui.post("swap", self._apply_if_idle)
+
+    def _apply_pending_model(self):
+        with self._swap_lock:
+            pending, self._pending_model = self._pending_model, None
+        if pending is None:
+            return
+        started = time.perf_counter()
+        name = pending["name"]
+        self.model_checker.model = pending["model"]
+        self.model_checker.model_path = self.models.path(name)
+        self.grammar_builder, self.grammar = pending["builder"], pending["grammar"]
+        self.recognizer = pending["recognizer"]
+        if pending["wake_gate"]:
+            self.wake_gate = pending["wake_gate"]
+        if self.recognizer_process:
+            self.recognizer_process.set_model(self.models.path(name), self.grammar)
+        if self.multi_mic:
+            self.multi_mic.set_model(self.models.path(name), self.grammar)
+        self.models.set_active(name)
+        # The new model (and the old one, if it stays cached) is not recognizer growth
+        self.recognizer_policy.rebaseline()
+        finished = time.perf_counter()
+        self.models.last_switch = {
+            "model": name, "cached": pending["cached"], "load_ms": pending["load_ms"],
+            "build_ms": pending["build_ms"], "swap_ms": round((finished - started) * 1000, 3),
+            "total_ms": round((finished - pending["requested"]) * 1000, 1),
+        }
+        self.events.event("model_switched", level=QUIET, multi_mic_restarted=self.multi_mic is not None,
+                          recognizer_process_restarted=self.recognizer_process is not None,
+                          **self.models.last_switch)
+        self.ui.post("model_selector", self.model_var.set, name)
+        self.set_status(f"Status: Switched to {name}")
+
+    def _apply_pending_vocabulary(self):
+        """Swap a reloaded vocabulary into the dispatcher and the live recognizer (between utterances only)."""
+        with self._swap_lock:
+            pending, self._pending_vocabulary = self._pending_vocabulary, None
+        if pending is None:
+            return
+        vocabulary, phrases, grammar = pending
+        started = time.perf_counter()
+        self.grammar_phrases, self.grammar = phrases, grammar
+        if self.recognizer is not None:
+            if hasattr(self.recognizer, "SetGrammar"):
+                self.recognizer.SetGrammar(grammar)
+            else:
+                # Older Vosk: a new recognizer on the already loaded model
+                self.recognizer = self._build_recognizer()
+                if self.wake_gate:
+                    self.wake_gate.command_recognizer = self.recognizer
+        if self.recognizer_process:
+            self.recognizer_process.set_grammar(grammar)
+        if self.multi_mic:
+            self.multi_mic.set_grammar(grammar)
+        self.vocabulary = vocabulary
+        self.training_keywords = vocabulary.keywords
+        self.dispatcher.set_keywords(vocabulary.keywords, vocabulary.index)
+        self.events.event("vocabulary_applied", level=QUIET, phrases=len(phrases),
+                          swap_ms=round((time.perf_counter() - started) * 1000, 2),
+                          multi_mic_restarted=self.multi_mic is not None)
+
+    def _report_rejected_phrases(self):
+        """Tell the operator which keyword phrases the model cannot recognize."""
+        if not self.grammar_builder or not self.grammar_builder.rejected:
+            return
+        # Left out of the grammar: words not in the model vocabulary
+        for phrase, missing in self.grammar_builder.rejected.items():
+            self.events.event("phrase_rejected", phrase=phrase, unknown=", ".join(missing))
+
+    def _build_recognizer(self):
+        """Create a command recognizer for the loaded model and grammar."""
+        import vosk
+        recognizer = vosk.KaldiRecognizer(self.model_checker.model, 16000, self.grammar)
+        recognizer.SetWords(True)
+        return recognizer
+
+    def _maintain_recognizer(self):
+        """Between utterances: reset or rebuild the recognizer if the maintenance policy says so."""
+        recognizer = self.recognizer_policy.apply(self.recognizer, self._build_recognizer)
+        if recognizer is not self.recognizer:
+            self.recognizer = recognizer
+            if self.wake_gate:
+                self.wake_gate.command_recognizer = recognizer
 
     def _create_widgets(self):
         """Create and layout GUI widgets."""
@@ -456,6 +1077,15 @@ class VoiceRecognition:
         )
         self.status_label.pack(pady=5)
 
+        # Audio overflow warning (empty unless audio is being dropped)
+        self.audio_warning_label = tk.Label(
+            self.master,
+            text="",
+            font=("Arial", 10, "bold"),
+            fg="#f44336"
+        )
+        self.audio_warning_label.pack()
+
         # Recognized Text Label
         self.recognized_text_label = tk.Label(
             self.master, 
@@ -464,6 +1094,18 @@ class VoiceRecognition:
             fg="gray"
         )
         self.recognized_text_label.pack(pady=(0, 10))
+
+        # Model selector (the new model is prepared in the background)
+        self.model_var = tk.StringVar(value="")
+        self.model_selector = ttk.Combobox(
+            self.master,
+            textvariable=self.model_var,
+            values=self.models.names(),
+            state="disabled",
+            width=32
+        )
+        self.model_selector.pack()
+        self.model_selector.bind("<<ComboboxSelected>>", self._on_model_selected)
         
         # Button frame
         button_frame = tk.Frame(self.master)
@@ -513,7 +1155,81 @@ class VoiceRecognition:
         if self.is_listening:
             messagebox.showwarning("Warning", "Please stop recognition before opening calibration.")
             return
-        CalibrationWindow(self.master, self.calibration, self.robot)
+        window = CalibrationWindow(self.master, self.calibration, self.robot, self.noise_floor)
+        if self.noise_floor:
+            # Keep the level meter live while the window is open
+            self.start_level_monitor()
+            window.window.bind(
+                "<Destroy>", lambda e: self.stop_level_monitor() if e.widget is window.window else None
+            )
+
+    def start_level_monitor(self):
+        """Read the microphone for level metering only (recognition stopped)."""
+        if self.is_listening or not self.stream or self.monitoring:
+            return
+        if self._retry_while_reading(self.start_level_monitor):
+            return
+        self._start_stream()
+        self.capture.reset()
+        self.monitoring = True
+        self.monitor_thread = threading.Thread(target=self._monitor_levels, name="level-monitor")
+        self.monitor_thread.daemon = True
+        self.monitor_thread.start()
+
+    def stop_level_monitor(self):
+        self._cancel_retry()
+        if not self.monitoring:
+            return
+        self.monitoring = False
+        if self.monitor_thread and self.monitor_thread.is_alive():
+            self.monitor_thread.join(timeout=1.0)
+        if not (self.monitor_thread and self.monitor_thread.is_alive()):
+            self._stop_stream()
+
+    def _monitor_levels(self):
+        frames = 4096 * self.capture_rate // 16000
+        while self.monitoring:
+            data = self._read_audio(frames)
+            if self.preprocessor:
+                data = self.preprocessor.process(data)
+            self.noise_floor.update(data)
+
+    def _retry_while_reading(self, callback):
+        """Tk thread: if recognition is still finishing its last read, call back shortly instead of blocking."""
+        if not self.pipeline.running:
+            return False
+        self._cancel_retry()
+        self._start_retry = self.master.after(50, callback)
+        return True
+
+    def _cancel_retry(self):
+        if self._start_retry is not None:
+            self.master.after_cancel(self._start_retry)
+            self._start_retry = None
+
+    def _start_stream(self):
+        """Tk thread (the stream's owner): start the microphone unless it is still running."""
+        if not self._stream_started:
+            self._stream_started = True
+            self.stream.start_stream()
+
+    def _stop_stream(self):
+        """Tk thread (the stream's owner): stop the microphone."""
+        if self._stream_started:
+            self._stream_started = False
+            self.stream.stop_stream()
+
+    def _release_stream(self):
+        """Tk thread, after the pipeline stopped: stop the microphone unless a new reader has it."""
+        if not (self.pipeline.running or self.monitoring):
+            self._stop_stream()
+
+    def toggle_profiling(self, event=None):
+        """Start or stop a runtime profiling session."""
+        if self.profiler.toggle():
+            self.master.title("Vosk Robot Controller [profiling]")
+        else:
+            self.master.title("Vosk Robot Controller")
 
     def toggle_recognition(self):
         """Start or stop voice recognition."""
@@ -524,37 +1240,269 @@ class VoiceRecognition:
 
     def start_recognition(self):
         """Start voice recognition in a separate thread."""
+        if not self.ready or self.is_listening:
+            return
+        if not self.multi_mic and self._retry_while_reading(self.start_recognition):
+            return
+        self.stop_level_monitor()
+        self._apply_pending()
         self.is_listening = True
-        self.status_label.config(text="Status: Listening...")
-        self.recognition_button.config(text="Stop Recognition", bg="#ff9800")
+        self.startup.mark("listening")
+        window = float(self.calibration.get_setting("wake_word", "window"))
+        if self.recognizer_process:
+            self.recognizer_process.set_wake_window(window)
+        if self.wake_gate:
+            self.wake_gate.window = window
+        if self._waiting_for_wake():
+            self.set_status("Status: Waiting for wake phrase...")
+        else:
+            self.set_status("Status: Listening...")
+        self.ui.post("recognition_button", self.recognition_button.config, text="Stop Recognition", bg="#ff9800")
         
-        self.listening_thread = threading.Thread(target=self.listen)
-        self.listening_thread.daemon = True
-        self.listening_thread.start()
-        print("Voice recognition started.")
+        if self.multi_mic:
+            self.multi_mic.start()
+        else:
+            self._start_stream()
+            self.capture.reset()
+            if self.idle_monitor:
+                self.idle_monitor.reset()
+            # Stream and resampler buffers fill up from here; growth is measured after that
+            self.recognizer_policy.rebaseline()
+            self.pipeline.start()
+        self.events.event("recognition_started", level=QUIET)
 
     def stop_recognition(self):
         """Stop voice recognition."""
+        self._cancel_retry()
         self.is_listening = False
-        # The thread will stop on its own since the loop condition `self.is_listening` will be false
-        print("\nStopping voice recognition...")
-        self.status_label.config(text="Status: Idle")
-        self.recognition_button.config(text="Start Recognition", bg="#4CAF50")
+        # Cancels every stage without waiting; _on_pipeline_stopped runs once the last read is done
+        self.pipeline.stop(wait=False)
+        if self.multi_mic:
+            self.multi_mic.stop()
+        self.events.event("recognition_stopping", level=QUIET)
+        self.set_status("Status: Idle")
+        self.ui.post("recognition_button", self.recognition_button.config, text="Start Recognition", bg="#4CAF50")
 
-    def listen(self):
-        """Listen for voice commands continuously."""
-        self.stream.start_stream()
-        while self.is_listening:
-            data = self.stream.read(4096, exception_on_overflow=False)
-            if self.recognizer.AcceptWaveform(data):
-                result = json.loads(self.recognizer.Result())
-                text = result.get('text', '').lower()
-                if text:
-                    # Update GUI in the main thread
-                    self.master.after(0, self.update_recognized_text, text)
-                    self.process_command(text)
+    def _build_pipeline(self):
+        """The recognition pipeline; movements go on from the dispatch stage to the motion queue."""
+        from pipeline import Pipeline, Stage
+        queue_size = int(self.calibration.get_setting("pipeline", "queue_size"))
+        return Pipeline([
+            Stage("capture", self._capture_stage, blocking=True),
+            Stage("decode", self._decode_stage, blocking=True, many=True, queue_size=queue_size),
+            Stage("match", self._match_stage, queue_size=queue_size),
+            Stage("dispatch", self._dispatch_stage, queue_size=queue_size),
+        ], on_stop=self._on_pipeline_stopped, name="recognition")
+
+    def _capture_stage(self):
+        """Pipeline source (capture thread): (chunk, utterance ring offset)."""
+        self.profiler.checkpoint()
+        data = self._read_audio(4096 * self.capture_rate // 16000)
+        if self.watchdog:
+            self.watchdog.beat("capture")
+        self._update_audio_warning()
+        if self.capture.overran:
+            # Input overflow (the chunk itself is intact): grow the host buffer if it keeps happening
+            buffer_frames = self.capture.grow_buffer()
+            if buffer_frames:
+                self._reopen_stream(buffer_frames)
+        # The ring offset travels with the chunk so the utterance is cut where its result ended
+        end = self.recorder.feed(data) if self.recorder else None
+        return data, end
+
+    def _decode_stage(self, item):
+        """Decode thread: one (chunk, ring offset) in, the (final result, ring offset) pairs it completed out."""
+        self.profiler.checkpoint()
+        data, end = item
+        if (self._pending_vocabulary or self._pending_model) and not self.capture.utterance_active:
+            # Between utterances: a grammar or model swap cannot cut a command in half
+            self._apply_pending()
+        preprocessed = False
+        if self.idle_monitor and self.idle_monitor.idle:
+            # Idle: only measure the level; voice wakes the decoder with the pre-roll.
+            # Pre-processing still runs, so the level is on the scale of the gate threshold
+            if self.preprocessor:
+                data = self.preprocessor.process(data)
+                preprocessed = True
+            chunks = self.idle_monitor.monitor(data)
+            if self.watchdog:
+                self.watchdog.beat("decode")
+            if chunks is None:
+                return None
+        else:
+            chunks = (data,)
+        decoded = []
+        # The pre-roll chunks end where the current one starts
+        chunk_end = None if end is None else end - sum(map(len, chunks))
+        for chunk in chunks:
+            if chunk_end is not None:
+                chunk_end += len(chunk)
+            result = self._decode_chunk(chunk, preprocessed)
+            if result is not None:
+                decoded.append((result, chunk_end))
+        return decoded
+
+    def _match_stage(self, item):
+        """(final result, ring offset) -> (text, match, result, ring offset): strip garbage, show the text, look up the command."""
+        result, end = item
+        text = strip_garbage(result.get('text', '').lower())
+        if not text:
+            return "", None, result, end
+        self._show_recognized(text)
+        return text, self._match(text), result, end
+
+    def _dispatch_stage(self, item):
+        """Act on a matched result; movements are queued on the motion queue (actuation thread)."""
+        text, match, result, end = item
+        command = self._act(text, match) if text else None
+        if self.recorder:
+            self.recorder.utterance_end(text, command, result_confidence(result), end)
+
+    def _on_pipeline_stopped(self, error):
+        """Pipeline thread, after every stage has finished: release the microphone (on the Tk thread)."""
+        if self.watchdog:
+            self.watchdog.idle("capture")
+            self.watchdog.idle("decode")
+        self.ui.post("stream", self._release_stream)
+        self.events.event("recognition_stopped", level=QUIET, shutdown_ms=self.pipeline.stats()["shutdown_ms"])
+        if error is not None:
+            self.is_listening = False
+            self.set_status(f"Status: Recognition stopped - {error}")
+            self.ui.post("recognition_button", self.recognition_button.config, text="Start Recognition", bg="#4CAF50")
+
+    def _decode_chunk(self, data, preprocessed=False):
+        """Pre-process (unless already done), gate and decode one chunk; returns a final result or None."""
+        if self.preprocessor and not preprocessed:
+            data = self.preprocessor.process(data)
+        if self.noise_floor:
+            data = self.noise_floor.gate(data)
+        if self.idle_monitor:
+            if self.noise_floor:
+                self.idle_monitor.observe(data, self.noise_floor.level, self.noise_floor.threshold,
+                                          busy=self.capture.utterance_active)
+            else:
+                self.idle_monitor.observe(data, busy=self.capture.utterance_active)
+        # Behind real time: drop quiet chunks between utterances instead of decoding them
+        if self.capture.skip_decode(self.noise_floor is not None and self.noise_floor.closed):
+            if self.watchdog:
+                self.watchdog.beat("decode")
+            return None
+        if self.recognizer_process:
+            # Decoded in the child process; results re-enter the pipeline at the match stage
+            self.recognizer_process.write(data)
+            return None
+        decode_started = time.perf_counter()
+        if self.wake_gate:
+            result = self.wake_gate.accept(data)
+        elif self.recognizer.AcceptWaveform(data):
+            result = json.loads(self.recognizer.Result())
+        else:
+            result = None
+        # A final from the wake recognizer also ends the utterance (it yields no command result)
+        final = result is not None or (self.wake_gate is not None and self.wake_gate.finalized)
+        self.capture.decoded(time.perf_counter() - decode_started, final)
+        if self.watchdog:
+            self.watchdog.beat("decode")
+        if result is not None and self.recognizer_policy.active:
+            self._maintain_recognizer()
+        return result
+
+    def _on_remote_result(self, result):
+        """Recognizer process reader: a final result joins the pipeline after the decode stage."""
+        # No ring offset for it: the utterance is cut at the newest audio
+        self.pipeline.feed("match", (result, None))
+
+    def _on_remote_decoded(self, seconds, final):
+        """Recognizer process reader: a block was decoded in the child."""
+        self.capture.decoded(seconds, final)
+        if self.watchdog and self.is_listening:
+            self.watchdog.beat("decode")
+
+    def _on_idle_state(self, idle):
+        """Show whether decoding is paused for lack of voice (called from the audio thread)."""
+        if idle:
+            text = "Status: Idle - waiting for voice"
+        elif self._waiting_for_wake():
+            text = "Status: Waiting for wake phrase..."
+        else:
+            text = "Status: Listening..."
+        self.ui.post("status", self._set_listening_status, text)
+
+    def _watchdog_trip(self, stage, gap):
+        """Called on the watchdog thread when a stage stalls during motion."""
+        self.motion.stop_now(source="watchdog")
+        self.set_status(f"Status: Motors stopped - {stage} stalled for {gap:.1f}s")
+
+    def _open_stream(self, buffer_frames):
+        """Open the microphone at the capture rate with the given host buffer size."""
+        import pyaudio
+        return self.p.open(
+            format=pyaudio.paInt16,
+            channels=1,
+            rate=self.capture_rate,
+            input=True,
+            input_device_index=self.input_device["index"] if self.input_device else None,
+            frames_per_buffer=buffer_frames
+        )
+
+    def _reopen_stream(self, buffer_frames):
+        """Swap in a stream with a larger buffer after repeated overflows."""
         self.stream.stop_stream()
-        print("Voice recognition stopped.")
+        self.stream.close()
+        self.stream = self._open_stream(buffer_frames)
+        self.stream.start_stream()
+        self.capture.reset()
+        self.recognizer_policy.rebaseline()
+
+    def _pipeline_context(self):
+        """What the rest of the pipeline is doing, attached to overflow events."""
+        return {"motion": self.motion.current, "motion_pending": self.motion.pending}
+
+    def _read_audio(self, frames):
+        """Read one chunk from the microphone, resampled to 16 kHz."""
+        data = self.capture.read(self.stream, frames)
+        if self.resampler:
+            data = self.resampler.process(data)
+        return data
+
+    def _update_audio_warning(self):
+        """Show or clear the "dropping audio" warning when the state changes."""
+        dropping = self.capture.dropping
+        if dropping != self._dropping_shown:
+            self._dropping_shown = dropping
+            self.ui.post(
+                "audio_warning", self.audio_warning_label.config,
+                text="Dropping audio - commands may be missed" if dropping else ""
+            )
+
+    def handle_text(self, text):
+        """Show a final recognition result and act on it."""
+        self._show_recognized(text)
+        return self.process_command(text)
+
+    def _show_recognized(self, text):
+        self.events.event("recognized", text=text)
+        # Update GUI in the main thread (only the latest result is drawn each frame)
+        self.ui.post("recognized_text", self.update_recognized_text, text)
+
+    def _waiting_for_wake(self):
+        """True while a wake-word gate (here or in the recognizer process) has its window closed."""
+        if self.wake_gate:
+            return not self.wake_gate.awake
+        return bool(self.recognizer_process and self.recognizer_process.wake and not self.recognizer_process.awake)
+
+    def _on_wake_state(self, awake):
+        """Show whether the wake-word window is open (called from the audio thread)."""
+        text = "Status: Awake - say a command" if awake else "Status: Waiting for wake phrase..."
+        self.ui.post("status", self._set_listening_status, text)
+
+    def set_status(self, text):
+        """Update the status label from any thread (applied on the next UI frame)."""
+        self.ui.post("status", self.status_label.config, text=text)
+
+    def _set_listening_status(self, text):
+        if self.is_listening:
+            self.status_label.config(text=text)
 
     def update_recognized_text(self, text):
         """Update the recognized text label."""
@@ -562,26 +1510,24 @@ class VoiceRecognition:
 
     def process_command(self, text):
         """Process the recognized text and command the robot."""
-        for command, keywords in MOVEMENT_TRAINING_KEYWORDS.items():
-            if text in keywords:
-                print(f"Command recognized: '{text}' -> {command.upper()}")
-                if command == "forward":
-                    self.robot.forward()
-                elif command == "backward":
-                    self.robot.backward()
-                elif command == "left":
-                    self.robot.left()
-                elif command == "right":
-                    self.robot.right()
-                elif command == "horizontal_left":
-                    self.robot.horizontal_left()
-                elif command == "horizontal_right":
-                    self.robot.horizontal_right()
-                elif command == "stop":
-                    self.robot.stop()
-                elif command in ["pause", "resume"]:
-                    pass
-                return
+        return self._act(text, self._match(text))
+
+    def _match(self, text):
+        """Look text up without acting on it: ("macro", None), ("fleet", None) or ("command", name or None)."""
+        if self.macros and self.macros.parse(text):
+            return "macro", None
+        if self.fleet:
+            return "fleet", None  # addressed phrases are matched by the fleet dispatcher
+        return "command", self.dispatcher.match(text)
+
+    def _act(self, text, match):
+        """Carry out a match from _match(); returns the command or macro action."""
+        kind, command = match
+        if kind == "macro":
+            return self.macros.handle_text(text)
+        if kind == "fleet":
+            return self.fleet.dispatch(text, source="voice")
+        return self.dispatcher.dispatch_matched(text, command, source="voice")
 
     def _display_keywords(self):
         """Display training keywords in a formatted way."""
@@ -601,13 +1547,47 @@ class VoiceRecognition:
         """Clean up and exit the application."""
         if self.is_listening:
             self.stop_recognition()
+        self.stop_level_monitor()
+        if self.vocabulary_watcher:
+            self.vocabulary_watcher.stop()
         
-        # Wait for the listening thread to finish
-        if self.listening_thread and self.listening_thread.is_alive():
-            self.listening_thread.join(timeout=1.0)
+        # Wait for the pipeline to finish its last read before the stream is closed
+        if self.pipeline:
+            self.pipeline.stop()
+            if self.stream and not self.pipeline.running:
+                self._stop_stream()
 
-        self.stream.close()
+        if self.recognizer_process:
+            self.recognizer_process.stop()
+        if self.stream:
+            self.stream.close()
         self.p.terminate()
+        if self.macros:
+            self.macros.close()
+        self.motion.close()
+        if self.recorder:
+            self.recorder.close()
+        if self.preprocessor:
+            self.preprocessor.log_stats()
+        if self.noise_floor:
+            self.events.event("noise_floor", level=QUIET, **self.noise_floor.state())
+        if self.watchdog:
+            self.watchdog.stop()
+            self.watchdog.log_stats()
+        if self.capture:
+            self.events.event("capture_stats", level=QUIET, **self.capture.stats())
+        if self.idle_monitor:
+            self.events.event("idle_stats", level=QUIET, **self.idle_monitor.stats())
+        if self.api_server:
+            self.api_server.stop()
+        if self.fleet:
+            self.fleet.close()
+        if self.args.simulate:
+            self.robot.Robot.dump_trace("logs/simulated_trace.jsonl")
+        self.profiler.stop()
+        self.ui.stop()
+        self.events.event("ui_stats", level=QUIET, **self.ui.stats())
+        self.events.close()
         self.master.quit()
         self.master.destroy()
         print("Application closed.")
@@ -616,19 +1596,24 @@ class VoiceRecognition:
 # Placeholder for the actual robot controller library
 class MovementController:
     """A placeholder class for the robot's movement controls."""
-    def __init__(self, calibration_manager):
-        self.Robot = RobotController()
+    def __init__(self, calibration_manager, backend=None):
+        if backend is None:
+            from RPi_Robot_Hat_Lib import RobotController
+            backend = RobotController()
+        self.Robot = backend
         # self.speed = 50
         self.calibration = calibration_manager
-        print("Initialized placeholder RobotController.")
+        self.halt = threading.Event()  # set by stop(); cuts a running movement short
+        self.events = get_event_log()
+        self.events.event("robot_initialized", level=QUIET, controller=type(self).__name__)
 
     def forward(self):
         
         speed = self.calibration.get_setting("motor_speed", "forward")
         duration = self.calibration.get_setting("movement_duration", "default_duration")
-        print(f"Action: Move forward (speed: {speed}, duration: {duration})")
+        self.events.event("action", action="forward", speed=speed, duration=duration)
         self.Robot.Forward(speed)
-        time.sleep(duration) 
+        self.halt.wait(duration)
         self.Robot.stop()
 
         
@@ -636,9 +1621,9 @@ class MovementController:
 
         speed = self.calibration.get_setting("motor_speed", "backward")
         duration = self.calibration.get_setting("movement_duration", "default_duration")
-        print(f"Action: Move backward (speed: {speed}, duration: {duration})")
+        self.events.event("action", action="backward", speed=speed, duration=duration)
         self.Robot.Backward(speed)
-        time.sleep(duration)
+        self.halt.wait(duration)
         self.Robot.stop()
         
 
@@ -646,41 +1631,42 @@ class MovementController:
         
         speed = self.calibration.get_setting("motor_speed", "turn_speed")
         duration = self.calibration.get_setting("movement_duration", "turn_duration")
-        print(f"Action: Turn left (speed: {speed}, duration: {duration})")
+        self.events.event("action", action="left", speed=speed, duration=duration)
         self.Robot.turn_left(speed)
-        time.sleep(duration)
+        self.halt.wait(duration)
         self.Robot.stop()
 
     def right(self):
         
         speed = self.calibration.get_setting("motor_speed", "turn_speed")
         duration = self.calibration.get_setting("movement_duration", "turn_duration")
-        print(f"Action: Turn right (speed: {speed}, duration: {duration})")
+        self.events.event("action", action="right", speed=speed, duration=duration)
         self.Robot.turn_right(speed)
-        time.sleep(duration)
+        self.halt.wait(duration)
         self.Robot.stop()
 
     def horizontal_left(self):
         
         speed = self.calibration.get_setting("motor_speed", "strafe_speed")
         duration = self.calibration.get_setting("movement_duration", "default_duration")
-        print(f"Action: Strafe left (speed: {speed}, duration: {duration})")
+        self.events.event("action", action="horizontal_left", speed=speed, duration=duration)
         self.Robot.Horizontal_Left(speed)
-        time.sleep(duration)
+        self.halt.wait(duration)
         self.Robot.stop()
 
     def horizontal_right(self):
         
         speed = self.calibration.get_setting("motor_speed", "strafe_speed")
         duration = self.calibration.get_setting("movement_duration", "default_duration")
-        print(f"Action: Strafe right (speed: {speed}, duration: {duration})")
+        self.events.event("action", action="horizontal_right", speed=speed, duration=duration)
         self.Robot.Horizontal_Right(speed)
-        time.sleep(duration)
+        self.halt.wait(duration)
         self.Robot.stop()
 
     def stop(self):
+        self.halt.set()
         self.Robot.stop()
-        print("Action: Stop")
+        self.events.event("action", action="stop")
 
     # # Test methods for calibration
     # def test_forward(self):
@@ -699,11 +1685,49 @@ class MovementController:
     #     print("Testing strafe movement...")
     #     self.horizontal_left()
 
+def parse_args(argv=None):
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(description="Vosk voice controlled robot")
+    parser.add_argument(
+        "--profile", nargs="?", const="sample", choices=PROFILE_MODES,
+        help="start a profiling session at startup (default mode: sample)"
+    )
+    parser.add_argument(
+        "--profile-dir",
+        help="directory for .prof/.collapsed output (overrides calibration)"
+    )
+    parser.add_argument(
+        "--api", action="store_true",
+        help="start the local HTTP/WebSocket command API"
+    )
+    parser.add_argument(
+        "--api-port", type=int,
+        help="port for the command API (overrides calibration)"
+    )
+    parser.add_argument(
+        "--startup-profile", action="store_true",
+        help="print a startup timing breakdown and append it to logs/startup_history.jsonl"
+    )
+    parser.add_argument(
+        "--listen", action="store_true",
+        help="start recognition as soon as the model is loaded"
+    )
+    parser.add_argument(
+        "--simulate", action="store_true",
+        help="drive a simulated robot (bus latency, motor lag, pose) instead of hardware"
+    )
+    return parser.parse_args(argv)
+
+
 def main():
     """Main entry point for the application."""
+    args = parse_args()
+    startup = StartupProfiler(enabled=args.startup_profile)
+    startup.mark("imports")
     try:
-        root = tk.Tk()
-        app = VoiceRecognition(root)
+        with startup.phase("tk_init"):
+            root = tk.Tk()
+        app = VoiceRecognition(root, args, startup)
         root.mainloop()
         
     except Exception as e:
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+
+# Two-stage wake-word gating.
+# A recognizer with a tiny grammar (the wake phrase plus "[unk]") runs on all
+# audio. When the wake phrase shows up in its partial result, audio is routed to
+# the full command recognizer for `window` seconds. Both recognizers are built
+# once and only Reset() on each transition, so switching stages costs nothing.
+# The chunk that completes the wake phrase is also fed to the command recognizer,
+# since a command said in the same breath may already start in it, and the window
+# stays open while a command is still being spoken (non-empty partial result).
+# `finalized` tells the caller whether either recognizer ended an utterance in the
+# last chunk, so utterance tracking also ends while waiting for the wake phrase.
+
+import json
+import time
+
+from event_log import get_event_log, NORMAL
+from grammar_builder import strip_garbage
+
+
+class WakeWordGate:
+    """Routes audio to the wake recognizer or the command recognizer."""
+
+    def __init__(self, model, command_recognizer, wake_phrase="hey robot", window=5.0, rate=16000,
+                 on_state=None):
+        import vosk
+
+        self.wake_phrase = wake_phrase.lower()
+        self.window = window
+        self.command_recognizer = command_recognizer
+        self.wake_recognizer = vosk.KaldiRecognizer(model, rate, json.dumps([self.wake_phrase, "[unk]"]))
+        self.on_state = on_state
+        self.events = get_event_log()
+        self.awake_until = 0.0
+        self.wake_count = 0
+        self.finalized = False   # the last accept() ended an utterance in either recognizer
+        self._speaking = False   # the command recognizer has a command in progress
+
+    @classmethod
+    def from_calibration(cls, model, command_recognizer, calibration_manager, on_state=None):
+        """Build from the "wake_word" calibration category."""
+        get = calibration_manager.get_setting
+        return cls(
+            model, command_recognizer,
+            wake_phrase=get("wake_word", "phrase"),
+            window=float(get("wake_word", "window")),
+            on_state=on_state,
+        )
+
+    @property
+    def awake(self):
+        return self._speaking or time.monotonic() < self.awake_until
+
+    def accept(self, data):
+        """Feed one chunk. Returns a final command result dict, or None."""
+        now = time.monotonic()
+        self.finalized = False
+        if self._speaking or now < self.awake_until:
+            return self._accept_command(data, now)
+
+        if self.awake_until:
+            self.awake_until = 0.0
+            self.events.event("wake_timeout", level=NORMAL)
+            self._set_state(False)
+
+        final = self.finalized = self.wake_recognizer.AcceptWaveform(data)
+        if final:
+            heard = json.loads(self.wake_recognizer.Result()).get("text", "")
+        else:
+            heard = json.loads(self.wake_recognizer.PartialResult()).get("partial", "")
+        if self.wake_phrase in heard:
+            self.wake()
+            # The rest of this chunk may already hold the start of the command
+            return self._accept_command(data, time.monotonic())
+        return None
+
+    def _accept_command(self, data, now):
+        if self.command_recognizer.AcceptWaveform(data):
+            self._speaking = False
+            self.finalized = True
+            result = json.loads(self.command_recognizer.Result())
+            if strip_garbage(result.get("text", "")):
+                # Keep listening for follow-up commands
+                self.awake_until = now + self.window
+            return result
+        # A command still being spoken keeps the window open until it is finalized
+        partial = json.loads(self.command_recognizer.PartialResult()).get("partial", "")
+        self._speaking = bool(strip_garbage(partial))
+        return None
+
+    def wake(self):
+        """Open the command window (also usable from the GUI or API)."""
+        self.wake_recognizer.Reset()
+        self.command_recognizer.Reset()
+        self._speaking = False
+        self.awake_until = time.monotonic() + self.window
+        self.wake_count += 1
+        self.events.event("wake", phrase=self.wake_phrase, window=self.window)
+        self._set_state(True)
+
+    def _set_state(self, awake):
+        if self.on_state:
+            self.on_state(awake)